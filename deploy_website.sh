@@ -66,6 +66,12 @@ sudo "$APP_DIR/venv/bin/pip" install --quiet --upgrade pip
 sudo "$APP_DIR/venv/bin/pip" install --quiet -r "$APP_DIR/requirements.txt"
 echo "  Python deps installed"
 
+# ── Catalog warmup ───────────────────────────────────────────────────────────
+# Prebuild snapshots + compressed payloads so the restarted workers start warm.
+# A failed warmup is not fatal: workers fall back to fetching on demand.
+(cd "$APP_DIR" && sudo -u www-data "$APP_DIR/venv/bin/python" warm_catalog.py) \
+  || echo "  Catalog warmup failed — workers will fetch on first request"
+
 # ── Nginx ────────────────────────────────────────────────────────────────────
 if ! command -v nginx &>/dev/null; then
   sudo apt-get update -qq
@@ -1,8 +1,9 @@
 import logging
-from flask import Flask, jsonify, render_template
+from flask import Flask, Response, jsonify, render_template
 from flask_cors import CORS
 
-from .db import close_db
+from . import cache, metrics, outbound, ratelimit, shared, steam, writebehind
+from .db import PoolTimeout, close_db, pool_stats, query_stats
 from .auth import auth_bp
 from .api import api_bp
 
@@ -26,12 +27,62 @@ def create_app() -> Flask:
     # DB teardown
     app.teardown_appcontext(close_db)
 
+    # Shared on-disk catalog snapshot
+    cache.init_app(app)
+    # Cross-worker key/value store (profile cache, revisions, write-behind queue)
+    shared.init_app(app)
+    writebehind.init_app(app)
+    steam.init_app(app)
+    # Request timing (before ratelimit's hook, so refused requests are counted too)
+    metrics.init_app(app)
+    # Per-route write limits and DB admission control (after shared, which holds the buckets)
+    ratelimit.init_app(app)
+
     # ── Routes ────────────────────────────────────────────────────────────────
 
     @app.route('/health')
     def health():
         return jsonify({'status': 'ok'})
 
+    @app.route('/health/db')
+    def health_db():
+        """This worker's DB pool checkout/wait counters, per pool (primary/replica)."""
+        return jsonify(pool_stats())
+
+    @app.route('/health/queries')
+    def health_queries():
+        """This worker's statement timings per route and SQL fingerprint, slowest total first."""
+        return jsonify(query_stats(limit=50))
+
+    @app.route('/health/writebehind')
+    def health_writebehind():
+        """Skin write-behind queue depth and this worker's flush counters."""
+        return jsonify(writebehind.stats())
+
+    @app.route('/health/ratelimit')
+    def health_ratelimit():
+        """Configured write limits and this worker's admitted/limited/shed counters."""
+        return jsonify(ratelimit.stats())
+
+    @app.route('/health/steam')
+    def health_steam():
+        """Steam profile cache hit/miss counters and refresh queue depth."""
+        return jsonify(steam.stats())
+
+    @app.route('/health/upstreams')
+    def health_upstreams():
+        """This worker's outbound HTTP counters per upstream (bymykel, Steam)."""
+        return jsonify(outbound.stats())
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        """Prometheus text format, summed over every worker's latest snapshot."""
+        body = metrics.render([
+            ('writebehind_pending', {}, writebehind.stats()['pending']),
+            ('steam_refresh_queued', {}, steam.stats()['queued']),
+        ])
+        return Response(body, mimetype='text/plain; version=0.0.4')
+
     @app.route('/', defaults={'path': ''})
     @app.route('/<path:path>')
     def spa_shell(path):
@@ -56,6 +107,11 @@ def create_app() -> Flask:
     def not_found(e):
         return jsonify({'error': 'Not found'}), 404
 
+    @app.errorhandler(PoolTimeout)
+    def db_busy(e):
+        logging.warning('DB pool exhausted: %s', e)
+        return jsonify({'error': 'Database busy, try again'}), 503, {'Retry-After': '1'}
+
     @app.errorhandler(500)
     def internal_error(e):
         logging.exception('Unhandled exception')
@@ -1,170 +1,361 @@
-"""Read-only skin catalog endpoints backed by bymykel's CSGO-API."""
+"""Read-only skin catalog endpoints backed by bymykel's CSGO-API.
+
+Responses are serialized and compressed once per catalog version (see
+cache.get_view) and carry a strong ETag, so repeat visits get a 304 and warm
+requests only pick a prebuilt body.
+
+/skins also has a query mode, used when any of _QUERY_PARAMS is given: it
+filters through the SkinCatalog indexes, pages with an opaque cursor and
+returns only the requested fields.
+
+Every full catalog route accepts ?since=<version> (the X-Catalog-Version of
+an earlier response) and then returns only the added, changed and removed
+items; clients too far behind get the full catalog again.
+
+/search answers type-ahead queries from per-version SearchIndexes over the
+skins, stickers and agents names.
+"""
+import gzip
+import heapq
+import hashlib
+import json
 import logging
-from flask import Blueprint, jsonify, current_app
+import time
+from flask import Blueprint, Response, jsonify, current_app, request
 from .. import cache
+from ..catalog_index import WEAPON_DEFINDEX, to_dicts
+from ..search import SearchIndex
+
+try:
+    import brotli
+except ImportError:  # optional: gzip-only without it
+    brotli = None
 
 logger = logging.getLogger(__name__)
 catalog_bp = Blueprint('catalog', __name__)
 
-# CS2 weapon name → item definition index mapping.
-# Used by the frontend to correlate catalog entries with DB weapon_defindex values.
-WEAPON_DEFINDEX: dict[str, int] = {
-    # Pistols
-    'weapon_deagle':        1,
-    'weapon_elite':         2,
-    'weapon_fiveseven':     3,
-    'weapon_glock':         4,
-    'weapon_hkp2000':       32,
-    'weapon_p250':          36,
-    'weapon_usp_silencer':  61,
-    'weapon_cz75a':         63,
-    'weapon_revolver':      64,
-    'weapon_tec9':          30,
-    # SMGs
-    'weapon_mac10':         17,
-    'weapon_mp5sd':         23,
-    'weapon_mp7':           33,
-    'weapon_mp9':           34,
-    'weapon_p90':           19,
-    'weapon_bizon':         26,
-    'weapon_ump45':         24,
-    # Rifles
-    'weapon_ak47':          7,
-    'weapon_aug':           8,
-    'weapon_famas':         10,
-    'weapon_galilar':       13,
-    'weapon_m4a1':          16,
-    'weapon_m4a1_silencer': 60,
-    'weapon_sg556':         39,
-    # Sniper rifles
-    'weapon_awp':           9,
-    'weapon_g3sg1':         11,
-    'weapon_scar20':        38,
-    'weapon_ssg08':         40,
-    # Heavy
-    'weapon_nova':          35,
-    'weapon_xm1014':        25,
-    'weapon_sawedoff':      29,
-    'weapon_mag7':          27,
-    'weapon_m249':          14,
-    'weapon_negev':         28,
-    # Knives (T side)
-    'weapon_knife':             42,
-    'weapon_knife_bayonet':     500,
-    'weapon_knife_flip':        505,
-    'weapon_knife_gut':         506,
-    'weapon_knife_karambit':    507,
-    'weapon_knife_m9_bayonet':  508,
-    'weapon_knife_tactical':    509,
-    'weapon_knife_falchion':    512,
-    'weapon_knife_survival_bowie': 514,
-    'weapon_knife_butterfly':   515,
-    'weapon_knife_push':        516,
-    'weapon_knife_cord':        517,
-    'weapon_knife_canis':       518,
-    'weapon_knife_ursus':       519,
-    'weapon_knife_gypsy_jackknife': 520,
-    'weapon_knife_outdoor':     521,
-    'weapon_knife_stiletto':    522,
-    'weapon_knife_widowmaker':  523,
-    'weapon_knife_skeleton':    525,
-    'weapon_knife_css':         526,
-    # Knives (CT side)
-    'weapon_knife_ct':          500,
-    # Gloves
-    'weapon_fists':             5,
-    'studded_bloodhound_gloves': 5027,
-    'studded_brokenfang_gloves': 4725,
-    'weapon_handwrap':          4725,
-}
+
+_QUERY_PARAMS = frozenset({
+    'weapon_defindex', 'rarity', 'category', 'paint_index_min', 'paint_index_max',
+    'fields', 'limit', 'cursor',
+})
+_DEFAULT_LIMIT = 100
+_MAX_LIMIT = 500
+_SEARCH_DEFAULT_LIMIT = 20
+_SEARCH_MAX_LIMIT = 50
 
 
 def _ttl() -> int:
     return current_app.config.get('SKIN_CACHE_TTL', 3600)
 
 
-def _enrich_skins(items: list) -> list:
-    """Add weapon_defindex to each catalog item.
+def _compressed(name: str, compress) -> bytes:
+    """Reuse a compressed body another worker (or warm_catalog.py) already built."""
+    data = cache.read_artifact(name)
+    if data is None:
+        data = compress()
+        cache.write_artifact(name, data)
+    return data
 
-    bymykel provides weapon.weapon_id which IS the numeric defindex — prefer that
-    over our manual map so gloves, knives, and any future items work automatically.
-    """
-    out = []
-    for item in items:
-        weapon = item.get('weapon') or {}
-        weapon_id = weapon.get('id', '')
-        defindex = weapon.get('weapon_id') or WEAPON_DEFINDEX.get(weapon_id)
-        entry = dict(item)
-        entry['weapon_defindex'] = defindex
-        out.append(entry)
-    return out
 
+class _Payload:
+    """A serialized JSON body together with its precompressed variants."""
 
-@catalog_bp.route('/skins')
-def skins():
-    try:
-        data = cache.get_skins(_ttl())
-    except Exception:
-        logger.exception('Failed to fetch skins catalog')
-        return jsonify({'error': 'Failed to fetch skin catalog'}), 502
-    return jsonify(_enrich_skins(data))
+    __slots__ = ('identity', 'gzip', 'br')
 
+    def __init__(self, obj) -> None:
+        self.identity = json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        digest = hashlib.sha1(self.identity).hexdigest()
+        self.gzip = _compressed(f'{digest}.gz', lambda: gzip.compress(self.identity, compresslevel=6))
+        self.br = (_compressed(f'{digest}.br', lambda: brotli.compress(self.identity, quality=9))
+                   if brotli else None)
 
-@catalog_bp.route('/knives')
-def knives():
-    try:
-        data = cache.get_knives(_ttl())
-        data = [s for s in data if (s.get('weapon') or {}).get('id', '').startswith('weapon_knife')]
-    except Exception:
-        logger.exception('Failed to fetch knives catalog')
-        return jsonify({'error': 'Failed to fetch knife catalog'}), 502
-    return jsonify(_enrich_skins(data))
 
+def _payload(catalog: str, view: str, build, ttl: int) -> tuple[str, _Payload]:
+    """Return (version, payload) for build(catalog model), built once per version."""
+    return cache.get_view(catalog, f'payload:{view}', lambda model: _Payload(build(model)), ttl)
 
-@catalog_bp.route('/gloves')
-def gloves():
-    try:
-        data = cache.get_gloves(_ttl())
-        data = [s for s in data if
-            (s.get('category') or {}).get('id') == 'sfui_invpanel_filter_gloves']
-    except Exception:
-        logger.exception('Failed to fetch gloves catalog')
-        return jsonify({'error': 'Failed to fetch glove catalog'}), 502
-    return jsonify(_enrich_skins(data))
 
+def _send(version: str, view: str, payload: _Payload) -> Response:
+    """Send payload with the best encoding the client accepts, or a 304."""
+    etag = f'{version}-{view}'
+    if payload.br is not None and request.accept_encodings['br']:
+        body, encoding, tag = payload.br, 'br', f'{etag}-br'
+    elif request.accept_encodings['gzip']:
+        body, encoding, tag = payload.gzip, 'gzip', f'{etag}-gzip'
+    else:
+        body, encoding, tag = payload.identity, None, etag
 
-@catalog_bp.route('/stickers')
-def stickers():
+    # Any variant of the current version is still valid for this client.
+    if any(request.if_none_match.contains(t) for t in (etag, f'{etag}-gzip', f'{etag}-br')):
+        resp = Response(status=304)
+    else:
+        resp = Response(body, mimetype='application/json')
+        if encoding:
+            resp.headers['Content-Encoding'] = encoding
+    resp.set_etag(tag)
+    resp.headers['X-Catalog-Version'] = version
+    resp.headers['Vary'] = 'Accept-Encoding'
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
+
+
+def _delta_body(items: list, delta: dict, version: str, since: str) -> dict:
+    by_id = {item.get('id'): item for item in items}
+    return {
+        'version': version,
+        'since':   since,
+        'added':   [by_id[i] for i in delta['added'] if i in by_id],
+        'changed': [by_id[i] for i in delta['changed'] if i in by_id],
+        'removed': delta['removed'],
+    }
+
+
+def _serve_catalog(view: str, noun: str) -> Response:
+    """Full catalog view, or only what changed when ?since=<version> is known."""
+    catalog, build = _FULL_VIEWS[view]
+    since = request.args.get('since', '')
     try:
-        data = cache.get_stickers(_ttl())
+        if since.isalnum() and len(since) <= 40:
+            # Views over part of a catalog only list removals of their own items.
+            group = None if view == catalog else view
+            version, delta = cache.get_delta(catalog, since, _ttl(), group=group)
+            if delta is not None:
+                delta_view = f'{view}-since-{since}'
+                current, payload = _payload(
+                    catalog, delta_view,
+                    lambda model: _delta_body(build(model), delta, version, since),
+                    _ttl(),
+                )
+                # A refresh between the two lookups means the delta is outdated.
+                if current == version:
+                    return _send(version, delta_view, payload)
+        version, payload = _payload(catalog, view, build, _ttl())
     except Exception:
-        logger.exception('Failed to fetch stickers catalog')
-        return jsonify({'error': 'Failed to fetch sticker catalog'}), 502
-    result = [
+        logger.exception('Failed to fetch %s catalog', view)
+        return jsonify({'error': f'Failed to fetch {noun} catalog'}), 502
+    return _send(version, view, payload)
+
+
+def _stickers(items: list) -> list:
+    return [
         {
+            'id':        s.get('id'),
             'def_index': int(s.get('def_index') or 0),
             'name':      s.get('name', ''),
             'image':     s.get('image', ''),
             'rarity':    s.get('rarity') or {},
             'effect':    s.get('effect', ''),
         }
-        for s in data
+        for s in items
         if s.get('def_index')
     ]
-    return jsonify(result)
+
+
+def _int_arg(name: str) -> int | None:
+    raw = request.args.get(name)
+    if raw is None or raw == '':
+        return None
+    return int(raw)
+
+
+def _query_skins():
+    """Filtered, paginated and projected view of the skins catalog."""
+    try:
+        weapon_defindex = _int_arg('weapon_defindex')
+        paint_index_min = _int_arg('paint_index_min')
+        paint_index_max = _int_arg('paint_index_max')
+        limit = _int_arg('limit')
+    except ValueError as exc:
+        return jsonify({'error': f'Invalid query parameter: {exc}'}), 400
+    if limit is None:
+        limit = _DEFAULT_LIMIT
+    if not (1 <= limit <= _MAX_LIMIT):
+        return jsonify({'error': f'limit must be between 1 and {_MAX_LIMIT}'}), 400
+    fields = [f for f in request.args.get('fields', '').split(',') if f]
+
+    try:
+        version, model = cache.get_view('skins', 'model', lambda model: model, _ttl())
+    except Exception:
+        logger.exception('Failed to fetch skins catalog')
+        return jsonify({'error': 'Failed to fetch skin catalog'}), 502
+
+    offset = 0
+    cursor = request.args.get('cursor')
+    if cursor:
+        cursor_version, _, raw_offset = cursor.partition('.')
+        if not raw_offset.isdigit():
+            return jsonify({'error': 'Invalid cursor'}), 400
+        if cursor_version != version:
+            return jsonify({'error': 'Cursor is from an older catalog version', 'version': version}), 409
+        offset = int(raw_offset)
+
+    matches = model.query(
+        weapon_defindex=weapon_defindex,
+        rarity=request.args.get('rarity') or None,
+        category=request.args.get('category') or None,
+        paint_index_min=paint_index_min,
+        paint_index_max=paint_index_max,
+    )
+    page = matches[offset:offset + limit]
+    if fields:
+        page = [rec.project(fields) for rec in page]
+    else:
+        page = to_dicts(page)
+    end = offset + len(page)
+
+    resp = jsonify({
+        'version': version,
+        'total': len(matches),
+        'items': page,
+        'next_cursor': f'{version}.{end}' if end < len(matches) else None,
+    })
+    resp.add_etag()
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp.make_conditional(request)
+
+
+# Full-catalog route view → (catalog, builder of its item list).
+_FULL_VIEWS = {
+    'skins':    ('skins',    lambda model: to_dicts(model.items)),
+    'knives':   ('skins',    lambda model: to_dicts(model.knives)),
+    'gloves':   ('skins',    lambda model: to_dicts(model.gloves)),
+    'stickers': ('stickers', _stickers),
+    'agents':   ('agents',   lambda items: items),
+}
+
+
+@catalog_bp.route('/skins')
+def skins():
+    if _QUERY_PARAMS.intersection(request.args):
+        return _query_skins()
+    return _serve_catalog('skins', 'skin')
+
+
+@catalog_bp.route('/knives')
+def knives():
+    return _serve_catalog('knives', 'knife')
+
+
+@catalog_bp.route('/gloves')
+def gloves():
+    return _serve_catalog('gloves', 'glove')
+
+
+@catalog_bp.route('/stickers')
+def stickers():
+    return _serve_catalog('stickers', 'sticker')
 
 
 @catalog_bp.route('/agents')
 def agents():
+    return _serve_catalog('agents', 'agent')
+
+
+def _skin_search_docs(model) -> list:
+    return [
+        {
+            'type':            'skin',
+            'id':              rec.raw.get('id'),
+            'name':            rec.raw.get('name', ''),
+            'image':           rec.raw.get('image', ''),
+            'rarity':          rec.raw.get('rarity') or {},
+            'weapon_defindex': rec.weapon_defindex,
+            'paint_index':     rec.raw.get('paint_index'),
+        }
+        for rec in model.items
+        if rec.raw.get('name')
+    ]
+
+
+def _sticker_search_docs(items: list) -> list:
+    return [dict(s, type='sticker') for s in _stickers(items) if s['name']]
+
+
+def _agent_search_docs(items: list) -> list:
+    return [
+        {
+            'type':   'agent',
+            'id':     a.get('id'),
+            'name':   a.get('name', ''),
+            'image':  a.get('image', ''),
+            'rarity': a.get('rarity') or {},
+            'team':   (a.get('team') or {}).get('id'),
+        }
+        for a in items
+        if a.get('name')
+    ]
+
+
+# Searchable catalog → builder of its result documents.
+_SEARCH_DOCS = {
+    'skins':    _skin_search_docs,
+    'stickers': _sticker_search_docs,
+    'agents':   _agent_search_docs,
+}
+
+
+def _search_index(catalog: str, ttl: int) -> SearchIndex:
+    build = _SEARCH_DOCS[catalog]
+    return cache.get_view(catalog, 'search', lambda src: SearchIndex(build(src)), ttl)[1]
+
+
+@catalog_bp.route('/search')
+def search():
+    """Ranked type-ahead search: ?q=<text>[&type=skins,stickers,agents][&limit=N]."""
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify({'error': 'Missing query parameter: q'}), 400
+    types = [t for t in request.args.get('type', '').split(',') if t] or list(_SEARCH_DOCS)
+    unknown = [t for t in types if t not in _SEARCH_DOCS]
+    if unknown:
+        return jsonify({'error': f'Unknown type: {", ".join(unknown)}'}), 400
     try:
-        data = cache.get_agents(_ttl())
-    except Exception:
-        logger.exception('Failed to fetch agents catalog')
-        return jsonify({'error': 'Failed to fetch agent catalog'}), 502
-    return jsonify(data)
+        limit = _int_arg('limit')
+    except ValueError as exc:
+        return jsonify({'error': f'Invalid query parameter: {exc}'}), 400
+    if limit is None:
+        limit = _SEARCH_DEFAULT_LIMIT
+    if not (1 <= limit <= _SEARCH_MAX_LIMIT):
+        return jsonify({'error': f'limit must be between 1 and {_SEARCH_MAX_LIMIT}'}), 400
+
+    hits = []
+    for catalog in types:
+        try:
+            index = _search_index(catalog, _ttl())
+        except Exception:
+            logger.exception('Failed to fetch %s catalog for search', catalog)
+            return jsonify({'error': f'Failed to fetch {catalog} catalog'}), 502
+        hits.extend(index.search(q, limit))
+
+    best = heapq.nlargest(limit, hits, key=lambda hit: hit[0])
+    resp = jsonify({'query': q, 'results': [doc for _, doc in best]})
+    resp.add_etag()
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp.make_conditional(request)
 
 
 @catalog_bp.route('/defindex-map')
 def defindex_map():
     """Expose the weapon name → defindex mapping for the frontend."""
     return jsonify(WEAPON_DEFINDEX)
+
+
+def warm_views(ttl: int, report=None) -> None:
+    """Build every full-catalog payload and search index for the current versions.
+
+    report(stage, seconds), when given, is called after each build.
+    """
+    for view, (catalog, build) in _FULL_VIEWS.items():
+        started = time.perf_counter()
+        _payload(catalog, view, build, ttl)
+        if report:
+            report(f'payload:{view}', time.perf_counter() - started)
+    for catalog in _SEARCH_DOCS:
+        started = time.perf_counter()
+        _search_index(catalog, ttl)
+        if report:
+            report(f'search:{catalog}', time.perf_counter() - started)
+
+
+cache.register_warmer(warm_views)
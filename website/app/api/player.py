@@ -2,6 +2,19 @@
 
 All routes require an active Steam session.
 
+Every write path bumps a per-player revision counter shared by all workers
+(see app/shared.py). GET responses carry an ETag built from it, so a client
+revalidating an unchanged selection gets a 304 without any query running.
+Reads otherwise go through a per-player profile cache in the same store: the
+four table queries run once per revision, and every GET — the full profile
+and the per-category routes — is answered from the cached document. Those
+queries go to the read replica when one is configured (see app/db.py),
+except right after the player's own write.
+
+With SKIN_WRITE_BEHIND, PUT /skins queues the save (see app/writebehind.py)
+instead of writing it; GETs overlay the player's queued rows until they are
+flushed, so players always read their own writes.
+
 DB tables:
   wp_player_skins  (steamid, weapon_team, weapon_defindex, weapon_paint_id,
                     weapon_wear, weapon_seed, weapon_nametag, weapon_stattrak,
@@ -10,12 +23,18 @@ DB tables:
   wp_player_gloves (steamid, weapon_team, weapon_defindex)
   wp_player_agents (steamid, agent_ct, agent_t)
 """
+import re
+import json
+import zlib
+import base64
 import logging
+import secrets
 from functools import wraps
 from typing import Callable
 
-from flask import Blueprint, jsonify, request, session
-from ..db import get_db
+from flask import Blueprint, Response, current_app, jsonify, request, session
+from .. import schema, shared, writebehind
+from ..db import get_db, get_read_db, note_write
 
 logger = logging.getLogger(__name__)
 player_bp = Blueprint('player', __name__)
@@ -91,31 +110,24 @@ def _process_skin_row(row: dict) -> dict:
     return row
 
 
-# ── Skins ─────────────────────────────────────────────────────────────────────
+# ── Validation ────────────────────────────────────────────────────────────────
 
-@player_bp.route('/skins', methods=['GET'])
-@require_auth
-def get_skins():
-    db = get_db()
-    with db.cursor() as cur:
-        cur.execute(
-            'SELECT * FROM wp_player_skins WHERE steamid = %s ORDER BY weapon_team, weapon_defindex',
-            (_steamid(),),
-        )
-        rows = [_process_skin_row(r) for r in cur.fetchall()]
-    return jsonify(rows)
+class _Invalid(ValueError):
+    """A request field failed validation; str() is the client-facing message."""
 
 
-@player_bp.route('/skins', methods=['PUT'])
-@require_auth
-def save_skin():
-    data, err = _json_body()
-    if err:
-        return err
-    err = _require_fields(data, 'weapon_defindex', 'weapon_team', 'weapon_paint_id')
-    if err:
-        return err
+def _check_fields(data: dict, *fields: str) -> None:
+    missing = [f for f in fields if f not in data]
+    if missing:
+        raise _Invalid(f'Missing fields: {", ".join(missing)}')
+
 
+def _parse_skin(data: dict) -> list[tuple]:
+    """Validate one skin selection; returns its wp_player_skins rows minus steamid.
+
+    team=0 means "Both" and expands to T (2) and CT (3) rows.
+    """
+    _check_fields(data, 'weapon_defindex', 'weapon_team', 'weapon_paint_id')
     try:
         weapon_defindex = int(data['weapon_defindex'])
         weapon_team = int(data['weapon_team'])
@@ -133,51 +145,339 @@ def save_skin():
                 sticker_vals.append(_fmt_sticker(max(0, int(raw or 0))))
 
     except (ValueError, TypeError) as exc:
-        return jsonify({'error': f'Invalid field value: {exc}'}), 400
+        raise _Invalid(f'Invalid field value: {exc}') from exc
 
     if weapon_team not in _VALID_TEAMS:
-        return jsonify({'error': 'weapon_team must be 0, 2, or 3'}), 400
+        raise _Invalid('weapon_team must be 0, 2, or 3')
     if not (0.0 <= weapon_wear <= 1.0):
-        return jsonify({'error': 'weapon_wear must be between 0.0 and 1.0'}), 400
+        raise _Invalid('weapon_wear must be between 0.0 and 1.0')
     if not (0 <= weapon_seed <= 1000):
-        return jsonify({'error': 'weapon_seed must be between 0 and 1000'}), 400
+        raise _Invalid('weapon_seed must be between 0 and 1000')
 
-    # team=0 means "Both" — expand to T (2) and CT (3) as separate rows
     teams_to_save = [2, 3] if weapon_team == 0 else [weapon_team]
+    return [
+        (t, weapon_defindex, weapon_paint_id, weapon_wear, weapon_seed,
+         weapon_nametag, weapon_stattrak, *sticker_vals)
+        for t in teams_to_save
+    ]
 
-    db = get_db()
-    with db.cursor() as cur:
+
+def _parse_knife(data: dict) -> tuple[int, str]:
+    _check_fields(data, 'weapon_team', 'knife')
+    try:
+        weapon_team = int(data['weapon_team'])
+        knife = str(data['knife'])[:64]
+    except (ValueError, TypeError) as exc:
+        raise _Invalid(f'Invalid field value: {exc}') from exc
+    if weapon_team not in _VALID_TEAMS:
+        raise _Invalid('weapon_team must be 0, 1, or 2')
+    return weapon_team, knife
+
+
+def _parse_gloves(data: dict) -> tuple[int, int]:
+    _check_fields(data, 'weapon_team', 'weapon_defindex')
+    try:
+        weapon_team = int(data['weapon_team'])
+        weapon_defindex = int(data['weapon_defindex'])
+    except (ValueError, TypeError) as exc:
+        raise _Invalid(f'Invalid field value: {exc}') from exc
+    if weapon_team not in _VALID_TEAMS:
+        raise _Invalid('weapon_team must be 0, 1, or 2')
+    return weapon_team, weapon_defindex
+
+
+def _parse_agents(data: dict) -> tuple[str | None, str | None]:
+    agent_ct = str(data.get('agent_ct', '') or '')[:64] or None
+    agent_t = str(data.get('agent_t', '') or '')[:64] or None
+    if agent_ct is None and agent_t is None:
+        raise _Invalid('Provide at least one of agent_ct or agent_t')
+    return agent_ct, agent_t
+
+
+# ── Writers (batched; callers commit) ─────────────────────────────────────────
+
+_UPSERT_SKINS = '''
+    INSERT INTO wp_player_skins
+        (steamid, weapon_team, weapon_defindex, weapon_paint_id,
+         weapon_wear, weapon_seed, weapon_nametag, weapon_stattrak,
+         weapon_sticker_0, weapon_sticker_1, weapon_sticker_2,
+         weapon_sticker_3, weapon_sticker_4)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        weapon_paint_id   = VALUES(weapon_paint_id),
+        weapon_wear       = VALUES(weapon_wear),
+        weapon_seed       = VALUES(weapon_seed),
+        weapon_nametag    = VALUES(weapon_nametag),
+        weapon_stattrak   = VALUES(weapon_stattrak),
+        weapon_sticker_0  = VALUES(weapon_sticker_0),
+        weapon_sticker_1  = VALUES(weapon_sticker_1),
+        weapon_sticker_2  = VALUES(weapon_sticker_2),
+        weapon_sticker_3  = VALUES(weapon_sticker_3),
+        weapon_sticker_4  = VALUES(weapon_sticker_4)
+'''
+
+# Loadout code imports also restore the columns only the plugin writes.
+_UPSERT_SKINS_EXACT = '''
+    INSERT INTO wp_player_skins
+        (steamid, weapon_team, weapon_defindex, weapon_paint_id,
+         weapon_wear, weapon_seed, weapon_nametag, weapon_stattrak,
+         weapon_sticker_0, weapon_sticker_1, weapon_sticker_2,
+         weapon_sticker_3, weapon_sticker_4,
+         weapon_stattrak_count, weapon_keychain)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        weapon_paint_id       = VALUES(weapon_paint_id),
+        weapon_wear           = VALUES(weapon_wear),
+        weapon_seed           = VALUES(weapon_seed),
+        weapon_nametag        = VALUES(weapon_nametag),
+        weapon_stattrak       = VALUES(weapon_stattrak),
+        weapon_sticker_0      = VALUES(weapon_sticker_0),
+        weapon_sticker_1      = VALUES(weapon_sticker_1),
+        weapon_sticker_2      = VALUES(weapon_sticker_2),
+        weapon_sticker_3      = VALUES(weapon_sticker_3),
+        weapon_sticker_4      = VALUES(weapon_sticker_4),
+        weapon_stattrak_count = VALUES(weapon_stattrak_count),
+        weapon_keychain       = VALUES(weapon_keychain)
+'''
+
+
+def _write_skins(cur, steamid: str, rows: list[tuple], upsert: str = _UPSERT_SKINS) -> None:
+    """Upsert skin rows (from _parse_skin, or _parse_code_skin with _UPSERT_SKINS_EXACT) with one batched INSERT.
+
+    Until migrate_db.py has normalized the legacy rows, one cleanup DELETE runs first.
+    """
+    if not rows:
+        return
+    if not schema.legacy_teams_normalized(cur):
         # Clean up legacy entries (team=0 stored as single row, team=1 old wrong-T)
+        defindexes = sorted({row[1] for row in rows})
         cur.execute(
-            'DELETE FROM wp_player_skins WHERE steamid = %s AND weapon_defindex = %s AND weapon_team IN (0, 1)',
-            (_steamid(), weapon_defindex),
+            'DELETE FROM wp_player_skins WHERE steamid = %s AND weapon_team IN (0, 1) '
+            f'AND weapon_defindex IN ({", ".join(["%s"] * len(defindexes))})',
+            (steamid, *defindexes),
         )
-        for t in teams_to_save:
-            cur.execute(
-                '''
-                INSERT INTO wp_player_skins
-                    (steamid, weapon_team, weapon_defindex, weapon_paint_id,
-                     weapon_wear, weapon_seed, weapon_nametag, weapon_stattrak,
-                     weapon_sticker_0, weapon_sticker_1, weapon_sticker_2,
-                     weapon_sticker_3, weapon_sticker_4)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE
-                    weapon_paint_id   = VALUES(weapon_paint_id),
-                    weapon_wear       = VALUES(weapon_wear),
-                    weapon_seed       = VALUES(weapon_seed),
-                    weapon_nametag    = VALUES(weapon_nametag),
-                    weapon_stattrak   = VALUES(weapon_stattrak),
-                    weapon_sticker_0  = VALUES(weapon_sticker_0),
-                    weapon_sticker_1  = VALUES(weapon_sticker_1),
-                    weapon_sticker_2  = VALUES(weapon_sticker_2),
-                    weapon_sticker_3  = VALUES(weapon_sticker_3),
-                    weapon_sticker_4  = VALUES(weapon_sticker_4)
-                ''',
-                (_steamid(), t, weapon_defindex, weapon_paint_id,
-                 weapon_wear, weapon_seed, weapon_nametag, weapon_stattrak,
-                 *sticker_vals),
-            )
+    # PyMySQL folds executemany on INSERT ... VALUES into a single multi-row statement.
+    cur.executemany(upsert, [(steamid, *row) for row in rows])
+
+
+def _write_knives(cur, steamid: str, rows: list[tuple[int, str]]) -> None:
+    if rows:
+        cur.executemany(
+            '''
+            INSERT INTO wp_player_knife (steamid, weapon_team, knife)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE knife = VALUES(knife)
+            ''',
+            [(steamid, *row) for row in rows],
+        )
+
+
+def _write_gloves(cur, steamid: str, rows: list[tuple[int, int]]) -> None:
+    if rows:
+        cur.executemany(
+            '''
+            INSERT INTO wp_player_gloves (steamid, weapon_team, weapon_defindex)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE weapon_defindex = VALUES(weapon_defindex)
+            ''',
+            [(steamid, *row) for row in rows],
+        )
+
+
+def _write_agents(cur, steamid: str, agents: tuple[str | None, str | None]) -> None:
+    cur.execute(
+        '''
+        INSERT INTO wp_player_agents (steamid, agent_ct, agent_t)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            agent_ct = COALESCE(VALUES(agent_ct), agent_ct),
+            agent_t  = COALESCE(VALUES(agent_t),  agent_t)
+        ''',
+        (steamid, *agents),
+    )
+
+
+# ── Revisions and profile cache ───────────────────────────────────────────────
+
+_PROFILE_NS = 'profile'
+_REVISION_NS = 'revision'
+
+
+def _query_profile(steamid: str) -> dict:
+    db = get_read_db(steamid)
+    with db.cursor() as cur:
+        cur.execute('SELECT * FROM wp_player_skins WHERE steamid = %s ORDER BY weapon_team, weapon_defindex', (steamid,))
+        skins = [_process_skin_row(r) for r in cur.fetchall()]
+
+        cur.execute('SELECT weapon_team, knife FROM wp_player_knife WHERE steamid = %s', (steamid,))
+        knives = cur.fetchall()
+
+        cur.execute('SELECT weapon_team, weapon_defindex FROM wp_player_gloves WHERE steamid = %s', (steamid,))
+        gloves = cur.fetchall()
+
+        cur.execute('SELECT agent_ct, agent_t FROM wp_player_agents WHERE steamid = %s', (steamid,))
+        agents = cur.fetchone() or {'agent_ct': None, 'agent_t': None}
+
+    return {
+        'steamid': steamid,
+        'skins': skins,
+        'knives': knives,
+        'gloves': gloves,
+        'agents': agents,
+    }
+
+
+def _revision(steamid: str) -> int | None:
+    """The player's current revision, or None without the shared store.
+
+    Counters start at a random value, so one lost with the runtime dir cannot
+    count back up to a revision a client still holds an ETag for.
+    """
+    return shared.counter(_REVISION_NS, steamid, seed=secrets.randbits(48))
+
+
+def _profile_json(steamid: str, revision: int | None) -> str:
+    """The player's serialized profile at revision, from the shared cache or MySQL."""
+    cached = shared.get(_PROFILE_NS, steamid)
+    if cached is not None and revision is not None:
+        # Entries are tagged with the revision they were read at, so a read
+        # that raced a write cannot keep serving the old rows.
+        cached_rev, _, body = cached.partition(b'\n')
+        if cached_rev == b'%d' % revision:
+            return body.decode()
+    body = current_app.json.dumps(_query_profile(steamid))
+    if revision is not None:
+        cfg = current_app.config
+        shared.put(_PROFILE_NS, steamid, b'%d\n%s' % (revision, body.encode()),
+                   ttl=cfg['PROFILE_CACHE_TTL'], max_entries=cfg['PROFILE_CACHE_MAX'])
+    return body
+
+
+def _send_profile(part: str | None = None) -> Response:
+    """Send the player's profile (or one part of it), or a 304 if the client's copy is current."""
+    steamid = _steamid()
+    revision = _revision(steamid)
+    etag = f'{steamid}.{revision:x}' if revision is not None else None
+
+    if etag is not None and request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        body = _profile_json(steamid, revision)
+        queued = writebehind.pending(steamid) if part in (None, 'skins') else []
+        if part is None and not queued:
+            resp = current_app.response_class(body, mimetype='application/json')
+        else:
+            profile = json.loads(body)
+            if queued:
+                _overlay_skins(profile, queued)
+            resp = jsonify(profile if part is None else profile[part])
+    if etag is not None:
+        resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp
+
+
+def _bump(steamid: str) -> None:
+    """Move the player to a new revision and keep their reads on the primary for a while."""
+    shared.incr(_REVISION_NS, steamid, seed=secrets.randbits(48))
+    note_write(steamid)
+
+
+def _commit(db, steamid: str) -> None:
+    """Commit a write and move the player to a new revision.
+
+    The revision changes after the commit, so any profile read before it is
+    treated as stale.
+    """
     db.commit()
+    _bump(steamid)
+
+
+# ── Write-behind (SKIN_WRITE_BEHIND) ──────────────────────────────────────────
+
+# Field order of the rows _parse_skin returns.
+_SKIN_ROW_FIELDS = (
+    'weapon_team', 'weapon_defindex', 'weapon_paint_id', 'weapon_wear', 'weapon_seed',
+    'weapon_nametag', 'weapon_stattrak', *(f'weapon_sticker_{i}' for i in range(5)),
+)
+# The plugin's column default: no keychain attached.
+_DEFAULT_KEYCHAIN = '0;0;0;0;0'
+# Columns a queued save leaves alone; a new row gets the column defaults.
+_SKIN_ROW_DEFAULTS = {'weapon_stattrak_count': 0, 'weapon_keychain': _DEFAULT_KEYCHAIN}
+
+
+def _overlay_skins(profile: dict, rows: list[list], raw: bool = False) -> None:
+    """Apply queued skin rows on top of the profile read from MySQL (raw: keep sticker strings)."""
+    skins = {(s['weapon_team'], s['weapon_defindex']): s for s in profile['skins']}
+    for row in rows:
+        values = dict(zip(_SKIN_ROW_FIELDS, row))
+        if not raw:
+            _process_skin_row(values)
+        key = (values['weapon_team'], values['weapon_defindex'])
+        skins.setdefault(key, {'steamid': profile['steamid'], **_SKIN_ROW_DEFAULTS}).update(values)
+    profile['skins'] = sorted(skins.values(), key=lambda s: (s['weapon_team'], s['weapon_defindex']))
+
+
+def _discard_queued(steamid: str, keys) -> None:
+    """Drop queued saves a direct write is about to supersede."""
+    writebehind.discard(steamid, list(keys))
+
+
+def _flush_queued(batch: dict[str, list[list]], still_queued: Callable[[], bool]) -> bool:
+    """Write-behind writer: all queued rows in one transaction, then new revisions.
+
+    Rolls back if a direct write or delete discarded any of the rows after
+    the flush read them; committing would resurrect or overwrite its change.
+    """
+    db = get_db()
+    try:
+        with db.cursor() as cur:
+            for steamid, rows in batch.items():
+                _write_skins(cur, steamid, [tuple(r) for r in rows])
+        if not still_queued():
+            db.rollback()
+            return False
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    for steamid in batch:
+        _bump(steamid)
+    return True
+
+
+writebehind.set_writer(_flush_queued)
+
+
+# ── Skins ─────────────────────────────────────────────────────────────────────
+
+@player_bp.route('/skins', methods=['GET'])
+@require_auth
+def get_skins():
+    return _send_profile('skins')
+
+
+@player_bp.route('/skins', methods=['PUT'])
+@require_auth
+def save_skin():
+    data, err = _json_body()
+    if err:
+        return err
+    try:
+        rows = _parse_skin(data)
+    except _Invalid as exc:
+        return jsonify({'error': str(exc)}), 400
+
+    steamid = _steamid()
+    if writebehind.enqueue(steamid, rows):
+        _bump(steamid)
+        return jsonify({'status': 'ok', 'queued': True})
+
+    _discard_queued(steamid, ((row[0], row[1]) for row in rows))
+    db = get_db()
+    with db.cursor() as cur:
+        _write_skins(cur, steamid, rows)
+    _commit(db, steamid)
     return jsonify({'status': 'ok'})
 
 
@@ -197,6 +497,8 @@ def delete_skin():
     except (ValueError, TypeError) as exc:
         return jsonify({'error': f'Invalid field value: {exc}'}), 400
 
+    teams = (2, 3) if weapon_team == 0 else (weapon_team,)
+    _discard_queued(_steamid(), ((t, weapon_defindex) for t in teams))
     db = get_db()
     with db.cursor() as cur:
         if weapon_team == 0:
@@ -210,12 +512,13 @@ def delete_skin():
                 'DELETE FROM wp_player_skins WHERE steamid = %s AND weapon_defindex = %s AND weapon_team = %s',
                 (_steamid(), weapon_defindex, weapon_team),
             )
-            # Also clean up legacy entries
-            cur.execute(
-                'DELETE FROM wp_player_skins WHERE steamid = %s AND weapon_defindex = %s AND weapon_team IN (0, 1)',
-                (_steamid(), weapon_defindex),
-            )
-    db.commit()
+            if not schema.legacy_teams_normalized(cur):
+                # Also clean up legacy entries
+                cur.execute(
+                    'DELETE FROM wp_player_skins WHERE steamid = %s AND weapon_defindex = %s AND weapon_team IN (0, 1)',
+                    (_steamid(), weapon_defindex),
+                )
+    _commit(db, _steamid())
     return jsonify({'status': 'ok'})
 
 
@@ -224,14 +527,7 @@ def delete_skin():
 @player_bp.route('/knife', methods=['GET'])
 @require_auth
 def get_knife():
-    db = get_db()
-    with db.cursor() as cur:
-        cur.execute(
-            'SELECT weapon_team, knife FROM wp_player_knife WHERE steamid = %s',
-            (_steamid(),),
-        )
-        rows = cur.fetchall()
-    return jsonify(rows)
+    return _send_profile('knives')
 
 
 @player_bp.route('/knife', methods=['PUT'])
@@ -240,30 +536,15 @@ def save_knife():
     data, err = _json_body()
     if err:
         return err
-    err = _require_fields(data, 'weapon_team', 'knife')
-    if err:
-        return err
-
     try:
-        weapon_team = int(data['weapon_team'])
-        knife = str(data['knife'])[:64]
-    except (ValueError, TypeError) as exc:
-        return jsonify({'error': f'Invalid field value: {exc}'}), 400
-
-    if weapon_team not in _VALID_TEAMS:
-        return jsonify({'error': 'weapon_team must be 0, 1, or 2'}), 400
+        row = _parse_knife(data)
+    except _Invalid as exc:
+        return jsonify({'error': str(exc)}), 400
 
     db = get_db()
     with db.cursor() as cur:
-        cur.execute(
-            '''
-            INSERT INTO wp_player_knife (steamid, weapon_team, knife)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE knife = VALUES(knife)
-            ''',
-            (_steamid(), weapon_team, knife),
-        )
-    db.commit()
+        _write_knives(cur, _steamid(), [row])
+    _commit(db, _steamid())
     return jsonify({'status': 'ok'})
 
 
@@ -288,7 +569,7 @@ def delete_knife():
             'DELETE FROM wp_player_knife WHERE steamid = %s AND weapon_team = %s',
             (_steamid(), weapon_team),
         )
-    db.commit()
+    _commit(db, _steamid())
     return jsonify({'status': 'ok'})
 
 
@@ -297,14 +578,7 @@ def delete_knife():
 @player_bp.route('/gloves', methods=['GET'])
 @require_auth
 def get_gloves():
-    db = get_db()
-    with db.cursor() as cur:
-        cur.execute(
-            'SELECT weapon_team, weapon_defindex FROM wp_player_gloves WHERE steamid = %s',
-            (_steamid(),),
-        )
-        rows = cur.fetchall()
-    return jsonify(rows)
+    return _send_profile('gloves')
 
 
 @player_bp.route('/gloves', methods=['PUT'])
@@ -313,30 +587,15 @@ def save_gloves():
     data, err = _json_body()
     if err:
         return err
-    err = _require_fields(data, 'weapon_team', 'weapon_defindex')
-    if err:
-        return err
-
     try:
-        weapon_team = int(data['weapon_team'])
-        weapon_defindex = int(data['weapon_defindex'])
-    except (ValueError, TypeError) as exc:
-        return jsonify({'error': f'Invalid field value: {exc}'}), 400
-
-    if weapon_team not in _VALID_TEAMS:
-        return jsonify({'error': 'weapon_team must be 0, 1, or 2'}), 400
+        row = _parse_gloves(data)
+    except _Invalid as exc:
+        return jsonify({'error': str(exc)}), 400
 
     db = get_db()
     with db.cursor() as cur:
-        cur.execute(
-            '''
-            INSERT INTO wp_player_gloves (steamid, weapon_team, weapon_defindex)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE weapon_defindex = VALUES(weapon_defindex)
-            ''',
-            (_steamid(), weapon_team, weapon_defindex),
-        )
-    db.commit()
+        _write_gloves(cur, _steamid(), [row])
+    _commit(db, _steamid())
     return jsonify({'status': 'ok'})
 
 
@@ -364,7 +623,7 @@ def delete_gloves():
                 'DELETE FROM wp_player_gloves WHERE steamid = %s AND weapon_team = %s',
                 (_steamid(), weapon_team),
             )
-    db.commit()
+    _commit(db, _steamid())
     return jsonify({'status': 'ok'})
 
 
@@ -373,14 +632,7 @@ def delete_gloves():
 @player_bp.route('/agents', methods=['GET'])
 @require_auth
 def get_agents():
-    db = get_db()
-    with db.cursor() as cur:
-        cur.execute(
-            'SELECT agent_ct, agent_t FROM wp_player_agents WHERE steamid = %s',
-            (_steamid(),),
-        )
-        row = cur.fetchone()
-    return jsonify(row or {'agent_ct': None, 'agent_t': None})
+    return _send_profile('agents')
 
 
 @player_bp.route('/agents', methods=['PUT'])
@@ -389,26 +641,15 @@ def save_agents():
     data, err = _json_body()
     if err:
         return err
-
-    agent_ct = str(data.get('agent_ct', '') or '')[:64] or None
-    agent_t = str(data.get('agent_t', '') or '')[:64] or None
-
-    if agent_ct is None and agent_t is None:
-        return jsonify({'error': 'Provide at least one of agent_ct or agent_t'}), 400
+    try:
+        agents = _parse_agents(data)
+    except _Invalid as exc:
+        return jsonify({'error': str(exc)}), 400
 
     db = get_db()
     with db.cursor() as cur:
-        cur.execute(
-            '''
-            INSERT INTO wp_player_agents (steamid, agent_ct, agent_t)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-                agent_ct = COALESCE(VALUES(agent_ct), agent_ct),
-                agent_t  = COALESCE(VALUES(agent_t),  agent_t)
-            ''',
-            (_steamid(), agent_ct, agent_t),
-        )
-    db.commit()
+        _write_agents(cur, _steamid(), agents)
+    _commit(db, _steamid())
     return jsonify({'status': 'ok'})
 
 
@@ -421,7 +662,7 @@ def delete_agents():
             'DELETE FROM wp_player_agents WHERE steamid = %s',
             (_steamid(),),
         )
-    db.commit()
+    _commit(db, _steamid())
     return jsonify({'status': 'ok'})
 
 
@@ -431,25 +672,296 @@ def delete_agents():
 @require_auth
 def get_profile():
     """Return all of the player's current selections in a single response."""
-    steamid = _steamid()
+    return _send_profile()
+
+
+# ── Bulk loadout save ─────────────────────────────────────────────────────────
+
+# Upper bound on entries per list, well above a full loadout for both teams.
+_LOADOUT_MAX_ITEMS = 256
+
+
+def _parse_list(data: dict, key: str, parse: Callable) -> list:
+    items = data.get(key) or []
+    if not isinstance(items, list):
+        raise _Invalid(f'{key} must be a list')
+    if len(items) > _LOADOUT_MAX_ITEMS:
+        raise _Invalid(f'{key} may contain at most {_LOADOUT_MAX_ITEMS} entries')
+    parsed = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise _Invalid(f'{key}[{i}] must be an object')
+        try:
+            parsed.append(parse(item))
+        except _Invalid as exc:
+            raise _Invalid(f'{key}[{i}]: {exc}') from exc
+    return parsed
+
+
+def _parse_loadout(data: dict, require_any: bool = True) -> dict:
+    """Validate a whole loadout body (the shape GET /profile returns) before any write."""
+    if not isinstance(data, dict):
+        raise _Invalid('Request body must be a JSON object')
+    agents = data.get('agents')
+    if agents is not None and not isinstance(agents, dict):
+        raise _Invalid('agents must be an object')
+    parsed = {
+        'skins': [row for rows in _parse_list(data, 'skins', _parse_skin) for row in rows],
+        'knives': _parse_list(data, 'knives', _parse_knife),
+        'gloves': _parse_list(data, 'gloves', _parse_gloves),
+        'agents': _parse_agents(agents) if agents else None,
+    }
+    if require_any and not any(parsed.values()):
+        raise _Invalid('Provide at least one of skins, knives, gloves or agents')
+    return parsed
+
+
+def _write_loadout(cur, steamid: str, loadout: dict) -> None:
+    _write_skins(cur, steamid, loadout['skins'], loadout.get('skins_upsert', _UPSERT_SKINS))
+    _write_knives(cur, steamid, loadout['knives'])
+    _write_gloves(cur, steamid, loadout['gloves'])
+    if loadout['agents']:
+        _write_agents(cur, steamid, loadout['agents'])
+
+
+_LOADOUT_TABLES = ('wp_player_skins', 'wp_player_knife', 'wp_player_gloves', 'wp_player_agents')
+
+
+def _apply_loadout(steamid: str, loadout: dict, replace: bool = False) -> Response:
+    """Write a parsed loadout in one transaction; with replace, clear the player's selections first."""
+    if replace:
+        _discard_queued(steamid, ((row[0], row[1]) for row in writebehind.pending(steamid)))
+    _discard_queued(steamid, ((row[0], row[1]) for row in loadout['skins']))
     db = get_db()
-    with db.cursor() as cur:
-        cur.execute('SELECT * FROM wp_player_skins WHERE steamid = %s ORDER BY weapon_team, weapon_defindex', (steamid,))
-        skins = [_process_skin_row(r) for r in cur.fetchall()]
+    try:
+        with db.cursor() as cur:
+            if replace:
+                for table in _LOADOUT_TABLES:
+                    cur.execute(f'DELETE FROM {table} WHERE steamid = %s', (steamid,))
+            _write_loadout(cur, steamid, loadout)
+        _commit(db, steamid)
+    except Exception:
+        db.rollback()
+        raise
+    return jsonify({
+        'status': 'ok',
+        'saved': {
+            'skins': len(loadout['skins']),
+            'knives': len(loadout['knives']),
+            'gloves': len(loadout['gloves']),
+            'agents': int(loadout['agents'] is not None),
+        },
+    })
 
-        cur.execute('SELECT weapon_team, knife FROM wp_player_knife WHERE steamid = %s', (steamid,))
-        knives = cur.fetchall()
 
-        cur.execute('SELECT weapon_team, weapon_defindex FROM wp_player_gloves WHERE steamid = %s', (steamid,))
-        gloves = cur.fetchall()
+@player_bp.route('/loadout', methods=['PUT'])
+@require_auth
+def save_loadout():
+    """Save skins, knives, gloves and agents in one transaction.
 
-        cur.execute('SELECT agent_ct, agent_t FROM wp_player_agents WHERE steamid = %s', (steamid,))
-        agents = cur.fetchone() or {'agent_ct': None, 'agent_t': None}
+    Body: {"skins": [...], "knives": [...], "gloves": [...], "agents": {...}},
+    each entry shaped like the matching single-item PUT; every key is
+    optional. Nothing is written unless the whole body validates, and a
+    failure part-way rolls back every table.
+    """
+    data, err = _json_body()
+    if err:
+        return err
+    try:
+        loadout = _parse_loadout(data)
+    except _Invalid as exc:
+        return jsonify({'error': str(exc)}), 400
 
-    return jsonify({
-        'steamid': steamid,
-        'skins': skins,
-        'knives': knives,
-        'gloves': gloves,
+    return _apply_loadout(_steamid(), loadout)
+
+
+# ── Loadout codes (export / import) ───────────────────────────────────────────
+
+# A code is "<version>.<base64url(zlib(json))>". The JSON holds positional
+# rows with trailing defaults dropped, so a full loadout fits in a couple of
+# kilobytes. Version 2 skin rows carry every wp_player_skins column
+# (_SKIN_CODE_FIELDS): a sticker in the plugin's default placement is stored
+# as its kit ID, any other sticker or keychain as the stored string.
+# Version 1 codes (kit IDs only, no keychain or StatTrak count) still import.
+_LOADOUT_CODE_VERSION = 2
+_LOADOUT_CODE_MAX_CHARS = 32768
+_LOADOUT_CODE_MAX_BYTES = 262144
+_SKIN_CODE_FIELDS = (*_SKIN_ROW_FIELDS, 'weapon_stattrak_count', 'weapon_keychain')
+_KNIFE_ROW_FIELDS = ('weapon_team', 'knife')
+_GLOVES_ROW_FIELDS = ('weapon_team', 'weapon_defindex')
+# Sticker and keychain strings: semicolon-separated numbers.
+_PACKED_RE = re.compile(r'-?\d+(?:\.\d+)?(?:;-?\d+(?:\.\d+)?)*')
+
+
+def _trim_row(values: list, keep: int) -> list:
+    """Drop trailing empty values past the first keep columns (which may be 0)."""
+    while len(values) > keep and not values[-1]:
+        values.pop()
+    return values
+
+
+def _sticker_code(raw) -> int | str:
+    kit_id = _parse_sticker(raw)
+    return kit_id if not raw or raw == _fmt_sticker(kit_id) else raw
+
+
+def _skin_code_row(skin: dict) -> list:
+    values = [skin.get(f) for f in _SKIN_CODE_FIELDS]
+    for i in range(5):
+        values[_SKIN_CODE_FIELDS.index(f'weapon_sticker_{i}')] = _sticker_code(skin.get(f'weapon_sticker_{i}'))
+    if skin.get('weapon_keychain') == _DEFAULT_KEYCHAIN:
+        values[-1] = None
+    # Wear 0.0 is a real value, not the import default; always keep it and the seed.
+    return _trim_row(values, _SKIN_CODE_FIELDS.index('weapon_seed') + 1)
+
+
+def _encode_loadout(profile: dict) -> str:
+    """Code for a profile whose skins are raw wp_player_skins rows (stored sticker strings)."""
+    agents = profile['agents']
+    payload = {
+        's': [_skin_code_row(s) for s in profile['skins']],
+        'k': [[k[f] for f in _KNIFE_ROW_FIELDS] for k in profile['knives']],
+        'g': [[g[f] for f in _GLOVES_ROW_FIELDS] for g in profile['gloves']],
+        'a': [agents['agent_ct'], agents['agent_t']],
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    body = base64.urlsafe_b64encode(zlib.compress(raw, 9)).rstrip(b'=').decode()
+    return f'{_LOADOUT_CODE_VERSION}.{body}'
+
+
+def _code_rows(payload: dict, key: str, fields: tuple) -> list[dict]:
+    rows = payload.get(key) or []
+    if not isinstance(rows, list) or not all(isinstance(r, list) and len(r) <= len(fields) for r in rows):
+        raise _Invalid('Malformed loadout code')
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def _packed(value, what: str) -> str:
+    if not isinstance(value, str) or len(value) > 128 or not _PACKED_RE.fullmatch(value):
+        raise _Invalid(f'Invalid {what}')
+    return value
+
+
+def _code_sticker(raw) -> str:
+    """A version 2 sticker value (kit ID or stored string) as its DB string."""
+    if raw is None:
+        raw = 0
+    if isinstance(raw, str):
+        kit_id = _parse_sticker(_packed(raw, 'sticker'))
+    elif isinstance(raw, int) and not isinstance(raw, bool):
+        kit_id = raw
+    else:
+        raise _Invalid('Invalid sticker')
+    if kit_id < 0:
+        raise _Invalid('Invalid sticker')
+    return raw if isinstance(raw, str) else _fmt_sticker(kit_id)
+
+
+def _parse_code_skin(data: dict) -> list[tuple]:
+    """A version 2 skin row as _UPSERT_SKINS_EXACT rows (see _parse_skin)."""
+    stickers = [_code_sticker(data.pop(f'weapon_sticker_{i}', None)) for i in range(5)]
+    keychain = _packed(data.pop('weapon_keychain', None) or _DEFAULT_KEYCHAIN, 'keychain')
+    stattrak_count = data.pop('weapon_stattrak_count', None) or 0
+    if isinstance(stattrak_count, bool) or not isinstance(stattrak_count, int) or stattrak_count < 0:
+        raise _Invalid('Invalid StatTrak count')
+    data['weapon_nametag'] = data.get('weapon_nametag') or ''
+    return [(*row[:7], *stickers, stattrak_count, keychain) for row in _parse_skin(data)]
+
+
+def _decode_loadout(code) -> dict:
+    """Validate a loadout code into the loadout _apply_loadout writes; an empty one is valid."""
+    if not isinstance(code, str) or len(code) > _LOADOUT_CODE_MAX_CHARS:
+        raise _Invalid('Malformed loadout code')
+    version, sep, body = code.strip().partition('.')
+    if not sep or not version.isdigit():
+        raise _Invalid('Malformed loadout code')
+    if int(version) not in (1, _LOADOUT_CODE_VERSION):
+        raise _Invalid(f'Unsupported loadout code version {version}')
+    try:
+        inflater = zlib.decompressobj()
+        raw = inflater.decompress(base64.urlsafe_b64decode(body + '=' * (-len(body) % 4)),
+                                  _LOADOUT_CODE_MAX_BYTES)
+        payload = None if inflater.unconsumed_tail else json.loads(raw)
+    except (ValueError, zlib.error) as exc:
+        raise _Invalid('Malformed loadout code') from exc
+    if inflater.unconsumed_tail:
+        raise _Invalid('Loadout code is too large')
+    if not isinstance(payload, dict):
+        raise _Invalid('Malformed loadout code')
+
+    agents = payload.get('a') or [None, None]
+    if not isinstance(agents, list) or len(agents) != 2:
+        raise _Invalid('Malformed loadout code')
+    agents = {'agent_ct': agents[0], 'agent_t': agents[1]} if any(agents) else None
+    if int(version) == 1:
+        return _parse_loadout({
+            'skins': _code_rows(payload, 's', _SKIN_ROW_FIELDS),
+            'knives': _code_rows(payload, 'k', _KNIFE_ROW_FIELDS),
+            'gloves': _code_rows(payload, 'g', _GLOVES_ROW_FIELDS),
+            'agents': agents,
+        }, require_any=False)
+    loadout = _parse_loadout({
+        'knives': _code_rows(payload, 'k', _KNIFE_ROW_FIELDS),
+        'gloves': _code_rows(payload, 'g', _GLOVES_ROW_FIELDS),
         'agents': agents,
+    }, require_any=False)
+    skin_rows = _parse_list({'skins': _code_rows(payload, 's', _SKIN_CODE_FIELDS)}, 'skins', _parse_code_skin)
+    loadout['skins'] = [row for rows in skin_rows for row in rows]
+    loadout['skins_upsert'] = _UPSERT_SKINS_EXACT
+    return loadout
+
+
+@player_bp.route('/loadout/export', methods=['GET'])
+@require_auth
+def export_loadout():
+    """Return the player's whole selection set as a shareable loadout code."""
+    steamid = _steamid()
+    profile = json.loads(_profile_json(steamid, _revision(steamid)))
+    # The cached profile has sticker kit IDs only; the code needs the stored strings.
+    with get_read_db(steamid).cursor() as cur:
+        cur.execute('SELECT * FROM wp_player_skins WHERE steamid = %s ORDER BY weapon_team, weapon_defindex', (steamid,))
+        profile['skins'] = cur.fetchall()
+    queued = writebehind.pending(steamid)
+    if queued:
+        _overlay_skins(profile, queued, raw=True)
+    resp = jsonify({
+        'version': _LOADOUT_CODE_VERSION,
+        'code': _encode_loadout(profile),
+        'counts': {
+            'skins': len(profile['skins']),
+            'knives': len(profile['knives']),
+            'gloves': len(profile['gloves']),
+            'agents': int(any(profile['agents'].values())),
+        },
     })
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp
+
+
+@player_bp.route('/loadout/import', methods=['POST'])
+@require_auth
+def import_loadout():
+    """Apply a loadout code (from this or another player's export) in one transaction.
+
+    Body: {"code": "...", "replace": false}. By default the code's selections
+    are saved over the matching ones; with replace, every existing selection
+    is removed first, restoring the loadout exactly — keychains, StatTrak
+    counts and sticker strings included. A code for an empty loadout is
+    valid: with replace it clears every selection.
+    """
+    data, err = _json_body()
+    if err:
+        return err
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    err = _require_fields(data, 'code')
+    if err:
+        return err
+    try:
+        loadout = _decode_loadout(data['code'])
+    except _Invalid as exc:
+        return jsonify({'error': str(exc)}), 400
+    replace = data.get('replace', False)
+    if not isinstance(replace, bool):
+        return jsonify({'error': 'replace must be true or false'}), 400
+    return _apply_loadout(_steamid(), loadout, replace=replace)
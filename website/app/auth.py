@@ -1,4 +1,8 @@
-"""Steam OpenID 2.0 authentication."""
+"""Steam OpenID 2.0 authentication.
+
+Names and avatars come from the shared Steam profile cache (app/steam.py),
+so logging in never waits on GetPlayerSummaries.
+"""
 import re
 import logging
 from urllib.parse import urlencode
@@ -6,6 +10,8 @@ from urllib.parse import urlencode
 import requests
 from flask import Blueprint, redirect, request, session, current_app, jsonify
 
+from . import outbound, steam
+
 logger = logging.getLogger(__name__)
 
 auth_bp = Blueprint('auth', __name__)
@@ -42,7 +48,7 @@ def steam_callback():
     # Verify with Steam
     params['openid.mode'] = 'check_authentication'
     try:
-        resp = requests.post(_STEAM_OPENID_URL, data=params, timeout=10)
+        resp = outbound.post('steam_openid', _STEAM_OPENID_URL, data=params)
         resp.raise_for_status()
     except requests.RequestException:
         logger.exception('Steam OpenID verification request failed')
@@ -56,7 +62,7 @@ def steam_callback():
         return jsonify({'error': 'Could not extract SteamID'}), 401
 
     steamid = match.group(1)
-    profile = _fetch_steam_profile(steamid)
+    profile = steam.lookup(steamid)
 
     session.permanent = True
     session['steamid'] = steamid
@@ -74,32 +80,18 @@ def logout():
 
 @auth_bp.route('/me')
 def me():
-    """Return current session user or 401."""
+    """Return current session user or 401.
+
+    Name and avatar come from the Steam profile cache when it has them, so
+    a first login's placeholder and later renames are picked up.
+    """
     if 'steamid' not in session:
         return jsonify({'authenticated': False}), 401
+    profile = steam.lookup(session['steamid'])
     return jsonify({
         'authenticated': True,
         'steamid': session['steamid'],
-        'name': session.get('steam_name'),
-        'avatar': session.get('steam_avatar'),
+        'name': profile.get('personaname') or session.get('steam_name'),
+        'avatar': profile.get('avatarfull') or session.get('steam_avatar'),
     })
 
-
-# ── Internal helpers ──────────────────────────────────────────────────────────
-
-def _fetch_steam_profile(steamid: str) -> dict:
-    try:
-        resp = requests.get(
-            'https://api.steampowered.com/ISteamUser/GetPlayerSummaries/v2/',
-            params={
-                'key': current_app.config['STEAM_API_KEY'],
-                'steamids': steamid,
-            },
-            timeout=10,
-        )
-        resp.raise_for_status()
-        players = resp.json().get('response', {}).get('players', [])
-        return players[0] if players else {}
-    except Exception:
-        logger.exception('Failed to fetch Steam profile for %s', steamid)
-        return {}
@@ -1,34 +1,686 @@
-"""Thread-safe in-memory cache for the skin catalog fetched from bymykel's API."""
+"""Thread-safe catalog cache for bymykel's API, shared across Gunicorn workers.
+
+Each catalog is downloaded by a single process and written to a compact
+snapshot under CATALOG_CACHE_DIR. The other workers load that snapshot
+instead of hitting GitHub themselves; a per-catalog flock makes sure only one
+process fetches at a time. Upstream requests are conditional on the
+snapshot's ETag/Last-Modified, and a worker that starts with an empty cache
+serves the existing snapshot (however old) while it is revalidated, so cold
+starts never wait on GitHub once a snapshot exists.
+
+With CATALOG_PRELOAD (Gunicorn's preload_app, see gunicorn.conf.py) the
+master loads every snapshot and its views before forking, so the workers
+start with one parsed copy shared copy-on-write instead of four. No thread
+runs in the master; each worker revalidates and refreshes on its own after
+the fork, and a catalog that changes upstream is then held per worker until
+the workers are next restarted.
+
+Within a worker, refreshes are single-flight and stale-while-revalidate: once
+a catalog has been loaded, callers always get the copy in memory straight
+away while at most one thread per URL renews it. A background refresher renews
+entries shortly before they expire, and a failed refresh keeps serving the
+last good copy.
+
+Every entry carries a content-hash version. Catalogs with a model (see
+_MODELS) get it built once per version, and artifacts derived from a catalog
+(category views, serialized responses) are memoised against that version via
+get_view(), so they are built once per catalog change rather than per request.
+
+Per-item digests of the last few versions are kept next to the snapshot, so
+get_delta() can tell a client which items changed since the version it holds;
+the ids in views over part of a catalog (_HISTORY_GROUPS) are kept with them.
+"""
+import os
+import sys
+import json
+import math
 import time
+import fcntl
+import hashlib
+import tempfile
 import threading
 import logging
-from typing import Any
+from typing import Any, Callable, TypeVar
 
-import requests
+from . import cooperative, metrics, outbound
+from .catalog_index import SkinCatalog, to_dicts
 
 logger = logging.getLogger(__name__)
 
 _BYMYKEL = 'https://raw.githubusercontent.com/ByMykel/CSGO-API/main/public/api/en'
 
+# Catalog name → file under _BYMYKEL.
+_CATALOGS: dict[str, str] = {
+    'skins':    'skins.json',
+    'stickers': 'stickers.json',
+    'agents':   'agents.json',
+}
+
+# Catalog name → model built once per version; get_view() builders receive the
+# model instead of the raw list for these.
+_MODELS: dict[str, Callable[[Any], Any]] = {
+    'skins': SkinCatalog,
+}
+
+# Catalog name → item ids per view that serves only part of it, from the model.
+# Kept in the history so get_delta() can scope a view's removals to that view.
+_HISTORY_GROUPS: dict[str, Callable[[Any], dict[str, list[str]]]] = {
+    'skins': lambda model: {
+        'knives': [str(rec.raw.get('id')) for rec in model.knives],
+        'gloves': [str(rec.raw.get('id')) for rec in model.gloves],
+    },
+}
+
+T = TypeVar('T')
+
+# Entries are renewed by the background refresher once this share of the TTL has passed.
+_REFRESH_AHEAD = 0.8
+# Minimum delay between retries after a failed refresh of the same URL.
+_RETRY_AFTER = 60
+_REFRESHER_INTERVAL = 30
+# Strings up to this length are interned when a catalog is parsed.
+_INTERN_MAX_LEN = 64
+# Past catalog versions whose item digests are kept for get_delta().
+_HISTORY_VERSIONS = 6
+# A read refreshes an artifact's mtime (for prune_artifacts) once it is this old.
+_ARTIFACT_TOUCH_AFTER = 3600
+
 _store: dict[str, dict] = {}
 _lock = threading.Lock()
+_inflight: dict[str, threading.Event] = {}
+_refresher: threading.Thread | None = None
+# Version history per URL when there is no snapshot dir to keep it in.
+_history: dict[str, list[dict]] = {}
+_warmers: list[Callable[[int], None]] = []
+# Set while preload() runs in the Gunicorn master: nothing may start a thread before the fork.
+_preloading = False
 
+# Set by init_app(); None disables the on-disk snapshot (per-process fetches only).
+_snapshot_dir: str | None = None
 
-def _fetch(url: str, ttl: int) -> Any:
-    with _lock:
-        entry = _store.get(url)
-        if entry and (time.time() - entry['ts']) < ttl:
-            return entry['data']
 
-    logger.info('Fetching catalog from %s', url)
-    resp = requests.get(url, timeout=30)
+def init_app(app, warm: bool = True) -> None:
+    """Point the cache at the shared snapshot directory from the app config.
+
+    With warm, existing snapshots and views are loaded in a background thread,
+    or right away with CATALOG_PRELOAD.
+    """
+    global _snapshot_dir
+    path = app.config.get('CATALOG_CACHE_DIR')
+    if not path:
+        return
+    try:
+        os.makedirs(path, exist_ok=True)
+    except OSError:
+        logger.exception('Catalog cache dir %s unavailable — falling back to per-worker fetches', path)
+        return
+    _snapshot_dir = path
+
+    ttl = app.config.get('SKIN_CACHE_TTL', 3600)
+    if warm and app.config.get('CATALOG_PRELOAD'):
+        preload(ttl)
+    elif warm and any(os.path.exists(os.path.join(path, name)) for name in _CATALOGS.values()):
+        threading.Thread(target=_warm, args=(ttl,), name='catalog-warm', daemon=True).start()
+
+
+def catalogs() -> list[str]:
+    """Names of the catalogs this cache serves."""
+    return list(_CATALOGS)
+
+
+def register_warmer(fn: Callable[[int], None]) -> None:
+    """Register fn(ttl) to prebuild views whenever catalogs are (re)loaded."""
+    _warmers.append(fn)
+
+
+def _run_warmers(ttl: int) -> None:
+    for fn in _warmers:
+        try:
+            fn(ttl)
+        except Exception:
+            logger.exception('Catalog warmer %s failed', getattr(fn, '__qualname__', fn))
+
+
+def _warm(ttl: int) -> None:
+    """Load every catalog from its snapshot so the first requests find it in memory."""
+    for name in _CATALOGS.values():
+        try:
+            _fetch_entry(f'{_BYMYKEL}/{name}', ttl)
+        except Exception:
+            pass  # already logged; requests will retry
+    _run_warmers(ttl)
+
+
+def preload(ttl: int) -> int:
+    """Load every snapshot, however old, and build its views in this thread; returns how many.
+
+    For a process about to fork: no refresh or refresher thread is started,
+    and nothing is downloaded. The workers revalidate stale copies themselves.
+    """
+    global _preloading
+    _preloading = True
+    loaded = 0
+    try:
+        for name in _CATALOGS.values():
+            url = f'{_BYMYKEL}/{name}'
+            path = _snapshot_path(url)
+            entry = _load_snapshot(path, math.inf, None) if path else None
+            if entry is not None:
+                entry['ttl'] = ttl
+                with _lock:
+                    _store[url] = entry
+                loaded += 1
+        if loaded:
+            _run_warmers(ttl)
+    finally:
+        _preloading = False
+    return loaded
+
+
+def _artifact_path(name: str) -> str | None:
+    if not _snapshot_dir:
+        return None
+    return os.path.join(_snapshot_dir, 'artifacts', name)
+
+
+def read_artifact(name: str) -> bytes | None:
+    """Return a build artifact another process stored under name, if any.
+
+    A read marks the artifact as in use (its mtime), so prune_artifacts()
+    keeps it however long ago it was built.
+    """
+    path = _artifact_path(name)
+    if path is None:
+        return None
+    try:
+        with open(path, 'rb') as fh:
+            data = fh.read()
+            if os.fstat(fh.fileno()).st_mtime < time.time() - _ARTIFACT_TOUCH_AFTER:
+                os.utime(fh.fileno())
+        return data
+    except OSError:
+        return None
+
+
+def write_artifact(name: str, data: bytes) -> None:
+    """Store a build artifact for other workers; failures only cost a rebuild."""
+    path = _artifact_path(name)
+    if path is None:
+        return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique per call: threads of one worker may build the same artifact at once.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f'.{name}.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(data)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+        except OSError:
+            os.unlink(tmp)
+            raise
+    except OSError:
+        logger.warning('Could not write catalog artifact %s', path)
+
+
+def prune_artifacts(max_age: float) -> int:
+    """Delete artifacts not used for max_age seconds; returns how many were removed."""
+    path = _artifact_path('')
+    if path is None or not os.path.isdir(path):
+        return 0
+    removed = 0
+    cutoff = time.time() - max_age
+    for name in os.listdir(path):
+        full = os.path.join(path, name)
+        try:
+            if os.stat(full).st_mtime < cutoff:
+                os.remove(full)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def _snapshot_path(url: str) -> str | None:
+    if not _snapshot_dir:
+        return None
+    return os.path.join(_snapshot_dir, url.rsplit('/', 1)[-1])
+
+
+def _encode(data: Any) -> bytes:
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def _compact(value: Any, shared: dict) -> Any:
+    """Intern short strings and share identical flat dicts across a parsed catalog.
+
+    bymykel repeats the same rarity/category/weapon/team objects on thousands of
+    items; after this they are one object each. Shared dicts must not be mutated.
+    """
+    if isinstance(value, str):
+        return sys.intern(value) if len(value) <= _INTERN_MAX_LEN else value
+    if isinstance(value, list):
+        return [_compact(v, shared) for v in value]
+    if isinstance(value, dict):
+        out = {k: _compact(v, shared) for k, v in value.items()}
+        if all(v is None or isinstance(v, (str, int, float)) for v in out.values()):
+            return shared.setdefault(tuple(out.items()), out)
+        return out
+    return value
+
+
+def _parse(raw: bytes | str) -> Any:
+    return _compact(json.loads(raw), {})
+
+
+def _version(raw: bytes) -> str:
+    return hashlib.sha1(raw).hexdigest()[:16]
+
+
+def _meta_path(path: str) -> str:
+    return f'{path}.meta'
+
+
+def _read_meta(path: str) -> dict:
+    """Return the snapshot's upstream validators and version, or {}."""
+    try:
+        with open(_meta_path(path), 'rb') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _load_snapshot(path: str, max_age: float, current: dict | None) -> dict | None:
+    """Return a cache entry from disk if the snapshot is within max_age and newer than current."""
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+    if (time.time() - mtime) >= max_age:
+        return None
+    if current is not None:
+        if mtime <= current['ts']:
+            return None
+        if _read_meta(path).get('version') == current['version']:
+            # Revalidated upstream without changes: no need to parse it again.
+            return {'data': current['data'], 'ts': mtime, 'version': current['version']}
+    try:
+        with open(path, 'rb') as fh:
+            raw = fh.read()
+        data = _parse(raw)
+    except (OSError, ValueError):
+        logger.warning('Ignoring unreadable catalog snapshot %s', path)
+        return None
+    return {'data': data, 'ts': mtime, 'version': _version(raw)}
+
+
+def _write_snapshot(path: str, data: Any, validators: dict) -> dict:
+    """Atomically replace the snapshot and its meta; returns the matching cache entry."""
+    raw = _encode(data)
+    version = _version(raw)
+    # Meta goes first: a reader that sees the new version in it but the old
+    # snapshot just parses the file, so the two can never be mixed up.
+    for target, body in ((_meta_path(path), _encode(dict(validators, version=version))), (path, raw)):
+        tmp = f'{target}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as fh:
+            fh.write(body)
+        os.replace(tmp, target)
+    return {'data': data, 'ts': os.stat(path).st_mtime, 'version': version}
+
+
+def _item_digests(data: Any) -> dict[str, str]:
+    """Map each item id to a short digest of its content."""
+    return {
+        str(item['id']): hashlib.sha1(_encode(item)).hexdigest()[:12]
+        for item in data
+        if isinstance(item, dict) and item.get('id') is not None
+    }
+
+
+def _history_path(url: str) -> str | None:
+    path = _snapshot_path(url)
+    return f'{path}.history' if path else None
+
+
+def _read_history(url: str) -> list[dict]:
+    path = _history_path(url)
+    if path is None:
+        return _history.get(url, [])
+    try:
+        with open(path, 'rb') as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError):
+        logger.warning('Ignoring unreadable catalog history %s', path)
+        return []
+
+
+def _record_history(url: str, entry: dict) -> None:
+    """Append entry's item digests to url's history if it is a new version.
+
+    On disk the caller must hold the catalog's flock.
+    """
+    history = _read_history(url)
+    if history and history[-1]['version'] == entry['version']:
+        return
+    record = {'version': entry['version'], 'items': _entry_view(entry, 'digests', _item_digests, entry['data'])}
+    catalog = next((c for c, name in _CATALOGS.items() if url == f'{_BYMYKEL}/{name}'), None)
+    if catalog in _HISTORY_GROUPS:
+        record['groups'] = _entry_view(entry, 'groups', _HISTORY_GROUPS[catalog], _model(catalog, entry))
+    history = (history + [record])[-_HISTORY_VERSIONS:]
+    path = _history_path(url)
+    if path is None:
+        _history[url] = history
+        return
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as fh:
+        fh.write(_encode(history))
+    os.replace(tmp, path)
+
+
+def _download(url: str, validators: dict | None = None) -> tuple[Any | None, dict]:
+    """GET url, conditionally when validators are known.
+
+    Returns (data, validators); data is None when upstream answered 304.
+    """
+    headers = {}
+    if validators:
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+    logger.info('%s catalog from %s', 'Revalidating' if headers else 'Fetching', url)
+    resp = outbound.get('bymykel', url, headers=headers)
+    if resp.status_code == 304 and headers:
+        return None, validators
     resp.raise_for_status()
-    data = resp.json()
+    return _parse(resp.content), {
+        'etag': resp.headers.get('ETag'),
+        'last_modified': resp.headers.get('Last-Modified'),
+    }
+
+
+def _revalidate(url: str, path: str, current: dict | None) -> dict:
+    """Bring the snapshot at path up to date with upstream. Caller holds the flock."""
+    validators = _read_meta(path) if os.path.exists(path) else None
+    data, validators = _download(url, validators)
+    if data is None:
+        # Unchanged: bumping the mtime marks the snapshot fresh for every worker.
+        os.utime(path)
+        loaded = _load_snapshot(path, math.inf, current)
+        if loaded is not None:
+            return loaded
+        data, validators = _download(url)
+    loaded = _write_snapshot(path, data, validators)
+    _record_history(url, loaded)
+    return loaded
+
+
+def _load(url: str, ttl: int, current: dict | None) -> dict:
+    """Produce a fresh entry from the shared snapshot or, failing that, upstream."""
+    path = _snapshot_path(url)
+    if path is None:
+        data, validators = _download(url, current.get('validators') if current else None)
+        if data is None:
+            return {'data': current['data'], 'ts': time.time(),
+                    'version': current['version'], 'validators': validators}
+        loaded = {'data': data, 'ts': time.time(), 'version': _version(_encode(data)),
+                  'validators': validators}
+        _record_history(url, loaded)
+        return loaded
+
+    # On a cold start any snapshot, however old, beats waiting on GitHub; the
+    # caller revalidates a stale one in the background.
+    max_age = ttl if current is not None else math.inf
+    # Another worker may already have refreshed the snapshot.
+    loaded = _load_snapshot(path, max_age, current)
+    if loaded is not None:
+        return loaded
+    with open(f'{path}.lock', 'w') as lock_fh:
+        # Waits for another worker's download; off the event loop under gevent.
+        cooperative.run_blocking(fcntl.flock, lock_fh, fcntl.LOCK_EX)
+        try:
+            # Re-check now that we hold the lock: the previous holder
+            # has most likely just written a fresh copy.
+            loaded = _load_snapshot(path, max_age, current)
+            if loaded is None:
+                loaded = _revalidate(url, path, current)
+        finally:
+            fcntl.flock(lock_fh, fcntl.LOCK_UN)
+    return loaded
+
+
+def _refresh(url: str, ttl: int, done: threading.Event) -> None:
+    """Run one refresh for url. The caller must have registered done in _inflight."""
+    try:
+        with _lock:
+            entry = _store.get(url)
+        started = time.perf_counter()
+        try:
+            loaded = _load(url, ttl, entry)
+        except Exception as exc:
+            metrics.observe('catalog_refresh_duration_seconds', time.perf_counter() - started,
+                            catalog=_catalog_name(url), outcome='error')
+            if entry is None:
+                logger.exception('Failed to fetch catalog %s', url)
+            else:
+                logger.warning('Catalog refresh failed for %s, serving last good copy: %s', url, exc)
+            with _lock:
+                if url in _store:
+                    _store[url]['failed_at'] = time.time()
+            raise
+        metrics.observe('catalog_refresh_duration_seconds', time.perf_counter() - started,
+                        catalog=_catalog_name(url), outcome='ok')
+        loaded['ttl'] = ttl
+        if entry and entry['version'] == loaded['version']:
+            # Unchanged upstream: keep the data and artifacts already built for it.
+            loaded['data'] = entry['data']
+            loaded['views'] = entry.get('views', {})
+        with _lock:
+            _store[url] = loaded
+    finally:
+        with _lock:
+            _inflight.pop(url, None)
+        done.set()
+
+
+def _claim(url: str) -> tuple[threading.Event, bool]:
+    """Return (event, owner) for url's refresh; owner is True if we must run it."""
+    with _lock:
+        event = _inflight.get(url)
+        if event is not None:
+            return event, False
+        event = _inflight[url] = threading.Event()
+        return event, True
+
+
+def _refresh_in_background(url: str, ttl: int) -> None:
+    if _preloading:
+        return
+    event, owner = _claim(url)
+    if not owner:
+        return
+
+    def run():
+        with _lock:
+            before = _store.get(url, {}).get('version')
+        try:
+            _refresh(url, ttl, event)
+        except Exception:
+            return  # already logged; last good copy stays in place
+        with _lock:
+            after = _store.get(url, {}).get('version')
+        if after != before:
+            _run_warmers(ttl)
+
+    threading.Thread(target=run, name='catalog-refresh', daemon=True).start()
+
+
+def _refresher_loop() -> None:
+    while True:
+        time.sleep(_REFRESHER_INTERVAL)
+        now = time.time()
+        with _lock:
+            due = [
+                (url, entry['ttl']) for url, entry in _store.items()
+                if now - entry['ts'] >= entry['ttl'] * _REFRESH_AHEAD
+                and now - entry.get('failed_at', 0) >= _RETRY_AFTER
+            ]
+        for url, ttl in due:
+            _refresh_in_background(url, ttl)
+
+
+def _ensure_refresher() -> None:
+    """Start the per-worker refresher thread (lazily, so it runs post-fork)."""
+    global _refresher
+    if _preloading:
+        return
+    with _lock:
+        if _refresher is not None and _refresher.is_alive():
+            return
+        _refresher = threading.Thread(target=_refresher_loop, name='catalog-refresher', daemon=True)
+        _refresher.start()
 
+
+def _catalog_name(url: str) -> str:
+    return url.rsplit('/', 1)[-1].removesuffix('.json')
+
+
+def _fetch_entry(url: str, ttl: int) -> dict:
+    if _refresher is None:
+        # Entries preloaded before the fork never take the cold path below.
+        _ensure_refresher()
     with _lock:
-        _store[url] = {'data': data, 'ts': time.time()}
+        entry = _store.get(url)
+        if entry:
+            entry['ttl'] = ttl
+    if entry:
+        now = time.time()
+        stale = now - entry['ts'] >= ttl
+        metrics.inc('catalog_cache_requests_total', catalog=_catalog_name(url), result='stale' if stale else 'hit')
+        if stale and now - entry.get('failed_at', 0) >= _RETRY_AFTER:
+            _refresh_in_background(url, ttl)
+        return entry
+
+    # Cold: nothing to serve yet, so wait for a single shared fetch.
+    metrics.inc('catalog_cache_requests_total', catalog=_catalog_name(url), result='miss')
+    _ensure_refresher()
+    event, owner = _claim(url)
+    if owner:
+        _refresh(url, ttl, event)
+    else:
+        event.wait()
+    with _lock:
+        entry = _store.get(url)
+    if entry is None:
+        raise RuntimeError(f'Catalog {url} is unavailable')
+    if time.time() - entry['ts'] >= ttl:
+        # Cold start from an old snapshot: serve it, revalidate behind it.
+        _refresh_in_background(url, ttl)
+    return entry
+
+
+def _fetch(url: str, ttl: int) -> Any:
+    return _fetch_entry(url, ttl)['data']
+
+
+def _entry_view(entry: dict, view: str, build: Callable[[Any], T], source: Any) -> T:
+    views = entry.setdefault('views', {})
+    if view not in views:
+        # Two threads may race to build the same view; both results are identical.
+        views[view] = build(source)
+    return views[view]
+
+
+def _model(catalog: str, entry: dict) -> Any:
+    factory = _MODELS.get(catalog)
+    if factory is None:
+        return entry['data']
+    return _entry_view(entry, 'model', factory, entry['data'])
 
-    return data
+
+def refresh(catalog: str, ttl: int = 3600) -> str:
+    """Synchronously bring a catalog up to date; returns its version.
+
+    Unlike the request path this never settles for a stale snapshot: a stale
+    one is revalidated against upstream before returning.
+    """
+    url = f'{_BYMYKEL}/{_CATALOGS[catalog]}'
+    for _ in range(2):
+        event, owner = _claim(url)
+        if owner:
+            _refresh(url, ttl, event)
+        else:
+            event.wait()
+        with _lock:
+            entry = _store.get(url)
+        if entry is None:
+            raise RuntimeError(f'Catalog {url} is unavailable')
+        if time.time() - entry['ts'] < ttl:
+            break
+    return entry['version']
+
+
+def get_view(catalog: str, view: str, build: Callable[[Any], T], ttl: int = 3600) -> tuple[str, T]:
+    """Return (version, build(model)) for a catalog, memoised per catalog version.
+
+    The builder gets the catalog's model (or its raw list if it has none) for the
+    same version, so a view can never mix data from two catalog versions. view
+    names the artifact; the same view must always use the same builder.
+    """
+    entry = _fetch_entry(f'{_BYMYKEL}/{_CATALOGS[catalog]}', ttl)
+    return entry['version'], _entry_view(entry, view, build, _model(catalog, entry))
+
+
+def get_delta(catalog: str, since: str, ttl: int = 3600, group: str | None = None) -> tuple[str, dict | None]:
+    """Return (version, delta) describing item changes from version since to now.
+
+    delta holds 'added', 'changed' and 'removed' lists of item ids, or is None
+    when since is not among the kept versions and the caller needs a full copy.
+    With group (a _HISTORY_GROUPS view), 'removed' only lists items that were
+    in that view at since and are not in it now.
+    """
+    url = f'{_BYMYKEL}/{_CATALOGS[catalog]}'
+    entry = _fetch_entry(url, ttl)
+    version = entry['version']
+    if since == version:
+        return version, {'added': [], 'changed': [], 'removed': []}
+    view = f'delta:{since}' if group is None else f'delta:{since}:{group}'
+    views = entry.get('views', {})
+    if view in views:
+        return version, views[view]
+
+    # History is read once per entry; only known versions get memoised deltas.
+    history = _entry_view(entry, 'history', lambda _: {h['version']: h for h in _read_history(url)}, None)
+    record = history.get(since)
+    if record is None:
+        return version, None
+    old = record['items']
+    if group is not None:
+        # Histories written before groups were recorded cannot scope removals.
+        old_group = record.get('groups', {}).get(group)
+        if old_group is None or catalog not in _HISTORY_GROUPS:
+            return version, None
+
+    def build(_) -> dict:
+        current = _entry_view(entry, 'digests', _item_digests, entry['data'])
+        if group is None:
+            removed = [i for i in old if i not in current]
+        else:
+            groups = _entry_view(entry, 'groups', _HISTORY_GROUPS[catalog], _model(catalog, entry))
+            in_group = set(groups.get(group, ()))
+            removed = [i for i in old_group if i not in in_group]
+        return {
+            'added':   [i for i in current if i not in old],
+            'changed': [i for i, d in current.items() if i in old and old[i] != d],
+            'removed': removed,
+        }
+    return version, _entry_view(entry, view, build, None)
+
+
+def get_skin_catalog(ttl: int = 3600) -> SkinCatalog:
+    return _model('skins', _fetch_entry(f'{_BYMYKEL}/skins.json', ttl))
 
 
 def get_skins(ttl: int = 3600) -> list:
@@ -36,11 +688,11 @@ def get_skins(ttl: int = 3600) -> list:
 
 
 def get_knives(ttl: int = 3600) -> list:
-    return _fetch(f'{_BYMYKEL}/skins.json', ttl)
+    return to_dicts(get_skin_catalog(ttl).knives)
 
 
 def get_gloves(ttl: int = 3600) -> list:
-    return _fetch(f'{_BYMYKEL}/skins.json', ttl)
+    return to_dicts(get_skin_catalog(ttl).gloves)
 
 
 def get_agents(ttl: int = 3600) -> list:
@@ -0,0 +1,235 @@
+"""Indexed model of bymykel's skins catalog, built once per catalog version.
+
+SkinCatalog wraps every item in a slotted SkinRecord that holds the resolved
+weapon_defindex and the fields the indexes need, pointing at the parsed item
+instead of copying it. Records are partitioned by category, weapon defindex
+and rarity, and indexed by paint_index, so the catalog routes look up a
+prebuilt view instead of scanning the whole list; enriched dicts are only
+materialised for the items a response actually contains.
+"""
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+
+# CS2 weapon name → item definition index mapping.
+# Used by the frontend to correlate catalog entries with DB weapon_defindex values.
+WEAPON_DEFINDEX: dict[str, int] = {
+    # Pistols
+    'weapon_deagle':        1,
+    'weapon_elite':         2,
+    'weapon_fiveseven':     3,
+    'weapon_glock':         4,
+    'weapon_hkp2000':       32,
+    'weapon_p250':          36,
+    'weapon_usp_silencer':  61,
+    'weapon_cz75a':         63,
+    'weapon_revolver':      64,
+    'weapon_tec9':          30,
+    # SMGs
+    'weapon_mac10':         17,
+    'weapon_mp5sd':         23,
+    'weapon_mp7':           33,
+    'weapon_mp9':           34,
+    'weapon_p90':           19,
+    'weapon_bizon':         26,
+    'weapon_ump45':         24,
+    # Rifles
+    'weapon_ak47':          7,
+    'weapon_aug':           8,
+    'weapon_famas':         10,
+    'weapon_galilar':       13,
+    'weapon_m4a1':          16,
+    'weapon_m4a1_silencer': 60,
+    'weapon_sg556':         39,
+    # Sniper rifles
+    'weapon_awp':           9,
+    'weapon_g3sg1':         11,
+    'weapon_scar20':        38,
+    'weapon_ssg08':         40,
+    # Heavy
+    'weapon_nova':          35,
+    'weapon_xm1014':        25,
+    'weapon_sawedoff':      29,
+    'weapon_mag7':          27,
+    'weapon_m249':          14,
+    'weapon_negev':         28,
+    # Knives (T side)
+    'weapon_knife':             42,
+    'weapon_knife_bayonet':     500,
+    'weapon_knife_flip':        505,
+    'weapon_knife_gut':         506,
+    'weapon_knife_karambit':    507,
+    'weapon_knife_m9_bayonet':  508,
+    'weapon_knife_tactical':    509,
+    'weapon_knife_falchion':    512,
+    'weapon_knife_survival_bowie': 514,
+    'weapon_knife_butterfly':   515,
+    'weapon_knife_push':        516,
+    'weapon_knife_cord':        517,
+    'weapon_knife_canis':       518,
+    'weapon_knife_ursus':       519,
+    'weapon_knife_gypsy_jackknife': 520,
+    'weapon_knife_outdoor':     521,
+    'weapon_knife_stiletto':    522,
+    'weapon_knife_widowmaker':  523,
+    'weapon_knife_skeleton':    525,
+    'weapon_knife_css':         526,
+    # Knives (CT side)
+    'weapon_knife_ct':          500,
+    # Gloves
+    'weapon_fists':             5,
+    'studded_bloodhound_gloves': 5027,
+    'studded_brokenfang_gloves': 4725,
+    'weapon_handwrap':          4725,
+}
+
+# Distinct paint_index ranges whose catalog-ordered records each SkinCatalog keeps.
+_RANGE_CACHE_SIZE = 64
+
+KNIFE_WEAPON_PREFIX = 'weapon_knife'
+GLOVES_CATEGORY = 'sfui_invpanel_filter_gloves'
+
+
+def resolve_defindex(item: dict) -> int | None:
+    """Return a catalog item's weapon defindex.
+
+    bymykel provides weapon.weapon_id which IS the numeric defindex — prefer that
+    over our manual map so gloves, knives, and any future items work automatically.
+    """
+    weapon = item.get('weapon') or {}
+    return weapon.get('weapon_id') or WEAPON_DEFINDEX.get(weapon.get('id', ''))
+
+
+def _paint_index(item: dict) -> int | None:
+    try:
+        return int(item.get('paint_index'))
+    except (TypeError, ValueError):
+        return None
+
+
+class SkinRecord:
+    """One catalog item: the parsed dict plus its resolved index keys."""
+
+    __slots__ = ('raw', 'position', 'weapon_defindex', 'paint_index', 'category', 'rarity')
+
+    def __init__(self, raw: dict, position: int) -> None:
+        self.raw = raw
+        self.position = position
+        self.weapon_defindex = resolve_defindex(raw)
+        self.paint_index = _paint_index(raw)
+        self.category = (raw.get('category') or {}).get('id')
+        self.rarity = (raw.get('rarity') or {}).get('id')
+
+    def to_dict(self) -> dict:
+        """The enriched item as served by the API (a shallow copy)."""
+        entry = dict(self.raw)
+        entry['weapon_defindex'] = self.weapon_defindex
+        return entry
+
+    def project(self, fields: list[str]) -> dict:
+        """Only the named fields of the enriched item."""
+        out = {}
+        for f in fields:
+            if f == 'weapon_defindex':
+                out[f] = self.weapon_defindex
+            elif f in self.raw:
+                out[f] = self.raw[f]
+        return out
+
+
+def to_dicts(records: list[SkinRecord]) -> list[dict]:
+    return [r.to_dict() for r in records]
+
+
+class SkinCatalog:
+    """Skin records plus prebuilt partitions and lookups.
+
+    All views share the same records and parsed dicts; treat them as read-only.
+    """
+
+    def __init__(self, items: list) -> None:
+        self.items: list[SkinRecord] = [SkinRecord(item, i) for i, item in enumerate(items)]
+        self.by_category: dict[str, list[SkinRecord]] = {}
+        self.by_defindex: dict[int, list[SkinRecord]] = {}
+        self.by_rarity: dict[str, list[SkinRecord]] = {}
+        self.by_paint_index: dict[int, list[SkinRecord]] = {}
+        self.knives: list[SkinRecord] = []
+
+        for rec in self.items:
+            if rec.category:
+                self.by_category.setdefault(rec.category, []).append(rec)
+            if rec.rarity:
+                self.by_rarity.setdefault(rec.rarity, []).append(rec)
+            if rec.weapon_defindex is not None:
+                self.by_defindex.setdefault(int(rec.weapon_defindex), []).append(rec)
+            if rec.paint_index is not None:
+                self.by_paint_index.setdefault(rec.paint_index, []).append(rec)
+            if (rec.raw.get('weapon') or {}).get('id', '').startswith(KNIFE_WEAPON_PREFIX):
+                self.knives.append(rec)
+
+        self.gloves: list[SkinRecord] = self.by_category.get(GLOVES_CATEGORY, [])
+        # Records with a paint_index, ordered by it; a range is a slice found by bisect.
+        self._by_paint: list[SkinRecord] = sorted(
+            (rec for rec in self.items if rec.paint_index is not None),
+            key=lambda rec: (rec.paint_index, rec.position))
+        self._paint_values: list[int] = [rec.paint_index for rec in self._by_paint]
+        self._paint_range = lru_cache(maxsize=_RANGE_CACHE_SIZE)(self._sorted_paint_range)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _sorted_paint_range(self, lo: int, hi: int) -> list[SkinRecord]:
+        """_by_paint[lo:hi] in catalog order; cached per slice by _paint_range."""
+        return sorted(self._by_paint[lo:hi], key=lambda rec: rec.position)
+
+    def query(
+        self,
+        *,
+        weapon_defindex: int | None = None,
+        rarity: str | None = None,
+        category: str | None = None,
+        paint_index_min: int | None = None,
+        paint_index_max: int | None = None,
+    ) -> list[SkinRecord]:
+        """Return the records matching every given filter, in catalog order.
+
+        Starts from the smallest matching index partition and checks the
+        remaining filters only against that.
+        """
+        candidates = [self.items]
+        if weapon_defindex is not None:
+            candidates.append(self.by_defindex.get(weapon_defindex, []))
+        if rarity is not None:
+            candidates.append(self.by_rarity.get(rarity, []))
+        if category is not None:
+            candidates.append(self.by_category.get(category, []))
+        filters = len(candidates) - 1
+        base = min(candidates, key=len)
+        ranged = paint_index_min is not None or paint_index_max is not None
+        if ranged:
+            filters += 1
+            lo = bisect_left(self._paint_values, paint_index_min) if paint_index_min is not None else 0
+            hi = (bisect_right(self._paint_values, paint_index_max) if paint_index_max is not None
+                  else len(self._paint_values))
+            # The slice length is the range's size; only order it when it is the smallest.
+            if hi - lo < len(base):
+                base = self._paint_range(lo, hi)
+        if filters == 1:
+            return base
+
+        def matches(rec: SkinRecord) -> bool:
+            if weapon_defindex is not None and rec.weapon_defindex != weapon_defindex:
+                return False
+            if rarity is not None and rec.rarity != rarity:
+                return False
+            if category is not None and rec.category != category:
+                return False
+            if ranged:
+                if rec.paint_index is None:
+                    return False
+                if paint_index_min is not None and rec.paint_index < paint_index_min:
+                    return False
+                if paint_index_max is not None and rec.paint_index > paint_index_max:
+                    return False
+            return True
+
+        return [rec for rec in base if matches(rec)]
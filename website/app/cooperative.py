@@ -0,0 +1,41 @@
+"""Helpers for running under Gunicorn's gevent worker (GUNICORN_WORKER_CLASS=gevent).
+
+The gevent worker monkey-patches sockets, locks, sleeps and threads before
+the app is imported, so MySQL queries (PyMySQL is pure Python), outbound
+HTTP and the background refresher threads all become greenlets that yield
+while they wait. Only calls that block the OS thread outside of those
+patches still stall every request in the worker; the app routes them
+through here:
+
+- run_blocking() hands a blocking call (a waiting flock) to gevent's
+  native thread pool;
+- native_local() gives state that must stay per OS thread rather than per
+  greenlet (shared.py's SQLite connection).
+
+Under the sync worker both are plain pass-throughs.
+"""
+import sys
+import threading
+from typing import Any, Callable
+
+
+def active() -> bool:
+    """True when gevent has patched the socket module in this process."""
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('socket')
+
+
+def run_blocking(fn: Callable[..., Any], *args) -> Any:
+    """Call fn(*args), off the event loop when running cooperatively."""
+    if not active():
+        return fn(*args)
+    import gevent
+    return gevent.get_hub().threadpool.apply(fn, args)
+
+
+def native_local() -> threading.local:
+    """A thread-local object that is per OS thread even when threading is patched."""
+    if not active():
+        return threading.local()
+    from gevent.monkey import get_original
+    return get_original('threading', 'local')()
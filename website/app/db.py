@@ -1,32 +1,526 @@
-"""Per-request MySQL connection via Flask's application context."""
+"""Pooled MySQL connections, checked out per request via Flask's application context.
+
+Each Gunicorn worker keeps its own ConnectionPool. A request checks a
+connection out on its first DB access and returns it at teardown; any
+transaction still open is rolled back on return so the next request starts
+clean. Idle connections are pinged before reuse and recycled after
+DB_POOL_MAX_AGE seconds.
+
+With DB_READ_HOST set, a second pool points at a read replica (or a separate
+read-only endpoint). get_read_db() hands out a replica connection for
+read-only work, while get_db() keeps returning the primary used for writes.
+After note_write(key), reads for that key stick to the primary for
+DB_STICKY_SECONDS, so a player sees their own changes before the replica has
+caught up. Without DB_READ_HOST, or if the replica is unreachable, reads
+use the primary.
+
+Every connection uses InstrumentedCursor, which times each statement and
+aggregates count, time and rows per (route, SQL fingerprint) in this worker;
+see query_stats(). Statements slower than DB_SLOW_QUERY_MS are also logged
+to the app.db.slow logger.
+
+busy() tells the rate limiter (app/ratelimit.py) that the primary looks
+saturated. The signals are combined into one shared mark (mark_busy()) that
+lasts DB_SHED_SECONDS:
+- the server's own load: at most once per DB_SHED_SAMPLE_SECONDS across
+  all workers, busy() reads the primary's Threads_running and marks it
+  busy at DB_SHED_THREADS_RUNNING or more;
+- any worker hitting a primary statement slower than DB_SHED_QUERY_MS, or
+  timing out waiting for a connection;
+- under gevent, this worker's pool having as many requests waiting as it
+  has connections (a sync worker never has more than one waiting).
+"""
+import os
+import re
+import time
+import logging
+import threading
+from collections import deque
+from typing import Callable
+
 import pymysql
 import pymysql.cursors
-from flask import g, current_app
+from pymysql.constants import SERVER_STATUS
+from flask import g, current_app, has_request_context, request, session
+
+from . import metrics, shared
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger(__name__ + '.slow')
+
+
+# ── Statement instrumentation ─────────────────────────────────────────────────
+
+_FP_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_FP_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_FP_PLACEHOLDER = re.compile(r'%s|%\(\w+\)s')
+_FP_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_FP_ROWS = re.compile(r'(\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+')
+# Statement templates seen so far → fingerprint; the app's SQL is a fixed set of literals.
+_FP_CACHE_MAX = 2048
+_fingerprints: dict[str, str] = {}
+
+_slow_threshold = 0.2
+_shed_threshold = 1.0
+_shed_seconds = 2.0
+# time.monotonic() of this worker's last Threads_running sample (without the shared store).
+_sampled_at = 0.0
+_query_stats: dict[tuple[str, str], list] = {}
+_query_stats_lock = threading.Lock()
+
+
+def fingerprint(sql: str) -> str:
+    """Normalize a statement so every execution of the same query shape aggregates together.
+
+    Literals and placeholders become ?, IN lists and VALUES tuples (...), and
+    whitespace is collapsed.
+    """
+    fp = _fingerprints.get(sql)
+    if fp is None:
+        fp = ' '.join(sql.split())
+        fp = _FP_STRING.sub('?', fp)
+        fp = _FP_PLACEHOLDER.sub('?', fp)
+        fp = _FP_NUMBER.sub('?', fp)
+        fp = _FP_LIST.sub('(...)', fp)
+        fp = _FP_ROWS.sub(r'\1', fp)
+        if len(_fingerprints) < _FP_CACHE_MAX:
+            _fingerprints[sql] = fp
+    return fp
+
+
+def _route() -> str:
+    if has_request_context():
+        return request.endpoint or request.path
+    return f'<{threading.current_thread().name}>'
+
+
+def _record(sql: str, elapsed: float, rows: int, failed: bool, role: str | None) -> None:
+    fp = fingerprint(sql)
+    route = _route()
+    with _query_stats_lock:
+        stat = _query_stats.get((route, fp))
+        if stat is None:
+            # count, total seconds, max seconds, rows, errors
+            stat = _query_stats[(route, fp)] = [0, 0.0, 0.0, 0, 0]
+        stat[0] += 1
+        stat[1] += elapsed
+        if elapsed > stat[2]:
+            stat[2] = elapsed
+        stat[3] += max(rows, 0)
+        stat[4] += failed
+    statement = fp.split(' ', 1)[0].upper()
+    metrics.observe('db_query_duration_seconds', elapsed, role=role or 'unknown', statement=statement, route=route)
+    if failed:
+        metrics.inc('db_query_errors_total', role=role or 'unknown', statement=statement)
+    if elapsed >= _slow_threshold:
+        slow_logger.warning('slow query %.1fms route=%s rows=%d: %s', elapsed * 1000, route, rows, fp)
+    if role == PRIMARY and elapsed >= _shed_threshold:
+        mark_busy()
+
+
+class InstrumentedCursor(pymysql.cursors.DictCursor):
+    """DictCursor that times each statement and records it in query_stats()."""
+
+    _batch = False
+
+    def execute(self, query, args=None):
+        if self._batch:
+            return super().execute(query, args)
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = super().execute(query, args)
+            failed = False
+            return result
+        finally:
+            _record(query, time.perf_counter() - started, self.rowcount, failed,
+                    getattr(self.connection, 'pool_role', None))
+
+    def executemany(self, query, args):
+        # Recorded once under the template; PyMySQL runs it as one or more inner execute()s.
+        started = time.perf_counter()
+        failed = True
+        self._batch = True
+        try:
+            result = super().executemany(query, args)
+            failed = False
+            return result
+        finally:
+            self._batch = False
+            _record(query, time.perf_counter() - started, self.rowcount, failed,
+                    getattr(self.connection, 'pool_role', None))
+
+
+def query_stats(limit: int | None = None) -> list[dict]:
+    """This worker's per-(route, fingerprint) statement aggregates, by total time."""
+    with _query_stats_lock:
+        items = [(route, fp, list(stat)) for (route, fp), stat in _query_stats.items()]
+    items.sort(key=lambda item: item[2][1], reverse=True)
+    return [{
+        'route': route,
+        'query': fp,
+        'count': count,
+        'total_ms': round(total * 1000, 3),
+        'avg_ms': round(total / count * 1000, 3) if count else 0.0,
+        'max_ms': round(peak * 1000, 3),
+        'rows': rows,
+        'errors': errors,
+    } for route, fp, (count, total, peak, rows, errors) in items[:limit]]
+
+
+# ── Pool ──────────────────────────────────────────────────────────────────────
+
+PRIMARY = 'primary'
+REPLICA = 'replica'
+
+
+class PoolTimeout(Exception):
+    """No connection became available within DB_POOL_TIMEOUT seconds."""
+
+
+class _Pooled:
+    __slots__ = ('conn', 'created', 'last_used')
+
+    def __init__(self, conn: pymysql.connections.Connection) -> None:
+        self.conn = conn
+        self.created = self.last_used = time.monotonic()
+
+
+class ConnectionPool:
+    """A bounded, thread-safe pool of PyMySQL connections."""
+
+    def __init__(self, connect: Callable[[], pymysql.connections.Connection], size: int,
+                 timeout: float, max_age: float, ping_after: float, role: str = PRIMARY) -> None:
+        self._connect = connect
+        self.role = role
+        self.size = size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.ping_after = ping_after
+        self._idle: deque[_Pooled] = deque()
+        self._checked_out: dict[int, _Pooled] = {}
+        self._opening = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'timeouts': 0,
+            'connects': 0,
+            'recycled': 0,
+            'ping_failures': 0,
+            'rollbacks': 0,
+        }
+
+    def _total(self) -> int:
+        return len(self._idle) + len(self._checked_out) + self._opening
+
+    def acquire(self) -> pymysql.connections.Connection:
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    pooled = self._idle.pop()
+                    break
+                if self._total() < self.size:
+                    self._opening += 1
+                    pooled = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(f'No DB connection available after {self.timeout}s')
+                waited = True
+                self.waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            wait = time.monotonic() - started
+            self._stats['checkouts'] += 1
+            if waited:
+                self._stats['waits'] += 1
+            self._stats['wait_time_total'] += wait
+            self._stats['wait_time_max'] = max(self._stats['wait_time_max'], wait)
+        metrics.observe('db_pool_wait_seconds', wait, role=self.role)
+
+        pooled = self._ready(pooled)
+        with self._cond:
+            self._checked_out[id(pooled.conn)] = pooled
+        return pooled.conn
+
+    def _usable(self, pooled: _Pooled) -> bool:
+        """Whether an idle connection may be reused; pings it if idle for long."""
+        now = time.monotonic()
+        if now - pooled.created >= self.max_age:
+            with self._cond:
+                self._stats['recycled'] += 1
+            return False
+        if now - pooled.last_used >= self.ping_after:
+            try:
+                pooled.conn.ping(reconnect=False)
+            except Exception:
+                with self._cond:
+                    self._stats['ping_failures'] += 1
+                return False
+        return True
+
+    def _ready(self, pooled: _Pooled | None) -> _Pooled:
+        """Validate an idle connection or open a new one; called without the lock.
+
+        pooled is None when acquire() reserved a slot for a new connection.
+        """
+        if pooled is not None and not self._usable(pooled):
+            self._discard(pooled)
+            with self._cond:
+                self._opening += 1
+            pooled = None
+        if pooled is None:
+            started = time.perf_counter()
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._opening -= 1
+                    self._cond.notify()
+                raise
+            metrics.observe('db_connect_duration_seconds', time.perf_counter() - started, role=self.role)
+            with self._cond:
+                self._opening -= 1
+                self._stats['connects'] += 1
+            pooled = _Pooled(conn)
+        return pooled
+
+    @staticmethod
+    def _discard(pooled: _Pooled) -> None:
+        try:
+            pooled.conn.close()
+        except Exception:
+            pass
+
+    def release(self, conn: pymysql.connections.Connection) -> None:
+        """Return a connection, rolling back any transaction left open."""
+        with self._cond:
+            pooled = self._checked_out.pop(id(conn), None)
+        if pooled is None:
+            return
+        healthy = conn.open
+        if healthy and conn.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+            try:
+                conn.rollback()
+            except Exception:
+                healthy = False
+            else:
+                with self._cond:
+                    self._stats['rollbacks'] += 1
+        with self._cond:
+            if healthy:
+                pooled.last_used = time.monotonic()
+                self._idle.append(pooled)
+            self._cond.notify()
+        if not healthy:
+            self._discard(pooled)
+
+    def stats(self) -> dict:
+        with self._cond:
+            out = dict(self._stats)
+            out.update(size=self.size, idle=len(self._idle), in_use=len(self._checked_out),
+                       waiting=self.waiting)
+        return out
+
+
+# Shared-store namespace of keys whose reads must stay on the primary.
+_STICKY_NS = 'db_primary_until'
+# Shared-store namespace holding the primary's busy mark.
+_BUSY_NS = 'db_busy'
+
+_pools: dict[str, ConnectionPool] = {}
+_pool_pid: int | None = None
+_pool_lock = threading.Lock()
+
+
+def _connect_args(cfg, role: str) -> dict:
+    if role == REPLICA:
+        return dict(
+            host=cfg['DB_READ_HOST'],
+            port=cfg['DB_READ_PORT'],
+            user=cfg['DB_READ_USER'] or cfg['DB_USER'],
+            password=cfg['DB_READ_PASS'] or cfg['DB_PASS'],
+            # Each read sees the replica's latest state; nothing here may write.
+            autocommit=True,
+            init_command='SET SESSION TRANSACTION READ ONLY',
+        )
+    return dict(
+        host=cfg['DB_HOST'],
+        port=cfg['DB_PORT'],
+        user=cfg['DB_USER'],
+        password=cfg['DB_PASS'],
+        autocommit=False,
+    )
+
+
+def _get_pool(role: str = PRIMARY) -> ConnectionPool:
+    """Return this worker's pool for role, creating it after fork on first use."""
+    global _pool_pid, _slow_threshold, _shed_threshold, _shed_seconds
+    with _pool_lock:
+        if _pool_pid != os.getpid():
+            _pools.clear()
+            _pool_pid = os.getpid()
+        pool = _pools.get(role)
+        if pool is None:
+            cfg = current_app.config
+            _slow_threshold = cfg['DB_SLOW_QUERY_MS'] / 1000
+            _shed_threshold = cfg['DB_SHED_QUERY_MS'] / 1000
+            _shed_seconds = cfg['DB_SHED_SECONDS']
+            args = _connect_args(cfg, role)
+
+            def connect(role=role, args=args) -> pymysql.connections.Connection:
+                conn = pymysql.connect(
+                    database=cfg['DB_NAME'],
+                    charset='utf8mb4',
+                    cursorclass=InstrumentedCursor,
+                    connect_timeout=5,
+                    **args,
+                )
+                conn.pool_role = role  # read back by InstrumentedCursor
+                return conn
+
+            pool = _pools[role] = ConnectionPool(
+                connect,
+                size=cfg['DB_READ_POOL_SIZE'] if role == REPLICA else cfg['DB_POOL_SIZE'],
+                timeout=cfg['DB_POOL_TIMEOUT'],
+                max_age=cfg['DB_POOL_MAX_AGE'],
+                ping_after=cfg['DB_POOL_PING_AFTER'],
+                role=role,
+            )
+        return pool
 
 
 def get_db() -> pymysql.connections.Connection:
-    """Return the DB connection for the current request, creating it if needed."""
+    """Return the primary (read/write) connection for the current request, checking one out if needed."""
     if 'db' not in g:
-        cfg = current_app.config
-        g.db = pymysql.connect(
-            host=cfg['DB_HOST'],
-            port=cfg['DB_PORT'],
-            user=cfg['DB_USER'],
-            password=cfg['DB_PASS'],
-            database=cfg['DB_NAME'],
-            charset='utf8mb4',
-            cursorclass=pymysql.cursors.DictCursor,
-            autocommit=False,
-            connect_timeout=5,
-        )
+        try:
+            g.db = _get_pool().acquire()
+        except PoolTimeout:
+            mark_busy()
+            raise
     return g.db
 
 
+def mark_busy() -> None:
+    """Flag the primary as saturated, for every worker, for DB_SHED_SECONDS."""
+    shared.put(_BUSY_NS, PRIMARY, b'1', ttl=_shed_seconds)
+
+
+def busy() -> bool:
+    """Whether new writes should be shed rather than queued behind a saturated primary."""
+    pool = _pools.get(PRIMARY) if _pool_pid == os.getpid() else None
+    if pool is not None and pool.waiting >= pool.size:
+        return True
+    if shared.get(_BUSY_NS, PRIMARY) is not None:
+        return True
+    return _sample_threads_running()
+
+
+def _sample_threads_running() -> bool:
+    """Read the primary's Threads_running if a sample is due; True (and marked) when over the limit.
+
+    Samples are spaced DB_SHED_SAMPLE_SECONDS apart across all workers via
+    the shared store, or per worker without it.
+    """
+    global _sampled_at
+    cfg = current_app.config
+    limit = cfg['DB_SHED_THREADS_RUNNING']
+    if not limit:
+        return False
+    interval = cfg['DB_SHED_SAMPLE_SECONDS']
+    now = time.monotonic()
+    wait = shared.throttle(_BUSY_NS, 'sample', 1 / interval, 1)
+    if wait is None:
+        wait = 0.0 if now - _sampled_at >= interval else interval
+    if wait:
+        return False
+    _sampled_at = now
+    try:
+        with get_db().cursor() as cur:
+            cur.execute("SHOW GLOBAL STATUS LIKE 'Threads_running'")
+            row = cur.fetchone()
+    except PoolTimeout:
+        return True  # get_db() has marked it
+    except pymysql.MySQLError as exc:
+        logger.warning('Could not sample Threads_running: %s', exc)
+        return False
+    if row is None or int(row['Value']) < limit:
+        return False
+    logger.warning('Primary has %s threads running (limit %d); shedding writes', row['Value'], limit)
+    mark_busy()
+    return True
+
+
+def note_write(key: str) -> None:
+    """Record a write for key so its reads stay on the primary for DB_STICKY_SECONDS."""
+    cfg = current_app.config
+    if not cfg.get('DB_READ_HOST'):
+        return
+    sticky = cfg['DB_STICKY_SECONDS']
+    if has_request_context():
+        session['db_primary_until'] = time.time() + sticky
+    # Also shared, for writes made outside the player's request (write-behind flushes).
+    shared.put(_STICKY_NS, key, b'1', ttl=sticky)
+
+
+def _sticky(key: str | None) -> bool:
+    if has_request_context() and session.get('db_primary_until', 0) > time.time():
+        return True
+    return key is not None and shared.get(_STICKY_NS, key) is not None
+
+
+def get_read_db(key: str | None = None) -> pymysql.connections.Connection:
+    """Return a connection for read-only queries: the replica unless key was just written.
+
+    Falls back to the primary when no replica is configured, when this request
+    already holds the primary, or when the replica cannot be reached.
+    """
+    if 'read_db' in g:
+        return g.read_db
+    if not current_app.config.get('DB_READ_HOST') or 'db' in g or _sticky(key):
+        return get_db()
+    try:
+        g.read_db = _get_pool(REPLICA).acquire()
+    except (pymysql.MySQLError, PoolTimeout) as exc:
+        logger.warning('Read replica unavailable, reading from the primary: %s', exc)
+        return get_db()
+    return g.read_db
+
+
 def close_db(exc=None) -> None:
-    """Teardown: close DB connection at end of request."""
-    db = g.pop('db', None)
-    if db is not None:
-        try:
-            db.close()
-        except Exception:
-            pass
+    """Teardown: hand the request's connections back to their pools."""
+    for attr, role in (('db', PRIMARY), ('read_db', REPLICA)):
+        db = g.pop(attr, None)
+        if db is not None:
+            try:
+                _get_pool(role).release(db)
+            except Exception:
+                logger.exception('Failed to return DB connection to the %s pool', role)
+
+
+def pool_stats() -> dict:
+    """Checkout and wait-time counters for this worker's pools, by role."""
+    if _pool_pid != os.getpid():
+        return {}
+    return {role: pool.stats() for role, pool in _pools.items()}
+
+
+def _pool_samples() -> list[tuple[str, dict, float]]:
+    samples = []
+    for role, stats in pool_stats().items():
+        for state in ('in_use', 'idle', 'waiting'):
+            samples.append(('db_pool_connections', {'role': role, 'state': state}, stats[state]))
+    return samples
+
+
+metrics.register_collector(_pool_samples)
@@ -0,0 +1,348 @@
+"""Prometheus metrics, aggregated across Gunicorn workers.
+
+Each worker records into its own in-process registry: counters (inc()),
+histograms (observe()) and gauges collected on demand from the modules that
+already keep stats (pools, write-behind, Steam cache, rate limiter). Every
+METRICS_PUBLISH_INTERVAL seconds a background thread writes a snapshot of
+the registry to the shared store (app/shared.py), keyed by pid and start
+time. A scrape of /metrics publishes the answering worker's snapshot, then
+sums the snapshots per series and renders the Prometheus text format.
+
+Counters and histograms must never go down, or Prometheus sees a reset.
+A snapshot therefore stays in the sum after its worker exits until some
+worker retires it: once it has not been republished for _RETIRE_AFTER
+seconds and its pid is no longer running, its counters and histograms are
+added to one accumulator row (_RETIRED_KEY) and the snapshot is deleted,
+under an flock so two workers cannot fold the same snapshot. A live worker
+whose publisher stalled is never folded, since it would later republish
+the same totals. Gauges only count from workers that published within the
+last few intervals. A worker forked from a preloaded master drops the
+counts the master recorded (catalog preload) before it starts publishing.
+
+Instrumented elsewhere:
+- request count/latency per endpoint, method and status (init_app hooks);
+- catalog cache hits/stale hits/misses and refresh durations (cache.py);
+- DB connect, pool wait and statement timings per role (db.py);
+- outbound call latency and retries per upstream, i.e. Steam OpenID, the
+  Steam Web API and bymykel (outbound.py).
+"""
+import os
+import atexit
+import json
+import time
+import fcntl
+import bisect
+import logging
+import threading
+from typing import Callable
+
+from flask import g, request
+
+from . import shared
+
+logger = logging.getLogger(__name__)
+
+_NS = 'metrics'
+# Snapshot keys are _SNAPSHOT_PREFIX + '<pid>-<start time>'; a recycled pid gets a fresh key.
+_SNAPSHOT_PREFIX = 'w:'
+_RETIRED_KEY = 'retired'
+# A snapshot this old, whose pid has exited, belongs to a worker that is gone: well
+# past GUNICORN_TIMEOUT, after which the arbiter kills a worker that stopped responding.
+_RETIRE_AFTER = 180
+# Shared-store safety net for snapshots nobody retires (the whole service stopped).
+_SNAPSHOT_TTL = 86400
+# Seconds; chosen for request and upstream latencies.
+_DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_BUCKETS: dict[str, tuple[float, ...]] = {
+    'db_query_duration_seconds': (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+    'db_pool_wait_seconds': (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0),
+    'catalog_refresh_duration_seconds': (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+}
+_HELP: dict[str, tuple[str, str]] = {
+    'http_requests_total': ('counter', 'HTTP requests by endpoint, method and status.'),
+    'http_request_duration_seconds': ('histogram', 'HTTP request latency by endpoint and method.'),
+    'catalog_cache_requests_total': ('counter', 'Catalog cache lookups by result (hit, stale, miss).'),
+    'catalog_refresh_duration_seconds': ('histogram', 'Catalog refresh duration by outcome.'),
+    'db_connect_duration_seconds': ('histogram', 'Time to open a MySQL connection by pool role.'),
+    'db_pool_wait_seconds': ('histogram', 'Time spent waiting for a pooled connection by role.'),
+    'db_query_duration_seconds': ('histogram', 'MySQL statement latency by role, statement type and route.'),
+    'db_query_errors_total': ('counter', 'MySQL statements that raised, by role and statement type.'),
+    'db_pool_connections': ('gauge', 'Pooled MySQL connections by role and state, summed over workers.'),
+    'outbound_request_duration_seconds': ('histogram', 'Outbound HTTP attempt latency by upstream and outcome.'),
+    'outbound_retries_total': ('counter', 'Outbound HTTP retries by upstream.'),
+    'steam_profile_lookups_total': ('counter', 'Steam profile cache lookups by result.'),
+    'ratelimit_decisions_total': ('counter', 'Rate limiter decisions on limited routes.'),
+    'writebehind_rows_total': ('counter', 'Write-behind skin rows by event.'),
+    'writebehind_pending': ('gauge', 'Skin saves queued for write-behind (all workers).'),
+    'steam_refresh_queued': ('gauge', 'Steamids waiting for a profile refresh (all workers).'),
+    'metrics_workers': ('gauge', 'Workers whose snapshot is included.'),
+}
+
+_lock = threading.Lock()
+_counters: dict[tuple, float] = {}
+# (name, labels) → [bucket counts..., +Inf count], sum
+_histograms: dict[tuple, list] = {}
+# Called at snapshot time; each returns [(name, labels, value)] gauges or counters.
+_collectors: list[Callable[[], list[tuple[str, dict, float]]]] = []
+
+_interval = 5.0
+_lock_path: str | None = None
+_publisher: threading.Thread | None = None
+_publisher_pid: int | None = None
+# The process _counters and _histograms were recorded in.
+_registry_pid = os.getpid()
+_snapshot_key: str | None = None
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted(labels.items())))
+
+
+def inc(name: str, value: float = 1.0, **labels) -> None:
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + value
+
+
+def observe(name: str, value: float, **labels) -> None:
+    buckets = _BUCKETS.get(name, _DEFAULT_BUCKETS)
+    key = _key(name, labels)
+    i = bisect.bisect_left(buckets, value)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [[0] * (len(buckets) + 1), 0.0]
+        hist[0][i] += 1
+        hist[1] += value
+
+
+def register_collector(fn: Callable[[], list[tuple[str, dict, float]]]) -> None:
+    """Add fn, which returns (name, labels, value) samples read at snapshot time."""
+    _collectors.append(fn)
+
+
+# ── Requests ──────────────────────────────────────────────────────────────────
+
+def _start_timer() -> None:
+    g.metrics_started = time.perf_counter()
+    _ensure_publisher()
+
+
+def _record_request(response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        endpoint = request.endpoint or 'unmatched'
+        observe('http_request_duration_seconds', time.perf_counter() - started,
+                endpoint=endpoint, method=request.method)
+        inc('http_requests_total', endpoint=endpoint, method=request.method, status=str(response.status_code))
+    return response
+
+
+def init_app(app) -> None:
+    """Time every request; call before other before_request hooks so refused requests count too."""
+    global _interval, _lock_path
+    _interval = app.config['METRICS_PUBLISH_INTERVAL']
+    if app.config.get('SHARED_STATE_PATH'):
+        _lock_path = app.config['SHARED_STATE_PATH'] + '.metrics.lock'
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+
+
+# ── Snapshots and aggregation ─────────────────────────────────────────────────
+
+def _snapshot() -> dict:
+    counters, gauges = [], []
+    for collect in _collectors:
+        try:
+            samples = collect()
+        except Exception:
+            logger.exception('Metrics collector %s failed', getattr(collect, '__qualname__', collect))
+            continue
+        for name, labels, value in samples:
+            kind = _HELP.get(name, ('untyped', ''))[0]
+            (gauges if kind == 'gauge' else counters).append([name, sorted(labels.items()), value])
+    with _lock:
+        counters.extend([name, list(labels), value] for (name, labels), value in _counters.items())
+        histograms = [[name, list(labels), list(hist[0]), hist[1]] for (name, labels), hist in _histograms.items()]
+    return {'at': time.time(), 'counters': counters, 'gauges': gauges, 'histograms': histograms}
+
+
+def publish() -> None:
+    """Write this worker's snapshot to the shared store."""
+    global _snapshot_key
+    if _snapshot_key is None or not _snapshot_key.startswith(f'{_SNAPSHOT_PREFIX}{os.getpid()}-'):
+        _snapshot_key = f'{_SNAPSHOT_PREFIX}{os.getpid()}-{time.time():.3f}'
+    shared.put(_NS, _snapshot_key, json.dumps(_snapshot()).encode(), ttl=_SNAPSHOT_TTL)
+
+
+def _fold(counters: dict, histograms: dict, snap: dict) -> None:
+    """Add snap's counters and histograms into the (name, labels)-keyed totals."""
+    for name, labels, value in snap['counters']:
+        key = (name, tuple(tuple(pair) for pair in labels))
+        counters[key] = counters.get(key, 0.0) + value
+    for name, labels, buckets, total in snap['histograms']:
+        key = (name, tuple(tuple(pair) for pair in labels))
+        hist = histograms.get(key)
+        if hist is None:
+            histograms[key] = [list(buckets), total]
+        elif len(hist[0]) == len(buckets):
+            hist[0] = [a + b for a, b in zip(hist[0], buckets)]
+            hist[1] += total
+
+
+def _load_retired() -> tuple[dict, dict]:
+    raw = shared.get(_NS, _RETIRED_KEY)
+    counters: dict[tuple, float] = {}
+    histograms: dict[tuple, list] = {}
+    if raw is not None:
+        _fold(counters, histograms, json.loads(raw))
+    return counters, histograms
+
+
+def _running(key: str) -> bool:
+    """Whether the snapshot's pid is still a live process (the store is host-local)."""
+    pid = int(key[len(_SNAPSHOT_PREFIX):].partition('-')[0])
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _retirable(key: str, at: float, now: float) -> bool:
+    # Past half the TTL the pid can only be a recycled one; fold it before the store expires it.
+    return at < now - _RETIRE_AFTER and (at < now - _SNAPSHOT_TTL / 2 or not _running(key))
+
+
+def retire() -> int:
+    """Fold snapshots of workers gone for _RETIRE_AFTER into the accumulator; returns how many.
+
+    Returns 0 straight away if another process is already retiring.
+    """
+    if _lock_path is None:
+        return 0
+    with open(_lock_path, 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return 0
+        try:
+            now = time.time()
+            stale = [(key, value) for key, value in shared.scan(_NS, _SNAPSHOT_PREFIX)
+                     if _retirable(key, json.loads(value)['at'], now)]
+            if not stale:
+                return 0
+            counters, histograms = _load_retired()
+            for _, value in stale:
+                _fold(counters, histograms, json.loads(value))
+            retired = {
+                'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+                'histograms': [[name, list(labels), hist[0], hist[1]] for (name, labels), hist in histograms.items()],
+            }
+            # Store the new totals before dropping the snapshots, so a failure never loses counts.
+            if not shared.put(_NS, _RETIRED_KEY, json.dumps(retired).encode()):
+                return 0
+            for key, value in stale:
+                shared.delete_if(_NS, key, value)
+            return len(stale)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _publisher_loop() -> None:
+    while True:
+        try:
+            publish()
+            retire()
+        except Exception:
+            logger.exception('Metrics publish failed')
+        time.sleep(_interval)
+
+
+def _ensure_publisher() -> None:
+    global _publisher, _publisher_pid, _registry_pid
+    if _publisher_pid == os.getpid() and _publisher.is_alive():
+        return
+    with _lock:
+        if _registry_pid != os.getpid():
+            # Forked from a preloaded master; every worker would republish its counts.
+            _counters.clear()
+            _histograms.clear()
+            _registry_pid = os.getpid()
+        if _publisher_pid != os.getpid() or not _publisher.is_alive():
+            _publisher = threading.Thread(target=_publisher_loop, name='metrics-publish', daemon=True)
+            _publisher.start()
+            _publisher_pid = os.getpid()
+            # Requests served since the last interval still count after a graceful exit.
+            atexit.register(publish)
+
+
+def _aggregate() -> tuple[dict, dict, int]:
+    """Totals over the accumulator and every snapshot; gauges from live workers only."""
+    if shared.enabled():
+        publish()
+        counters, histograms = _load_retired()
+        snapshots = [json.loads(value) for _, value in shared.scan(_NS, _SNAPSHOT_PREFIX)]
+    else:
+        counters, histograms = {}, {}
+        snapshots = []
+    if not snapshots:
+        snapshots = [json.loads(json.dumps(_snapshot()))]
+    live_since = time.time() - _interval * 3
+    workers = 0
+    for snap in snapshots:
+        _fold(counters, histograms, snap)
+        if snap['at'] >= live_since:
+            workers += 1
+            for name, labels, value in snap['gauges']:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                counters[key] = counters.get(key, 0.0) + value
+    return counters, histograms, workers
+
+
+# ── Exposition ────────────────────────────────────────────────────────────────
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs, extra: tuple = ()) -> str:
+    items = list(pairs) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items) + '}'
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render(global_gauges: list[tuple[str, dict, float]] = ()) -> str:
+    """All workers' metrics in the Prometheus text exposition format (0.0.4)."""
+    counters, histograms, workers = _aggregate()
+    for name, labels, value in [*global_gauges, ('metrics_workers', {}, workers)]:
+        counters[_key(name, labels)] = value
+
+    by_name: dict[str, list[str]] = {}
+    for (name, labels), value in sorted(counters.items()):
+        by_name.setdefault(name, []).append(f'{name}{_labels(labels)} {_number(value)}')
+    for (name, labels), (buckets, total) in sorted(histograms.items()):
+        lines = by_name.setdefault(name, [])
+        bounds = _BUCKETS.get(name, _DEFAULT_BUCKETS)
+        cumulative = 0
+        for bound, count in zip((*bounds, '+Inf'), buckets):
+            cumulative += count
+            le = bound if bound == '+Inf' else _number(bound)
+            lines.append(f'{name}_bucket{_labels(labels, (("le", le),))} {cumulative}')
+        lines.append(f'{name}_sum{_labels(labels)} {_number(total)}')
+        lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+
+    out = []
+    for name in sorted(by_name):
+        kind, help_text = _HELP.get(name, ('untyped', name))
+        out.append(f'# HELP {name} {help_text}')
+        out.append(f'# TYPE {name} {kind}')
+        out.extend(by_name[name])
+    return '\n'.join(out) + '\n'
@@ -0,0 +1,204 @@
+"""Outbound HTTP for every upstream the app calls (bymykel, Steam OpenID, Steam Web API).
+
+Each upstream gets one requests.Session per worker process, mounted on an
+HTTPAdapter with its own keep-alive connection pool, so repeat calls skip
+DNS, TCP and TLS setup. Sessions are created lazily and recreated after a
+fork, so Gunicorn workers never share sockets with the master.
+
+Per-upstream settings (_UPSTREAMS) give connect/read timeouts and a retry
+count. Connection errors, timeouts, 429s and 5xx responses are retried with
+jittered exponential backoff (honouring a short Retry-After), but only while
+the upstream's retry budget lasts: every first attempt earns RETRY_RATIO of
+a retry token, capped at RETRY_BURST, and every retry spends one. An
+upstream that is down therefore sees at most ~10% extra traffic from
+retries instead of a multiple of it.
+
+Catalog GETs and GetPlayerSummaries are safe to repeat. OpenID
+check_authentication is not: Steam consumes the response nonce on the first
+call it receives, so a replay answers is_valid:false and the login fails.
+Upstreams marked idempotent=False are therefore only retried when the
+connection could not be opened, i.e. the request was never sent.
+
+stats() reports per-upstream request/retry/error counters, status codes and
+latency for this worker.
+"""
+import os
+import time
+import random
+import logging
+import threading
+from typing import NamedTuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from . import cooperative, metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Upstream(NamedTuple):
+    connect_timeout: float
+    read_timeout: float
+    retries: int
+    pool_size: int = 4
+    idempotent: bool = True   # False: retry only failures before the request was sent
+
+
+_UPSTREAMS: dict[str, Upstream] = {
+    # Catalog JSON from GitHub raw: large bodies, fetched by one refresher at a time.
+    'bymykel': Upstream(connect_timeout=3.05, read_timeout=30, retries=2, pool_size=2),
+    # Login path: keep it short. check_authentication consumes the nonce.
+    'steam_openid': Upstream(connect_timeout=3.05, read_timeout=8, retries=1, idempotent=False),
+    # GetPlayerSummaries, called from the background refresher.
+    'steam_api': Upstream(connect_timeout=3.05, read_timeout=10, retries=2, pool_size=2),
+}
+
+# Under gevent one worker has many requests in flight, so pools are this much larger.
+_COOPERATIVE_POOL_SCALE = 8
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+_BACKOFF = 0.25
+_MAX_RETRY_AFTER = 5.0
+RETRY_RATIO = 0.1
+RETRY_BURST = 5.0
+
+_lock = threading.Lock()
+_sessions: dict[str, requests.Session] = {}
+_sessions_pid: int | None = None
+# Upstream → retry tokens left.
+_budgets: dict[str, float] = {}
+_stats: dict[str, dict] = {}
+
+
+def _session(name: str) -> requests.Session:
+    global _sessions_pid
+    with _lock:
+        if _sessions_pid != os.getpid():
+            # Forked: the parent's pooled sockets are not ours to use.
+            _sessions.clear()
+            _sessions_pid = os.getpid()
+        session = _sessions.get(name)
+        if session is None:
+            size = _UPSTREAMS[name].pool_size * (_COOPERATIVE_POOL_SCALE if cooperative.active() else 1)
+            adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[name] = session
+        return session
+
+
+def _upstream_stats(name: str) -> dict:
+    stats = _stats.get(name)
+    if stats is None:
+        stats = _stats[name] = {'requests': 0, 'attempts': 0, 'retries': 0, 'budget_exhausted': 0,
+                                'errors': 0, 'status': {}, 'total_ms': 0.0, 'max_ms': 0.0}
+    return stats
+
+
+def _record(name: str, elapsed: float, status: int | None) -> None:
+    metrics.observe('outbound_request_duration_seconds', elapsed, upstream=name,
+                    outcome='error' if status is None else f'{status // 100}xx')
+    ms = elapsed * 1000
+    with _lock:
+        stats = _upstream_stats(name)
+        stats['attempts'] += 1
+        stats['total_ms'] += ms
+        stats['max_ms'] = max(stats['max_ms'], ms)
+        if status is None:
+            stats['errors'] += 1
+        else:
+            stats['status'][status] = stats['status'].get(status, 0) + 1
+
+
+def _earn(name: str) -> None:
+    with _lock:
+        _upstream_stats(name)['requests'] += 1
+        _budgets[name] = min(_budgets.get(name, RETRY_BURST) + RETRY_RATIO, RETRY_BURST)
+
+
+def _spend(name: str) -> bool:
+    """Take a retry token for name; False (and counted) when the budget is empty."""
+    with _lock:
+        stats = _upstream_stats(name)
+        if _budgets.get(name, RETRY_BURST) < 1:
+            stats['budget_exhausted'] += 1
+            return False
+        _budgets[name] -= 1
+        stats['retries'] += 1
+    metrics.inc('outbound_retries_total', upstream=name)
+    return True
+
+
+def _never_sent(exc: requests.RequestException) -> bool:
+    """Whether exc happened while opening the connection, before any of the request went out."""
+    if isinstance(exc, requests.ConnectTimeout):
+        return True
+    reason = getattr(exc.args[0], 'reason', None) if exc.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def _delay(attempt: int, resp: requests.Response | None) -> float:
+    retry_after = resp.headers.get('Retry-After') if resp is not None else None
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), _MAX_RETRY_AFTER)
+    return _BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5)
+
+
+def request(name: str, method: str, url: str, **kwargs) -> requests.Response:
+    """Send method url to upstream name, retrying transient failures within budget.
+
+    For an upstream that is not idempotent only connection failures are
+    retried; timeouts after connecting and error statuses are final.
+
+    Returns the final response, whatever its status (callers still
+    raise_for_status()), or raises the last requests.RequestException.
+    """
+    upstream = _UPSTREAMS[name]
+    kwargs.setdefault('timeout', (upstream.connect_timeout, upstream.read_timeout))
+    session = _session(name)
+    _earn(name)
+    attempt = 0
+    while True:
+        start = time.perf_counter()
+        try:
+            resp = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as exc:
+            _record(name, time.perf_counter() - start, None)
+            if (attempt >= upstream.retries or not (upstream.idempotent or _never_sent(exc))
+                    or not _spend(name)):
+                raise
+            resp = None
+        else:
+            _record(name, time.perf_counter() - start, resp.status_code)
+            if (not upstream.idempotent or resp.status_code not in _RETRY_STATUSES
+                    or attempt >= upstream.retries or not _spend(name)):
+                return resp
+            resp.close()
+        delay = _delay(attempt, resp)
+        attempt += 1
+        logger.info('Retrying %s %s (attempt %d) in %.2fs', method, name, attempt + 1, delay)
+        time.sleep(delay)
+
+
+def get(name: str, url: str, **kwargs) -> requests.Response:
+    return request(name, 'GET', url, **kwargs)
+
+
+def post(name: str, url: str, **kwargs) -> requests.Response:
+    return request(name, 'POST', url, **kwargs)
+
+
+def stats() -> dict:
+    """This worker's counters per upstream, with average latency per attempt."""
+    with _lock:
+        out = {}
+        for name, stats in _stats.items():
+            entry = dict(stats, status=dict(stats['status']))
+            entry['avg_ms'] = round(stats['total_ms'] / stats['attempts'], 2) if stats['attempts'] else 0.0
+            entry['total_ms'] = round(stats['total_ms'], 2)
+            entry['max_ms'] = round(stats['max_ms'], 2)
+            entry['retry_budget'] = round(_budgets.get(name, RETRY_BURST), 2)
+            out[name] = entry
+        return out
@@ -0,0 +1,160 @@
+"""Per-route rate limits and DB admission control, shared by every Gunicorn worker.
+
+Limited routes (player writes by default) are checked before the view runs:
+
+- shed: while the primary database looks saturated (db.busy()), requests
+  are refused at once instead of queueing behind it, so the game server's
+  WeaponPaints plugin keeps getting its reads through;
+- per player: one token bucket per (route, steamid);
+- global: one bucket for all limited routes together, which caps the write
+  load the site as a whole can put on MySQL. Heavier routes (a whole
+  loadout) take more than one token from it.
+
+Only signed-in requests are charged; anonymous ones get the 401 the view
+would give. Buckets live in the shared store (shared.throttle()), so the
+limits hold across workers. A refused request gets 429 with Retry-After. Without the
+shared store, only shedding applies.
+
+Limits are per Flask endpoint. RATE_LIMITS overrides or extends
+_DEFAULT_LIMITS with comma-separated `endpoint=rate/burst` entries (tokens
+per second / bucket size), `endpoint=off` lifts a route's limit, and
+RATE_LIMITS=off disables limiting altogether. RATE_LIMIT_GLOBAL is the
+global bucket as `rate/burst`, or off.
+"""
+import math
+import logging
+import threading
+from typing import NamedTuple
+
+from flask import jsonify, request, session
+
+from . import db, metrics, shared
+
+logger = logging.getLogger(__name__)
+
+
+class Limit(NamedTuple):
+    rate: float          # tokens per second
+    burst: float         # bucket size
+    cost: float = 1.0    # tokens taken from the global bucket per request
+
+
+_DEFAULT_LIMITS: dict[str, Limit] = {
+    'api.player.save_skin': Limit(5, 20),
+    'api.player.delete_skin': Limit(5, 20),
+    'api.player.save_knife': Limit(2, 10),
+    'api.player.delete_knife': Limit(2, 10),
+    'api.player.save_gloves': Limit(2, 10),
+    'api.player.delete_gloves': Limit(2, 10),
+    'api.player.save_agents': Limit(2, 10),
+    'api.player.delete_agents': Limit(2, 10),
+    'api.player.save_loadout': Limit(0.5, 5, cost=10),
+    'api.player.import_loadout': Limit(0.2, 3, cost=10),
+}
+
+_NS = 'ratelimit'
+_GLOBAL_KEY = '*'
+# Per-player buckets kept at most; idle ones expire once full again anyway.
+_MAX_BUCKETS = 50000
+
+_limits: dict[str, Limit] = {}
+_global: Limit | None = None
+_shed_seconds = 2.0
+_stats = {'admitted': 0, 'limited': 0, 'global_limited': 0, 'shed': 0}
+_stats_lock = threading.Lock()
+
+
+def _parse_rate(spec: str) -> tuple[float, float]:
+    rate, _, burst = spec.partition('/')
+    rate, burst = float(rate), float(burst or rate)
+    if rate <= 0 or burst <= 0:
+        raise ValueError(f'rate and burst must be positive: {spec!r}')
+    return rate, burst
+
+
+def parse_limits(spec: str) -> dict[str, Limit]:
+    """_DEFAULT_LIMITS with the RATE_LIMITS overrides in spec applied."""
+    spec = spec.strip()
+    if spec.lower() == 'off':
+        return {}
+    limits = dict(_DEFAULT_LIMITS)
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        endpoint, _, value = item.partition('=')
+        endpoint, value = endpoint.strip(), value.strip()
+        if value.lower() == 'off':
+            limits.pop(endpoint, None)
+            continue
+        rate, burst = _parse_rate(value)
+        cost = limits[endpoint].cost if endpoint in limits else 1.0
+        limits[endpoint] = Limit(rate, burst, cost)
+    return limits
+
+
+def init_app(app) -> None:
+    """Load the limits from config and check every request against them."""
+    global _limits, _global, _shed_seconds
+    cfg = app.config
+    _limits = parse_limits(cfg['RATE_LIMITS'])
+    global_spec = cfg['RATE_LIMIT_GLOBAL'].strip()
+    _global = Limit(*_parse_rate(global_spec)) if global_spec and global_spec.lower() != 'off' else None
+    _shed_seconds = cfg['DB_SHED_SECONDS']
+    unknown = sorted(set(_limits) - set(app.view_functions))
+    if unknown:
+        logger.warning('RATE_LIMITS names unknown endpoints: %s', ', '.join(unknown))
+    if _limits:
+        app.before_request(_admit)
+
+
+def _count(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _refuse(retry_after: float, error: str):
+    resp = jsonify({'error': error})
+    resp.status_code = 429
+    resp.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return resp
+
+
+def _admit():
+    limit = _limits.get(request.endpoint)
+    if limit is None:
+        return None
+    steamid = session.get('steamid')
+    if not steamid:
+        # Same answer require_auth gives, before anonymous calls can drain the global bucket.
+        return jsonify({'error': 'Unauthorized'}), 401
+    if db.busy():
+        _count('shed')
+        return _refuse(_shed_seconds, 'Database busy, try again')
+    wait = shared.throttle(_NS, f'{request.endpoint}:{steamid}', limit.rate, limit.burst,
+                           max_entries=_MAX_BUCKETS)
+    if wait:
+        _count('limited')
+        return _refuse(wait, 'Too many requests, slow down')
+    if _global is not None:
+        wait = shared.throttle(_NS, _GLOBAL_KEY, _global.rate, _global.burst, limit.cost)
+        if wait:
+            _count('global_limited')
+            return _refuse(wait, 'Server busy, try again')
+    _count('admitted')
+    return None
+
+
+def stats() -> dict:
+    """This worker's admission counters and the configured limits."""
+    with _stats_lock:
+        out = dict(_stats)
+    out['limits'] = {endpoint: limit._asdict() for endpoint, limit in sorted(_limits.items())}
+    out['global'] = _global._asdict() if _global is not None else None
+    return out
+
+
+def _metric_samples() -> list[tuple[str, dict, float]]:
+    with _stats_lock:
+        return [('ratelimit_decisions_total', {'decision': decision}, count)
+                for decision, count in _stats.items()]
+
+
+metrics.register_collector(_metric_samples)
@@ -0,0 +1,216 @@
+"""Schema upkeep for the WeaponPaints tables the website writes to.
+
+The tables themselves are created by the WeaponPaints plugin; this module only
+adjusts what the website relies on:
+
+  * legacy skin rows — older site versions stored "both teams" as a single
+    weapon_team=0 row and T as weapon_team=1. normalize_legacy_teams() turns
+    them into the team 2/3 rows the plugin reads, in one batch.
+  * the steamid-leading indexes player.py's queries need (see INDEXES),
+    added if missing and checked with EXPLAIN.
+
+Applied migrations are recorded in web_migrations. Once the legacy rows are
+gone, the request handlers stop running their per-save cleanup DELETEs (see
+legacy_teams_normalized()). Run via migrate_db.py.
+"""
+import time
+import logging
+import threading
+
+import pymysql
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_TABLE = 'web_migrations'
+LEGACY_TEAMS = 'normalize_legacy_teams'
+
+# How often a worker re-checks for the marker until it appears.
+_MARKER_RECHECK = 300
+
+# Table → (index name, columns, query it serves, params for EXPLAIN).
+# An existing index whose leading columns match is reused.
+INDEXES: dict[str, list[tuple[str, tuple[str, ...], str, tuple]]] = {
+    'wp_player_skins': [
+        ('idx_web_steamid_team_defindex', ('steamid', 'weapon_team', 'weapon_defindex'),
+         'SELECT * FROM wp_player_skins WHERE steamid = %s ORDER BY weapon_team, weapon_defindex',
+         ('0',)),
+    ],
+    'wp_player_knife': [
+        ('idx_web_steamid_team', ('steamid', 'weapon_team'),
+         'SELECT weapon_team, knife FROM wp_player_knife WHERE steamid = %s', ('0',)),
+    ],
+    'wp_player_gloves': [
+        ('idx_web_steamid_team', ('steamid', 'weapon_team'),
+         'SELECT weapon_team, weapon_defindex FROM wp_player_gloves WHERE steamid = %s', ('0',)),
+    ],
+    'wp_player_agents': [
+        ('idx_web_steamid', ('steamid',),
+         'SELECT agent_ct, agent_t FROM wp_player_agents WHERE steamid = %s', ('0',)),
+    ],
+}
+
+# EXPLAIN access types that mean an index was used for the lookup.
+_INDEXED_ACCESS = {'const', 'eq_ref', 'ref', 'range', 'ref_or_null'}
+# Extra notes for a unique-key lookup MySQL resolved while planning (no row for the probe value).
+_CONST_MISS = ('no matching row in const table', 'Impossible WHERE noticed after reading const tables')
+
+_marker = {'applied': False, 'checked': 0.0}
+_marker_lock = threading.Lock()
+
+
+# ── Migration bookkeeping ─────────────────────────────────────────────────────
+
+def ensure_migrations_table(cur) -> None:
+    cur.execute(
+        f'''
+        CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (
+            name       VARCHAR(64) NOT NULL PRIMARY KEY,
+            applied_at DATETIME    NOT NULL,
+            detail     VARCHAR(255) NOT NULL DEFAULT ''
+        )
+        '''
+    )
+
+
+def is_applied(cur, name: str) -> bool:
+    try:
+        cur.execute(f'SELECT 1 FROM {MIGRATIONS_TABLE} WHERE name = %s', (name,))
+    except pymysql.err.ProgrammingError:
+        # Table missing: nothing has been migrated yet.
+        return False
+    return cur.fetchone() is not None
+
+
+def mark_applied(cur, name: str, detail: str = '') -> None:
+    cur.execute(
+        f'''
+        INSERT INTO {MIGRATIONS_TABLE} (name, applied_at, detail) VALUES (%s, UTC_TIMESTAMP(), %s)
+        ON DUPLICATE KEY UPDATE applied_at = VALUES(applied_at), detail = VALUES(detail)
+        ''',
+        (name, detail[:255]),
+    )
+
+
+def legacy_teams_normalized(cur) -> bool:
+    """Whether the legacy team migration has run, so writes can skip the cleanup DELETE.
+
+    Cached per worker: once seen it stays true; until then the marker is
+    re-read every _MARKER_RECHECK seconds.
+    """
+    if _marker['applied']:
+        return True
+    now = time.monotonic()
+    with _marker_lock:
+        if _marker['checked'] and now - _marker['checked'] < _MARKER_RECHECK:
+            return False
+        _marker['checked'] = now
+    try:
+        applied = is_applied(cur, LEGACY_TEAMS)
+    except pymysql.MySQLError:
+        logger.exception('Could not read the %s marker', LEGACY_TEAMS)
+        return False
+    _marker['applied'] = applied
+    return applied
+
+
+# ── Legacy team rows ──────────────────────────────────────────────────────────
+
+def _skin_columns(cur) -> list[str]:
+    """wp_player_skins columns other than steamid/weapon_team and any auto-increment id."""
+    cur.execute(
+        '''
+        SELECT COLUMN_NAME AS name, EXTRA AS extra FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'wp_player_skins'
+        ORDER BY ORDINAL_POSITION
+        '''
+    )
+    return [
+        r['name'] for r in cur.fetchall()
+        if r['name'] not in ('steamid', 'weapon_team') and 'auto_increment' not in r['extra']
+    ]
+
+
+def normalize_legacy_teams(cur) -> dict[str, int]:
+    """Rewrite weapon_team 0 (both) and 1 (old T) skin rows as team 2/3 rows.
+
+    A legacy row only fills a team that has no row of its own for that weapon,
+    matching what the handlers' save path would have kept. Returns row counts;
+    the caller commits.
+    """
+    cols = _skin_columns(cur)
+    col_list = ', '.join(cols)
+    select_list = ', '.join(f'l.{c}' for c in cols)
+    counts = {}
+    # Team 1 first: an explicit (old) T choice wins over a "both" row.
+    for source, target in ((1, 2), (0, 2), (0, 3)):
+        cur.execute(
+            f'''
+            INSERT INTO wp_player_skins (steamid, weapon_team, {col_list})
+            SELECT l.steamid, %s, {select_list} FROM wp_player_skins l
+            WHERE l.weapon_team = %s
+              AND NOT EXISTS (
+                SELECT 1 FROM wp_player_skins m
+                WHERE m.steamid = l.steamid AND m.weapon_defindex = l.weapon_defindex
+                  AND m.weapon_team = %s
+              )
+            ''',
+            (target, source, target),
+        )
+        counts[f'team{source}_to_{target}'] = cur.rowcount
+    cur.execute('DELETE FROM wp_player_skins WHERE weapon_team IN (0, 1)')
+    counts['legacy_deleted'] = cur.rowcount
+    return counts
+
+
+# ── Indexes ───────────────────────────────────────────────────────────────────
+
+def _existing_indexes(cur, table: str) -> dict[str, list[str]]:
+    cur.execute(f'SHOW INDEX FROM {table}')
+    indexes: dict[str, list[tuple[int, str]]] = {}
+    for r in cur.fetchall():
+        indexes.setdefault(r['Key_name'], []).append((r['Seq_in_index'], r['Column_name']))
+    return {name: [c for _, c in sorted(parts)] for name, parts in indexes.items()}
+
+
+def _covering_index(existing: dict[str, list[str]], columns: tuple[str, ...]) -> str | None:
+    for name, cols in existing.items():
+        if tuple(cols[:len(columns)]) == columns:
+            return name
+    return None
+
+
+def ensure_indexes(cur, dry_run: bool = False) -> list[dict]:
+    """Add any missing index from INDEXES; returns one report dict per index."""
+    report = []
+    for table, specs in INDEXES.items():
+        existing = _existing_indexes(cur, table)
+        for name, columns, _query, _params in specs:
+            found = _covering_index(existing, columns)
+            action = 'present'
+            if found is None:
+                action = 'missing' if dry_run else 'added'
+                if not dry_run:
+                    cur.execute(f'ALTER TABLE {table} ADD INDEX {name} ({", ".join(columns)})')
+                    existing[name] = list(columns)
+                    found = name
+            report.append({'table': table, 'columns': columns, 'index': found, 'action': action})
+    return report
+
+
+def explain_queries(cur) -> list[dict]:
+    """EXPLAIN each query in INDEXES; 'ok' is whether MySQL picks an index for it."""
+    results = []
+    for table, specs in INDEXES.items():
+        for _name, _columns, query, params in specs:
+            cur.execute(f'EXPLAIN {query}', params)
+            plan = cur.fetchone() or {}
+            extra = plan.get('Extra') or ''
+            results.append({
+                'table': table,
+                'query': query,
+                'access': plan.get('type'),
+                'key': plan.get('key'),
+                'ok': ((plan.get('type') in _INDEXED_ACCESS and plan.get('key') is not None)
+                       or any(note in extra for note in _CONST_MISS)),
+            })
+    return results
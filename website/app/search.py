@@ -0,0 +1,82 @@
+"""Token/prefix name search over the cached catalogs.
+
+A SearchIndex is built once per catalog version (via cache.get_view) from the
+item names. Every query token is matched as a prefix of a name token, which
+gives type-ahead behaviour; results are ranked so exact token matches and
+names starting with the query come first. Recent query results are kept per
+index, since type-ahead traffic repeats the same short prefixes.
+"""
+import re
+import heapq
+import threading
+from bisect import bisect_left
+
+# Word characters minus '_', so 'weapon_ak47' splits like 'AK-47' does.
+_TOKEN_RE = re.compile(r'[^\W_]+', re.UNICODE)
+# Upper bound on query tokens considered, so a pasted paragraph stays cheap.
+_MAX_QUERY_TOKENS = 8
+_RECENT_QUERIES = 512
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text.casefold())
+
+
+class SearchIndex:
+    """Inverted index from name tokens to result documents for one catalog."""
+
+    def __init__(self, docs: list[dict]) -> None:
+        """docs are the result dicts to return; each needs a 'name'."""
+        self.docs = docs
+        self._names: list[str] = [d['name'].casefold() for d in docs]
+        self._doc_tokens: list[frozenset[str]] = [frozenset(tokenize(n)) for n in self._names]
+        postings: dict[str, list[int]] = {}
+        for doc_id, tokens in enumerate(self._doc_tokens):
+            for token in tokens:
+                postings.setdefault(token, []).append(doc_id)
+        self._postings = postings
+        self._tokens: list[str] = sorted(postings)
+        self._recent: dict[tuple[tuple[str, ...], str, int], list[tuple[float, dict]]] = {}
+        # Request threads (or greenlets) share the index; guards _recent.
+        self._recent_lock = threading.Lock()
+
+    def _prefix_docs(self, prefix: str) -> set[int]:
+        lo = bisect_left(self._tokens, prefix)
+        hi = bisect_left(self._tokens, prefix + '\U0010ffff', lo)
+        out: set[int] = set()
+        for token in self._tokens[lo:hi]:
+            out.update(self._postings[token])
+        return out
+
+    def search(self, query: str, limit: int) -> list[tuple[float, dict]]:
+        """Return up to limit (score, doc) pairs matching every query token."""
+        q_tokens = tuple(tokenize(query)[:_MAX_QUERY_TOKENS])
+        if not q_tokens:
+            return []
+        q_lower = query.casefold().strip()
+        key = (q_tokens, q_lower, limit)
+        with self._recent_lock:
+            hit = self._recent.get(key)
+        if hit is not None:
+            return hit
+
+        # Intersect the per-token prefix matches, smallest set first.
+        matched = sorted((self._prefix_docs(q) for q in set(q_tokens)), key=len)
+        candidates = matched[0].intersection(*matched[1:])
+
+        scored = []
+        for doc_id in candidates:
+            tokens = self._doc_tokens[doc_id]
+            name = self._names[doc_id]
+            # Exact token matches beat prefix matches; shorter names win ties.
+            score = sum(2.0 if q in tokens else 1.0 for q in q_tokens) - len(name) / 1000
+            if name.startswith(q_lower):
+                score += 3.0
+            scored.append((score, doc_id))
+
+        result = [(score, self.docs[doc_id]) for score, doc_id in heapq.nlargest(limit, scored)]
+        with self._recent_lock:
+            if len(self._recent) >= _RECENT_QUERIES:
+                self._recent.pop(next(iter(self._recent)))
+            self._recent[key] = result
+        return result
@@ -0,0 +1,312 @@
+"""Small key/value store shared by every Gunicorn worker, backed by SQLite.
+
+Workers are separate processes, so a plain dict cache would be duplicated
+(and invalidated) per worker. This keeps namespaced entries in one SQLite
+database under SHARED_STATE_PATH instead — by default in the service's
+runtime directory, which lives on tmpfs and is wiped on restart, so it is
+purely a cache. WAL mode lets the workers read concurrently while one writes.
+
+Counters (counter()/incr()) and token buckets (throttle()) live in the same
+table and are updated atomically, so every worker sees one sequence or
+bucket per key.
+
+Entries can expire, and a namespace can be bounded: once it holds more than
+max_entries the least recently used rows are evicted. Recency is tracked
+coarsely (a read only re-stamps an entry every _TOUCH_AFTER seconds) so hot
+reads stay read-only.
+
+The store is best-effort: if the database is unavailable or busy, reads
+miss and writes are dropped, and callers fall back to the source of truth.
+"""
+import os
+import time
+import sqlite3
+import logging
+import threading
+
+from . import cooperative
+
+logger = logging.getLogger(__name__)
+
+# Reads re-stamp an entry's last-used time at most this often.
+_TOUCH_AFTER = 10
+# Bounded namespaces are trimmed once every this many writes.
+_EVICT_EVERY = 32
+_BUSY_TIMEOUT_MS = 200
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS kv (
+    ns      TEXT NOT NULL,
+    key     TEXT NOT NULL,
+    value   BLOB NOT NULL,
+    expires REAL,
+    used    REAL NOT NULL,
+    PRIMARY KEY (ns, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS kv_used ON kv (ns, used);
+'''
+
+# Set by init_app(); None disables the store (every get misses).
+_path: str | None = None
+# One connection per OS thread. Under gevent every greenlet in a worker shares
+# it, which is safe: each call here is a single autocommit statement.
+_local = cooperative.native_local()
+_writes = 0
+_writes_lock = threading.Lock()
+
+
+def init_app(app) -> None:
+    """Open (creating if needed) the shared database named in the app config."""
+    global _path
+    path = app.config.get('SHARED_STATE_PATH')
+    if not path:
+        return
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = sqlite3.connect(path, timeout=_BUSY_TIMEOUT_MS / 1000)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(_SCHEMA)
+        conn.close()
+    except (OSError, sqlite3.Error):
+        logger.exception('Shared state %s unavailable — caches stay per request', path)
+        return
+    _path = path
+
+
+def enabled() -> bool:
+    return _path is not None
+
+
+def _conn() -> sqlite3.Connection | None:
+    """This thread's connection, reopened after a fork."""
+    if _path is None:
+        return None
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.pid != os.getpid():
+        try:
+            conn = sqlite3.connect(_path, timeout=_BUSY_TIMEOUT_MS / 1000,
+                                   isolation_level=None, check_same_thread=False)
+            # The database is a cache on tmpfs; durability buys nothing here.
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute(f'PRAGMA busy_timeout={_BUSY_TIMEOUT_MS}')
+        except sqlite3.Error as exc:
+            logger.warning('Shared state %s unavailable: %s', _path, exc)
+            return None
+        _local.conn, _local.pid = conn, os.getpid()
+    return conn
+
+
+def get(ns: str, key: str) -> bytes | None:
+    """Return the value stored under (ns, key), or None if absent or expired."""
+    conn = _conn()
+    if conn is None:
+        return None
+    now = time.time()
+    try:
+        row = conn.execute(
+            'SELECT value, expires, used FROM kv WHERE ns = ? AND key = ?', (ns, key),
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires, used = row
+        if expires is not None and expires <= now:
+            return None
+        if now - used >= _TOUCH_AFTER:
+            conn.execute('UPDATE kv SET used = ? WHERE ns = ? AND key = ?', (now, ns, key))
+        return value
+    except sqlite3.Error as exc:
+        logger.warning('Shared state read %s/%s failed: %s', ns, key, exc)
+        return None
+
+
+def put(ns: str, key: str, value: bytes, ttl: float | None = None,
+        max_entries: int | None = None) -> bool:
+    """Store value under (ns, key), optionally expiring after ttl seconds.
+
+    With max_entries, the namespace is periodically trimmed back to that many
+    entries, least recently used first. Returns whether the value was stored.
+    """
+    conn = _conn()
+    if conn is None:
+        return False
+    now = time.time()
+    try:
+        conn.execute(
+            'INSERT OR REPLACE INTO kv (ns, key, value, expires, used) VALUES (?, ?, ?, ?, ?)',
+            (ns, key, value, now + ttl if ttl is not None else None, now),
+        )
+    except sqlite3.Error as exc:
+        logger.warning('Shared state write %s/%s failed: %s', ns, key, exc)
+        return False
+    if max_entries is not None:
+        _maybe_evict(ns, max_entries)
+    return True
+
+
+def _maybe_evict(ns: str, max_entries: int) -> None:
+    """Trim ns back to max_entries on every _EVICT_EVERY-th bounded write."""
+    global _writes
+    with _writes_lock:
+        _writes += 1
+        due = _writes % _EVICT_EVERY == 0
+    if due:
+        evict(ns, max_entries)
+
+
+def delete(ns: str, key: str) -> None:
+    conn = _conn()
+    if conn is None:
+        return
+    try:
+        conn.execute('DELETE FROM kv WHERE ns = ? AND key = ?', (ns, key))
+    except sqlite3.Error as exc:
+        logger.warning('Shared state delete %s/%s failed: %s', ns, key, exc)
+
+
+def scan(ns: str, prefix: str = '') -> list[tuple[str, bytes]]:
+    """(key, value) pairs in ns whose key starts with prefix, in key order."""
+    conn = _conn()
+    if conn is None:
+        return []
+    try:
+        return conn.execute(
+            '''
+            SELECT key, value FROM kv
+            WHERE ns = ? AND key >= ? AND key < ? AND (expires IS NULL OR expires > ?)
+            ORDER BY key
+            ''',
+            (ns, prefix, prefix + '\U0010ffff', time.time()),
+        ).fetchall()
+    except sqlite3.Error as exc:
+        logger.warning('Shared state scan of %s failed: %s', ns, exc)
+        return []
+
+
+def delete_if(ns: str, key: str, value: bytes) -> bool:
+    """Delete (ns, key) only if it still holds value; returns whether it did."""
+    conn = _conn()
+    if conn is None:
+        return False
+    try:
+        cur = conn.execute('DELETE FROM kv WHERE ns = ? AND key = ? AND value = ?', (ns, key, value))
+        return cur.rowcount > 0
+    except sqlite3.Error as exc:
+        logger.warning('Shared state delete %s/%s failed: %s', ns, key, exc)
+        return False
+
+
+def counter(ns: str, key: str, seed: int = 0) -> int | None:
+    """Current value of the counter (ns, key), created as seed if absent.
+
+    Returns None when the store is unavailable.
+    """
+    conn = _conn()
+    if conn is None:
+        return None
+    select = 'SELECT value FROM kv WHERE ns = ? AND key = ?'
+    try:
+        row = conn.execute(select, (ns, key)).fetchone()
+        if row is None:
+            conn.execute(
+                'INSERT OR IGNORE INTO kv (ns, key, value, expires, used) VALUES (?, ?, ?, NULL, ?)',
+                (ns, key, seed, time.time()),
+            )
+            row = conn.execute(select, (ns, key)).fetchone()
+        return int(row[0])
+    except (sqlite3.Error, TypeError, ValueError) as exc:
+        logger.warning('Shared counter read %s/%s failed: %s', ns, key, exc)
+        return None
+
+
+def incr(ns: str, key: str, seed: int = 0, delta: int = 1) -> int | None:
+    """Atomically add delta to the counter (ns, key), starting from seed; returns the new value."""
+    conn = _conn()
+    if conn is None:
+        return None
+    try:
+        rows = conn.execute(
+            '''
+            INSERT INTO kv (ns, key, value, expires, used) VALUES (?, ?, ?, NULL, ?)
+            ON CONFLICT (ns, key) DO UPDATE SET value = value + ?, used = excluded.used
+            RETURNING value
+            ''',
+            (ns, key, seed + delta, time.time(), delta),
+        ).fetchall()  # drain so the statement (and its write lock) is released
+        return int(rows[0][0])
+    except (sqlite3.Error, TypeError, ValueError) as exc:
+        logger.warning('Shared counter update %s/%s failed: %s', ns, key, exc)
+        return None
+
+
+def throttle(ns: str, key: str, rate: float, burst: float, cost: float = 1.0,
+             max_entries: int | None = None) -> float | None:
+    """Take cost tokens from the bucket (ns, key), refilled at rate per second up to burst.
+
+    Returns 0.0 if they were taken, otherwise the seconds until they would
+    be (nothing is taken); None when the store is unavailable.
+
+    The bucket is kept as its theoretical arrival time (GCRA): the time at
+    which it would be full again. One conditional upsert checks and advances
+    it, so concurrent workers never both spend the last token.
+    """
+    conn = _conn()
+    if conn is None:
+        return None
+    interval = cost / rate
+    window = burst / rate
+    now = time.time()
+    try:
+        rows = conn.execute(
+            '''
+            INSERT INTO kv (ns, key, value, expires, used) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (ns, key) DO UPDATE SET
+                value = max(value, excluded.used) + ?,
+                expires = max(value, excluded.used) + ?,
+                used = excluded.used
+            WHERE max(value, excluded.used) + ? - excluded.used <= ?
+            RETURNING value
+            ''',
+            (ns, key, now + interval, now + interval, now, interval, interval, interval, window),
+        ).fetchall()  # drain so the statement (and its write lock) is released
+        if rows:
+            wait = 0.0
+        else:
+            row = conn.execute('SELECT value FROM kv WHERE ns = ? AND key = ?', (ns, key)).fetchone()
+            wait = max(float(row[0]), now) + interval - window - now if row else 0.0
+    except (sqlite3.Error, TypeError, ValueError) as exc:
+        logger.warning('Shared throttle %s/%s failed: %s', ns, key, exc)
+        return None
+    if rows and max_entries is not None:
+        _maybe_evict(ns, max_entries)
+    return max(wait, 0.0)
+
+
+def evict(ns: str, max_entries: int) -> int:
+    """Drop expired entries and all but the max_entries most recently used; returns the count."""
+    conn = _conn()
+    if conn is None:
+        return 0
+    try:
+        cur = conn.execute(
+            '''
+            DELETE FROM kv WHERE ns = ? AND (
+                (expires IS NOT NULL AND expires <= ?)
+                OR key IN (SELECT key FROM kv WHERE ns = ? ORDER BY used DESC LIMIT -1 OFFSET ?)
+            )
+            ''',
+            (ns, time.time(), ns, max_entries),
+        )
+        return cur.rowcount
+    except sqlite3.Error as exc:
+        logger.warning('Shared state eviction in %s failed: %s', ns, exc)
+        return 0
+
+
+def count(ns: str) -> int:
+    conn = _conn()
+    if conn is None:
+        return 0
+    try:
+        return conn.execute('SELECT COUNT(*) FROM kv WHERE ns = ?', (ns,)).fetchone()[0]
+    except sqlite3.Error:
+        return 0
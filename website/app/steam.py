@@ -0,0 +1,250 @@
+"""Steam player summaries (name, avatar), cached for every Gunicorn worker.
+
+Logins used to call GetPlayerSummaries for one steamid, on the login
+request itself. Here summaries live in the shared store (app/shared.py) for
+STEAM_PROFILE_MAX_AGE; lookups only read that cache. A summary older than
+STEAM_PROFILE_TTL is still returned, and its steamid is put on a shared
+refresh queue, as is any steamid not cached yet. A background refresher in
+each worker drains the queue with multi-steamid GetPlayerSummaries calls (up
+to 100 ids each) after waiting STEAM_BATCH_DELAY for a burst of logins to
+collect; an flock makes sure only one process calls Steam at a time.
+
+A player logging in for the first time therefore gets their steamid as a
+name until the refresher has run, a fraction of a second later; /auth/me
+reads through this cache, so the frontend picks the real name up from
+there. Without the shared store, each worker keeps its own cache for
+STEAM_PROFILE_TTL and only steamids missing from it (or expired) are fetched
+synchronously, in one call; a failed call is not repeated for _RETRY_AFTER.
+"""
+import json
+import time
+import fcntl
+import logging
+import threading
+
+import requests
+
+from . import metrics, outbound, shared
+
+logger = logging.getLogger(__name__)
+
+_STEAM_API = 'https://api.steampowered.com'
+# GetPlayerSummaries accepts at most this many comma-separated steamids.
+_BATCH_MAX = 100
+# Summary fields kept in the cache.
+_FIELDS = ('personaname', 'avatarfull', 'profileurl')
+# After a failed call the queue is left alone for this long.
+_RETRY_AFTER = 30
+
+_NS = 'steam_profile'
+_QUEUE_NS = 'steam_refresh'
+
+_app = None
+_refresher: threading.Thread | None = None
+_refresher_lock = threading.Lock()
+_wake = threading.Event()
+# Per-worker fallback when the shared store is off: steamid → (fetched at, summary).
+_local: dict[str, tuple[float, dict]] = {}
+_local_lock = threading.Lock()
+_local_failed_at = 0.0
+_stats = {'hits': 0, 'stale': 0, 'misses': 0, 'calls': 0, 'call_errors': 0, 'fetched': 0}
+_stats_lock = threading.Lock()
+
+
+def init_app(app) -> None:
+    """Serve summaries from the shared store and refresh them in the background."""
+    global _app
+    _app = app
+    if not shared.enabled():
+        logger.warning('Steam profile cache needs SHARED_STATE_PATH — caching summaries per worker')
+
+
+def _count(name: str, n: int = 1) -> None:
+    with _stats_lock:
+        _stats[name] += n
+
+
+def fetch(steamids: list[str]) -> dict[str, dict]:
+    """Call GetPlayerSummaries for steamids, _BATCH_MAX per call; returns steamid → summary.
+
+    Steamids Steam does not return map to {}. A failed call raises
+    requests.RequestException (or ValueError for a malformed body).
+    """
+    out: dict[str, dict] = {}
+    for i in range(0, len(steamids), _BATCH_MAX):
+        chunk = steamids[i:i + _BATCH_MAX]
+        _count('calls')
+        try:
+            resp = outbound.get(
+                'steam_api',
+                f'{_STEAM_API}/ISteamUser/GetPlayerSummaries/v2/',
+                params={'key': _app.config['STEAM_API_KEY'], 'steamids': ','.join(chunk)},
+            )
+            resp.raise_for_status()
+            players = resp.json().get('response', {}).get('players', [])
+        except (requests.RequestException, ValueError):
+            _count('call_errors')
+            raise
+        out.update(dict.fromkeys(chunk, {}))
+        for player in players:
+            if player.get('steamid') in out:
+                out[player['steamid']] = {f: player[f] for f in _FIELDS if f in player}
+        _count('fetched', len(chunk))
+    return out
+
+
+def lookup_many(steamids: list[str]) -> dict[str, dict]:
+    """Cached summaries for steamids; missing and stale ones are queued for refresh.
+
+    Steamids with nothing cached yet are absent from the result.
+    """
+    if not shared.enabled():
+        return _lookup_local(steamids)
+
+    ttl = _app.config['STEAM_PROFILE_TTL']
+    now = time.time()
+    out: dict[str, dict] = {}
+    refresh = []
+    for steamid in steamids:
+        cached = shared.get(_NS, steamid)
+        if cached is None:
+            _count('misses')
+            refresh.append(steamid)
+            continue
+        entry = json.loads(cached)
+        out[steamid] = entry['profile']
+        if now - entry['fetched'] >= ttl:
+            _count('stale')
+            refresh.append(steamid)
+        else:
+            _count('hits')
+    if refresh:
+        _request_refresh(refresh)
+    return out
+
+
+def _lookup_local(steamids: list[str]) -> dict[str, dict]:
+    """lookup_many() without the shared store: a per-worker TTL cache in front of fetch()."""
+    global _local_failed_at
+    ttl = _app.config['STEAM_PROFILE_TTL']
+    now = time.time()
+    out: dict[str, dict] = {}
+    missing = []
+    with _local_lock:
+        for steamid in steamids:
+            cached = _local.get(steamid)
+            if cached is not None:
+                out[steamid] = cached[1]
+            if cached is None or now - cached[0] >= ttl:
+                missing.append(steamid)
+        failed_recently = now - _local_failed_at < _RETRY_AFTER
+    _count('hits', len(steamids) - len(missing))
+    _count('misses', len(missing))
+    if not missing or failed_recently:
+        return out
+    try:
+        fetched = fetch(missing)
+    except (requests.RequestException, ValueError):
+        logger.exception('Failed to fetch Steam profiles for %s', ','.join(missing))
+        _local_failed_at = now
+        return out
+    limit = _app.config['STEAM_PROFILE_CACHE_MAX']
+    with _local_lock:
+        for steamid, profile in fetched.items():
+            _local.pop(steamid, None)
+            _local[steamid] = (now, profile)
+        while len(_local) > limit:
+            del _local[next(iter(_local))]
+    out.update(fetched)
+    return out
+
+
+def lookup(steamid: str) -> dict:
+    """steamid's cached summary ({} if none yet); see lookup_many()."""
+    return lookup_many([steamid]).get(steamid, {})
+
+
+def _request_refresh(steamids: list[str]) -> None:
+    now = b'%f' % time.time()
+    for steamid in steamids:
+        if shared.get(_QUEUE_NS, steamid) is None:
+            shared.put(_QUEUE_NS, steamid, now)
+    _ensure_refresher()
+    _wake.set()
+
+
+def _lock_path() -> str:
+    return _app.config['SHARED_STATE_PATH'] + '.steam.lock'
+
+
+def refresh() -> int:
+    """Fetch up to _BATCH_MAX queued summaries in one call; returns how many were stored.
+
+    Returns 0 straight away if another process is already refreshing.
+    """
+    with open(_lock_path(), 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return 0
+        try:
+            return _refresh_locked()
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _refresh_locked() -> int:
+    queued = sorted(shared.scan(_QUEUE_NS), key=lambda kv: float(kv[1]))[:_BATCH_MAX]
+    if not queued:
+        return 0
+    profiles = fetch([steamid for steamid, _ in queued])
+    cfg = _app.config
+    now = time.time()
+    for steamid, stamp in queued:
+        entry = {'profile': profiles.get(steamid, {}), 'fetched': now}
+        shared.put(_NS, steamid, json.dumps(entry).encode(),
+                   ttl=cfg['STEAM_PROFILE_MAX_AGE'], max_entries=cfg['STEAM_PROFILE_CACHE_MAX'])
+        shared.delete_if(_QUEUE_NS, steamid, stamp)
+    return len(queued)
+
+
+def _refresher_loop() -> None:
+    while True:
+        # Other workers queue steamids too, so poll even without a local wake-up.
+        _wake.wait(timeout=1)
+        _wake.clear()
+        try:
+            if not shared.count(_QUEUE_NS):
+                continue
+            time.sleep(_app.config['STEAM_BATCH_DELAY'])
+            while refresh() == _BATCH_MAX:
+                pass
+        except (requests.RequestException, ValueError):
+            logger.exception('Steam profile refresh failed; retrying in %ds', _RETRY_AFTER)
+            time.sleep(_RETRY_AFTER)
+        except Exception:
+            logger.exception('Steam profile refresher iteration failed')
+
+
+def _ensure_refresher() -> None:
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None or not _refresher.is_alive():
+            _refresher = threading.Thread(target=_refresher_loop, name='steam-profile-refresh', daemon=True)
+            _refresher.start()
+
+
+def stats() -> dict:
+    with _stats_lock:
+        out = dict(_stats)
+    out['queued'] = shared.count(_QUEUE_NS) if shared.enabled() else 0
+    return out
+
+
+def _metric_samples() -> list[tuple[str, dict, float]]:
+    with _stats_lock:
+        return [('steam_profile_lookups_total', {'result': result}, _stats[key])
+                for result, key in (('hit', 'hits'), ('stale', 'stale'), ('miss', 'misses'))]
+
+
+metrics.register_collector(_metric_samples)
@@ -0,0 +1,231 @@
+"""Optional write-behind queue for skin saves (SKIN_WRITE_BEHIND).
+
+Dragging the wear slider or cycling stickers sends a burst of PUTs for the
+same (steamid, team, defindex). With write-behind on, a save is acknowledged
+as soon as it is queued; the queue lives in the shared store (app/shared.py),
+keyed by (steamid, team, defindex), so a newer save for the same key simply
+replaces the pending one and every worker sees it. A background flusher in
+each worker writes entries that have been quiet for WRITE_BEHIND_DELAY
+seconds to MySQL in one batched transaction; an flock makes sure only one
+process flushes at a time. Entries still pending at worker shutdown are
+flushed before it exits.
+
+pending() exposes a player's queued rows so reads can overlay them (read-
+your-writes). The queue is bounded: enqueue() refuses once
+WRITE_BEHIND_MAX_PENDING entries are waiting and the caller writes
+synchronously instead.
+
+The writer (registered with set_writer()) receives {steamid: [rows]} and is
+responsible for the MySQL transaction; it runs inside an app context. It
+also receives still_queued(), to call after its writes and before commit:
+direct writes and deletes discard() the queued rows they supersede before
+touching MySQL, so a batch entry that is gone by then must not be written
+back — the writer rolls back and the flush is retried without it. Once the
+check passes, the batch holds its rows' locks until commit, so a direct
+write that discards later waits for the flush and lands after it.
+"""
+import json
+import time
+import fcntl
+import atexit
+import logging
+import threading
+from typing import Callable
+
+from . import metrics, shared
+
+logger = logging.getLogger(__name__)
+
+_NS = 'skin_pending'
+# An entry that keeps being re-saved is flushed anyway after this many delays.
+_MAX_DEFER = 10
+# Flush passes tried when a direct write keeps discarding rows mid-flush.
+_FLUSH_ATTEMPTS = 3
+
+_app = None
+_writer: Callable[[dict[str, list[list]], Callable[[], bool]], bool] | None = None
+_flusher: threading.Thread | None = None
+_flusher_lock = threading.Lock()
+_stats = {'queued': 0, 'coalesced': 0, 'rejected': 0, 'flushed': 0, 'flushes': 0, 'flush_errors': 0,
+          'flush_conflicts': 0}
+_stats_lock = threading.Lock()
+
+
+def init_app(app) -> None:
+    """Enable write-behind if SKIN_WRITE_BEHIND is set and the shared store is up."""
+    global _app
+    if not app.config.get('SKIN_WRITE_BEHIND'):
+        return
+    if not shared.enabled():
+        logger.warning('SKIN_WRITE_BEHIND needs SHARED_STATE_PATH — saving skins synchronously')
+        return
+    _app = app
+    atexit.register(flush, True)
+    # Started from the first request, so a preloaded app's flusher runs in the worker.
+    app.before_request(_ensure_flusher)
+
+
+def enabled() -> bool:
+    return _app is not None and _writer is not None
+
+
+def set_writer(fn: Callable[[dict[str, list[list]], Callable[[], bool]], bool]) -> None:
+    """Register fn({steamid: [rows]}, still_queued) to write a batch of queued rows to MySQL.
+
+    fn returns False, having rolled back, if still_queued() was False before commit.
+    """
+    global _writer
+    _writer = fn
+
+
+def _key(steamid: str, team: int, defindex: int) -> str:
+    return f'{steamid}:{team}:{defindex}'
+
+
+def _count(name: str, n: int = 1) -> None:
+    with _stats_lock:
+        _stats[name] += n
+
+
+def enqueue(steamid: str, rows: list[tuple]) -> bool:
+    """Queue skin rows (weapon_team, weapon_defindex, ...) for steamid.
+
+    Returns False, queuing nothing, when write-behind is off or the queue is
+    full; the caller should then write synchronously.
+    """
+    if not enabled():
+        return False
+    cfg = _app.config
+    if shared.count(_NS) + len(rows) > cfg['WRITE_BEHIND_MAX_PENDING']:
+        _count('rejected')
+        return False
+    now = time.time()
+    entries = []
+    for row in rows:
+        key = _key(steamid, row[0], row[1])
+        previous = shared.get(_NS, key)
+        since = json.loads(previous)['since'] if previous is not None else now
+        entries.append((key, {'row': list(row), 'since': since, 'at': now}, previous is not None))
+    for key, entry, coalesced in entries:
+        if not shared.put(_NS, key, json.dumps(entry).encode()):
+            # Whatever was stored already is still valid; let the caller write it all.
+            return False
+        _count('coalesced' if coalesced else 'queued')
+    _ensure_flusher()
+    return True
+
+
+def pending(steamid: str) -> list[list]:
+    """steamid's queued rows not yet written to MySQL."""
+    if not enabled():
+        return []
+    return [json.loads(value)['row'] for _, value in shared.scan(_NS, f'{steamid}:')]
+
+
+def discard(steamid: str, keys: list[tuple[int, int]]) -> None:
+    """Drop queued rows for (team, defindex) keys about to be written or deleted directly."""
+    if not enabled():
+        return
+    for team, defindex in keys:
+        shared.delete(_NS, _key(steamid, team, defindex))
+
+
+def _lock_path() -> str:
+    return _app.config['SHARED_STATE_PATH'] + '.flush.lock'
+
+
+def flush(everything: bool = False) -> int:
+    """Write due entries (all of them with everything) to MySQL; returns rows written.
+
+    Returns 0 straight away if another process is already flushing, unless
+    everything is set, in which case it waits for that flush to finish.
+    """
+    if not enabled() or not shared.count(_NS):
+        return 0
+    with open(_lock_path(), 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | (0 if everything else fcntl.LOCK_NB))
+        except BlockingIOError:
+            return 0
+        try:
+            for _ in range(_FLUSH_ATTEMPTS):
+                written = _flush_locked(everything)
+                if written is not None:
+                    return written
+            return 0
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _flush_locked(everything: bool) -> int | None:
+    """One flush pass; None if a batch entry was discarded mid-flush and nothing was written."""
+    delay = _app.config['WRITE_BEHIND_DELAY']
+    now = time.time()
+    due: list[tuple[str, bytes, list]] = []
+    for key, value in shared.scan(_NS):
+        entry = json.loads(value)
+        if everything or now - entry['at'] >= delay or now - entry['since'] >= delay * _MAX_DEFER:
+            due.append((key, value, entry['row']))
+    if not due:
+        return 0
+
+    batch: dict[str, list[list]] = {}
+    for key, _, row in due:
+        batch.setdefault(key.split(':', 1)[0], []).append(row)
+
+    def still_queued() -> bool:
+        return all(shared.get(_NS, key) is not None for key, _, _ in due)
+
+    try:
+        with _app.app_context():
+            if not _writer(batch, still_queued):
+                _count('flush_conflicts')
+                return None
+    except Exception:
+        _count('flush_errors')
+        logger.exception('Write-behind flush of %d skin rows failed; will retry', len(due))
+        return 0
+
+    # Entries re-saved while this batch was in flight stay queued for the next flush.
+    for key, value, _ in due:
+        shared.delete_if(_NS, key, value)
+    _count('flushed', len(due))
+    _count('flushes')
+    return len(due)
+
+
+def _flusher_loop() -> None:
+    interval = max(_app.config['WRITE_BEHIND_DELAY'] / 2, 0.05)
+    while True:
+        time.sleep(interval)
+        try:
+            if shared.count(_NS):
+                flush()
+        except Exception:
+            logger.exception('Write-behind flusher iteration failed')
+
+
+def _ensure_flusher() -> None:
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _flusher_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_flusher_loop, name='skin-write-behind', daemon=True)
+            _flusher.start()
+
+
+def stats() -> dict:
+    with _stats_lock:
+        out = dict(_stats)
+    out['pending'] = shared.count(_NS) if enabled() else 0
+    return out
+
+
+def _metric_samples() -> list[tuple[str, dict, float]]:
+    with _stats_lock:
+        return [('writebehind_rows_total', {'event': event}, _stats[event])
+                for event in ('queued', 'coalesced', 'rejected', 'flushed')]
+
+
+metrics.register_collector(_metric_samples)
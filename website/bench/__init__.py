@@ -0,0 +1 @@
+"""Offline benchmark suite for the Flask API (see bench/run.py)."""
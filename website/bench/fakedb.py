@@ -0,0 +1,219 @@
+"""In-memory stand-in for MySQL at the connection-pool boundary.
+
+FakePool replaces app.db's per-worker pools, so get_db(), get_read_db() and
+close_db() run unchanged while the statements player.py issues are executed
+against dicts keyed like the WeaponPaints tables' unique keys. Only the SQL
+shapes the app actually uses are understood: single-table SELECT/DELETE with
+`col = %s` / `col IN (...)` conditions, INSERT ... VALUES with ON DUPLICATE
+KEY UPDATE, and the Threads_running status query. An optional per-statement
+latency models the network round trip to a real server.
+"""
+import re
+import time
+import random
+import threading
+
+from app.catalog_index import WEAPON_DEFINDEX
+
+# Table → unique key columns.
+_KEYS = {
+    'wp_player_skins': ('steamid', 'weapon_team', 'weapon_defindex'),
+    'wp_player_knife': ('steamid', 'weapon_team'),
+    'wp_player_gloves': ('steamid', 'weapon_team'),
+    'wp_player_agents': ('steamid',),
+}
+# Columns whose NULL never overwrites on upsert (the agents COALESCE update).
+_COALESCE = {'wp_player_agents'}
+
+_SELECT_RE = re.compile(r'^SELECT (.+?) FROM (\w+)(?: WHERE (.+?))?(?: ORDER BY (.+))?$', re.I)
+_DELETE_RE = re.compile(r'^DELETE FROM (\w+) WHERE (.+)$', re.I)
+_INSERT_RE = re.compile(r'^INSERT INTO (\w+) \(([^)]+)\) VALUES', re.I)
+_COND_RE = re.compile(r'^(\w+) (?:= (%s|\d+)|IN \(([^)]*)\))$', re.I)
+
+
+class FakeDatabase:
+    """The shared table data; thread-safe."""
+
+    def __init__(self, latency: float = 0.0, migrated: bool = True) -> None:
+        self.latency = latency
+        self.migrated = migrated
+        # Table → steamid → unique key → row; every query the app issues filters on steamid.
+        self.tables: dict[str, dict[str, dict[tuple, dict]]] = {t: {} for t in _KEYS}
+        self.lock = threading.Lock()
+        self.statements = 0
+        # Reported for SHOW GLOBAL STATUS LIKE 'Threads_running' (db.busy()).
+        self.threads_running = 1
+
+    def seed(self, players: int, skins_per_player: int = 25, seed: int = 7) -> list[str]:
+        """Fill the tables with plausible loadouts; returns the steamids."""
+        rng = random.Random(seed)
+        defindexes = sorted(set(WEAPON_DEFINDEX.values()))
+        steamids = [str(76561198000000000 + i) for i in range(players)]
+        for sid in steamids:
+            for defindex in rng.sample(defindexes, min(skins_per_player, len(defindexes))):
+                for team in rng.choice(((2,), (3,), (2, 3))):
+                    self._upsert('wp_player_skins', {
+                        'steamid': sid, 'weapon_team': team, 'weapon_defindex': defindex,
+                        'weapon_paint_id': rng.randint(1, 1200), 'weapon_wear': round(rng.random(), 4),
+                        'weapon_seed': rng.randint(0, 1000), 'weapon_nametag': '',
+                        'weapon_stattrak': rng.randint(0, 1), 'weapon_stattrak_count': 0,
+                        **{f'weapon_sticker_{i}': f'{rng.randint(0, 5000)};0;0;0;0;1;0' for i in range(5)},
+                        'weapon_keychain': '0;0;0;0;0',
+                    }, None)
+            for team in (2, 3):
+                self._upsert('wp_player_knife', {'steamid': sid, 'weapon_team': team,
+                                                 'knife': 'weapon_knife_karambit'}, None)
+                self._upsert('wp_player_gloves', {'steamid': sid, 'weapon_team': team,
+                                                  'weapon_defindex': 5027}, None)
+            self._upsert('wp_player_agents', {'steamid': sid, 'agent_ct': 'ctm_st6/ctm_st6_variantl',
+                                              'agent_t': None}, None)
+        return steamids
+
+    def _upsert(self, table: str, row: dict, update: set[str] | None) -> None:
+        key = tuple(row[c] for c in _KEYS[table])
+        bucket = self.tables[table].setdefault(row['steamid'], {})
+        existing = bucket.get(key)
+        if existing is None:
+            bucket[key] = dict(row)
+            return
+        for col in update if update is not None else row:
+            if table in _COALESCE and row.get(col) is None:
+                continue
+            existing[col] = row[col]
+
+    def _candidates(self, table: str, tests: list[tuple[str, set]]):
+        """(bucket, key, row) triples worth testing, narrowed by any steamid condition."""
+        data = self.tables[table]
+        sids = next((values for col, values in tests if col == 'steamid'), None)
+        buckets = [data[sid] for sid in sids if sid in data] if sids is not None else list(data.values())
+        return [(bucket, key, row) for bucket in buckets for key, row in bucket.items()]
+
+    @staticmethod
+    def _conditions(where: str | None, params: list) -> list[tuple[str, set]]:
+        """Parse a WHERE clause into (column, allowed values), consuming params in order."""
+        tests = []
+        for cond in (where.split(' AND ') if where else []):
+            m = _COND_RE.match(cond.strip())
+            if m is None:
+                raise NotImplementedError(f'fake DB cannot evaluate {cond!r}')
+            col, eq, in_list = m.groups()
+            if eq is not None:
+                values = {params.pop(0) if eq == '%s' else int(eq)}
+            else:
+                values = {params.pop(0) if v.strip() == '%s' else int(v) for v in in_list.split(',')}
+            tests.append((col, values))
+        return tests
+
+    def _matching(self, table: str, where: str | None, params: list):
+        tests = self._conditions(where, params)
+        return [(bucket, key, row) for bucket, key, row in self._candidates(table, tests)
+                if all(row.get(col) in values for col, values in tests)]
+
+    def execute(self, sql: str, params: tuple | None, round_trip: bool = True) -> list[dict]:
+        if round_trip and self.latency:
+            time.sleep(self.latency)
+        sql = ' '.join(sql.split())
+        params = list(params or ())
+        with self.lock:
+            self.statements += 1
+            if 'web_migrations' in sql:
+                return [{'1': 1}] if self.migrated else []
+            if sql.startswith('SHOW GLOBAL STATUS'):
+                return [{'Variable_name': 'Threads_running', 'Value': str(self.threads_running)}]
+
+            m = _SELECT_RE.match(sql)
+            if m:
+                cols, table, where, order = m.groups()
+                rows = [row for _, _, row in self._matching(table, where, params)]
+                if order:
+                    keys = [c.strip() for c in order.split(',')]
+                    rows.sort(key=lambda r: tuple(r[k] for k in keys))
+                if cols.strip() == '*':
+                    return [dict(r) for r in rows]
+                names = [c.strip() for c in cols.split(',')]
+                return [{c: r.get(c) for c in names} for r in rows]
+
+            m = _DELETE_RE.match(sql)
+            if m:
+                table, where = m.groups()
+                for bucket, key, _ in self._matching(table, where, params):
+                    del bucket[key]
+                return []
+
+            m = _INSERT_RE.match(sql)
+            if m:
+                table, cols = m.groups()
+                names = [c.strip() for c in cols.split(',')]
+                row = dict(zip(names, params))
+                update = set(names) - set(_KEYS[table]) if 'ON DUPLICATE KEY UPDATE' in sql else set()
+                self._upsert(table, row, update)
+                return []
+        raise NotImplementedError(f'fake DB cannot run {sql[:80]!r}')
+
+
+class FakeCursor:
+    def __init__(self, db: FakeDatabase) -> None:
+        self._db = db
+        self._rows: list[dict] = []
+        self.rowcount = 0
+
+    def __enter__(self) -> 'FakeCursor':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+    def execute(self, sql: str, params: tuple | None = None) -> int:
+        self._rows = self._db.execute(sql, params)
+        self.rowcount = len(self._rows)
+        return self.rowcount
+
+    def executemany(self, sql: str, seq) -> int:
+        # One round trip, like PyMySQL's multi-row INSERT.
+        if self._db.latency:
+            time.sleep(self._db.latency)
+        for params in seq:
+            self._db.execute(sql, params, round_trip=False)
+        return 0
+
+    def fetchall(self) -> list[dict]:
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchone(self) -> dict | None:
+        return self._rows.pop(0) if self._rows else None
+
+
+class FakeConnection:
+    open = True
+
+    def __init__(self, db: FakeDatabase) -> None:
+        self._db = db
+
+    def cursor(self) -> FakeCursor:
+        return FakeCursor(self._db)
+
+    def commit(self) -> None:
+        if self._db.latency:
+            time.sleep(self._db.latency)
+
+    def rollback(self) -> None:
+        pass
+
+
+class FakePool:
+    """Drop-in for app.db.ConnectionPool handing out FakeConnections."""
+
+    def __init__(self, db: FakeDatabase) -> None:
+        self._db = db
+        self._checkouts = 0
+
+    def acquire(self) -> FakeConnection:
+        self._checkouts += 1
+        return FakeConnection(self._db)
+
+    def release(self, conn: FakeConnection) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {'checkouts': self._checkouts, 'statements': self._db.statements}
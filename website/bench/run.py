@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""
+Benchmark the API end to end without network access.
+Run from the app root:
+    venv/bin/python -m bench.run [--scenarios catalog,profile,save] [--concurrency 8]
+                                 [--duration 10] [--server werkzeug|gunicorn] [--json]
+
+Starts a local stand-in for bymykel and Steam (bench/standins.py), swaps the
+MySQL pools for an in-memory fake seeded with player loadouts
+(bench/fakedb.py), builds the app with create_app() and serves it from a
+child process. Each scenario is then driven over keep-alive HTTP connections
+at the given concurrency, after a short warm-up, and reported as p50/p95/p99
+latency, requests per second and the server's resident memory. Numbers are
+relative: compare runs on the same machine and settings. Under --server
+gunicorn every worker builds its own app and fake tables (bench/wsgi.py).
+
+To compare worker models under slow upstreams, give several worker classes:
+    venv/bin/python -m bench.run --server gunicorn --worker-class sync,gevent \
+        --upstream-latency 500 --concurrency 32 --scenarios auth_callback,mixed
+The suite runs once per class and a throughput table is printed at the end.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import random
+import signal
+import socket
+import argparse
+import tempfile
+import subprocess
+import threading
+import http.client
+import multiprocessing
+from typing import Callable, NamedTuple
+from urllib.parse import urlencode
+
+from .fakedb import FakeDatabase, FakePool
+from .standins import Upstream
+
+
+class Request(NamedTuple):
+    method: str
+    path: str
+    headers: dict
+    body: bytes | None = None
+    # Responses' ETags are remembered under this key and sent back as If-None-Match.
+    etag_key: str | None = None
+
+
+# ── Environment and app ───────────────────────────────────────────────────────
+
+def _configure_env(workdir: str, args) -> None:
+    """Config for create_app(); set before config.py is imported."""
+    os.environ.update({
+        'SECRET_KEY': 'bench-secret',
+        'DB_NAME': 'bench', 'DB_USER': 'bench', 'DB_PASS': 'bench',
+        'STEAM_API_KEY': 'bench-key',
+        'BASE_URL': 'http://127.0.0.1',
+        'CATALOG_CACHE_DIR': os.path.join(workdir, 'cache'),
+        'SHARED_STATE_PATH': os.path.join(workdir, 'state.db'),
+        'SKIN_WRITE_BEHIND': 'true' if args.write_behind else 'false',
+        # The load generator would otherwise mostly measure 429s.
+        'RATE_LIMITS': '' if args.rate_limits else 'off',
+    })
+
+
+def _build_app(upstream_url: str, fake: FakeDatabase):
+    from app import auth, cache, create_app, db, steam
+
+    cache._BYMYKEL = upstream_url
+    auth._STEAM_OPENID_URL = f'{upstream_url}/openid/login'
+    steam._STEAM_API = upstream_url
+    pool = FakePool(fake)
+    db._get_pool = lambda role=db.PRIMARY: pool
+    return create_app()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _serve_werkzeug(app, port: int) -> None:
+    """Child process: serve app until terminated."""
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+
+
+def _start_server(app, port: int, args, worker_class: str):
+    """Start the server in a child process; returns it (Process or Popen)."""
+    if args.server == 'werkzeug':
+        server = multiprocessing.get_context('fork').Process(target=_serve_werkzeug, args=(app, port), daemon=True)
+        server.start()
+        return server
+    # A fresh interpreter, so the gevent worker patches before anything is imported.
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn',
+         '--bind', f'127.0.0.1:{port}',
+         '--workers', str(args.workers),
+         '--worker-class', worker_class,
+         '--worker-connections', str(args.worker_connections),
+         '--log-level', 'warning',
+         'bench.wsgi:app'],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        # gunicorn.conf.py decides on preloading from the worker class.
+        env=dict(os.environ, GUNICORN_WORKER_CLASS=worker_class),
+    )
+
+
+def _stop_server(server) -> None:
+    os.kill(server.pid, signal.SIGTERM)
+    if isinstance(server, subprocess.Popen):
+        server.wait(timeout=30)
+    else:
+        server.join(timeout=30)
+
+
+def _wait_ready(port: int, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/health')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'server on port {port} did not come up within {timeout}s')
+
+
+# ── Memory ────────────────────────────────────────────────────────────────────
+
+def _process_tree(pid: int) -> list[int]:
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            for child in f.read().split():
+                pids.extend(_process_tree(int(child)))
+    except OSError:
+        pass
+    return pids
+
+
+def _memory(pid: int) -> dict[str, float]:
+    """Resident and peak resident memory (MB) summed over pid and its children."""
+    out = {'rss_mb': 0.0, 'peak_rss_mb': 0.0}
+    for p in _process_tree(pid):
+        try:
+            with open(f'/proc/{p}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        out['rss_mb'] += int(line.split()[1]) / 1024
+                    elif line.startswith('VmHWM:'):
+                        out['peak_rss_mb'] += int(line.split()[1]) / 1024
+        except OSError:
+            pass
+    return {k: round(v, 1) for k, v in out.items()}
+
+
+# ── Scenarios ─────────────────────────────────────────────────────────────────
+
+_SEARCH_TERMS = ['ak', 'awp', 'asii', 'fade', 'dopp', 'karambit', 'glock red', 'm4a1 hyp', 'sticker', 'dragon']
+
+
+def _scenarios(app, steamids: list[str]) -> dict[str, Callable[[random.Random], Request]]:
+    from app.catalog_index import WEAPON_DEFINDEX
+
+    serializer = app.session_interface.get_signing_serializer(app)
+    cookie_name = app.config['SESSION_COOKIE_NAME']
+    cookies = {sid: f'{cookie_name}={serializer.dumps({"steamid": sid, "_permanent": True})}'
+               for sid in steamids}
+    defindexes = sorted(set(WEAPON_DEFINDEX.values()))
+    gzip = {'Accept-Encoding': 'gzip, br'}
+    json_headers = {'Content-Type': 'application/json'}
+
+    def player(rng: random.Random) -> tuple[str, dict]:
+        sid = rng.choice(steamids)
+        return sid, {'Cookie': cookies[sid]}
+
+    def skin(rng: random.Random, defindex: int | None = None) -> dict:
+        return {
+            'weapon_defindex': defindex or rng.choice(defindexes),
+            'weapon_team': rng.choice((0, 2, 3)),
+            'weapon_paint_id': rng.randint(1, 1200),
+            'weapon_wear': round(rng.random(), 4),
+            'weapon_seed': rng.randint(0, 1000),
+            'weapon_sticker_0': rng.randint(0, 5000),
+        }
+
+    def catalog(rng):
+        return Request('GET', '/api/catalog/skins', gzip)
+
+    def catalog_query(rng):
+        return Request('GET', f'/api/catalog/skins?weapon_defindex={rng.choice(defindexes)}&limit=50', gzip)
+
+    def search(rng):
+        return Request('GET', '/api/catalog/search?' + urlencode({'q': rng.choice(_SEARCH_TERMS)}), gzip)
+
+    def profile(rng):
+        _, headers = player(rng)
+        return Request('GET', '/api/player/profile', headers)
+
+    def profile_revalidate(rng):
+        sid, headers = player(rng)
+        return Request('GET', '/api/player/profile', headers, etag_key=sid)
+
+    def save(rng):
+        _, headers = player(rng)
+        return Request('PUT', '/api/player/skins', {**headers, **json_headers},
+                       json.dumps(skin(rng)).encode())
+
+    def loadout(rng):
+        _, headers = player(rng)
+        body = {
+            'skins': [skin(rng, d) for d in rng.sample(defindexes, 10)],
+            'knives': [{'weapon_team': 2, 'knife': 'weapon_knife_butterfly'}],
+            'gloves': [{'weapon_team': 3, 'weapon_defindex': 5027}],
+            'agents': {'agent_t': 'tm_phoenix/tm_phoenix_varianth'},
+        }
+        return Request('PUT', '/api/player/loadout', {**headers, **json_headers}, json.dumps(body).encode())
+
+    def auth_callback(rng):
+        sid = rng.choice(steamids)
+        query = urlencode({
+            'openid.ns': 'http://specs.openid.net/auth/2.0',
+            'openid.mode': 'id_res',
+            'openid.claimed_id': f'https://steamcommunity.com/openid/id/{sid}',
+            'openid.identity': f'https://steamcommunity.com/openid/id/{sid}',
+        })
+        return Request('GET', f'/auth/steam/callback?{query}', {})
+
+    def auth_me(rng):
+        _, headers = player(rng)
+        return Request('GET', '/auth/me', headers)
+
+    def mixed(rng):
+        # Logins (one Steam round trip each) among ordinary profile reads.
+        return auth_callback(rng) if rng.random() < 0.25 else profile(rng)
+
+    return {
+        'catalog': catalog,
+        'catalog_query': catalog_query,
+        'search': search,
+        'profile': profile,
+        'profile_revalidate': profile_revalidate,
+        'save': save,
+        'loadout': loadout,
+        'auth_callback': auth_callback,
+        'auth_me': auth_me,
+        'mixed': mixed,
+    }
+
+
+# ── Load generation ───────────────────────────────────────────────────────────
+
+_OK_STATUSES = {200, 302, 304}
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def _drive(port: int, build: Callable[[random.Random], Request], concurrency: int,
+           duration: float, seed: int) -> dict:
+    """Run build() requests from concurrency threads for duration seconds."""
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def worker(n: int) -> None:
+        rng = random.Random(seed * 1000 + n)
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        etags: dict[str, str] = {}
+        local_lat, local_status, local_err = [], {}, 0
+        while time.perf_counter() < stop_at:
+            req = build(rng)
+            headers = dict(req.headers)
+            if req.etag_key and req.etag_key in etags:
+                headers['If-None-Match'] = etags[req.etag_key]
+            started = time.perf_counter()
+            try:
+                conn.request(req.method, req.path, body=req.body, headers=headers)
+                resp = conn.getresponse()
+                resp.read()
+            except (OSError, http.client.HTTPException):
+                local_err += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            local_lat.append(time.perf_counter() - started)
+            local_status[resp.status] = local_status.get(resp.status, 0) + 1
+            if resp.status not in _OK_STATUSES:
+                local_err += 1
+            if req.etag_key and resp.getheader('ETag'):
+                etags[req.etag_key] = resp.getheader('ETag')
+        conn.close()
+        with lock:
+            latencies.extend(local_lat)
+            for status, count in local_status.items():
+                statuses[status] = statuses.get(status, 0) + count
+            errors[0] += local_err
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'statuses': {str(k): v for k, v in sorted(statuses.items())},
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(_percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(_percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(_percentile(latencies, 99) * 1000, 2),
+        'max_ms': round((latencies[-1] if latencies else 0.0) * 1000, 2),
+    }
+
+
+# ── Entry point ───────────────────────────────────────────────────────────────
+
+def _run_suite(app, scenarios: dict, names: list[str], args, worker_class: str) -> dict:
+    """Serve app with worker_class and drive every named scenario against it."""
+    port = _free_port()
+    server = _start_server(app, port, args, worker_class)
+    results: dict = {}
+    try:
+        _wait_ready(port)
+        memory_start = _memory(server.pid)
+        for name in names:
+            if args.warmup:
+                _drive(port, scenarios[name], args.concurrency, args.warmup, args.seed)
+            results[name] = _drive(port, scenarios[name], args.concurrency, args.duration, args.seed)
+            results[name]['memory'] = _memory(server.pid)
+            if not args.json:
+                r = results[name]
+                print(f'{name:<20} {r["requests"]:>7} req {r["errors"]:>5} err {r["rps"]:>9.1f} rps  '
+                      f'p50 {r["p50_ms"]:>8.2f}  p95 {r["p95_ms"]:>8.2f}  p99 {r["p99_ms"]:>8.2f} ms  '
+                      f'rss {r["memory"]["rss_mb"]:>7.1f} MB', flush=True)
+        memory_end = _memory(server.pid)
+    finally:
+        _stop_server(server)
+    if not args.json:
+        print(f'server memory: {memory_start["rss_mb"]} MB at start, {memory_end["rss_mb"]} MB at end, '
+              f'{memory_end["peak_rss_mb"]} MB peak')
+    return {'memory': {'start': memory_start, 'end': memory_end}, 'scenarios': results}
+
+
+def _print_comparison(runs: dict[str, dict], names: list[str]) -> None:
+    classes = list(runs)
+    print('\nrps by worker class' + ''.join(f'{c:>12}' for c in classes) + f'{"x " + classes[0]:>12}')
+    for name in names:
+        rps = [runs[c]['scenarios'][name]['rps'] for c in classes]
+        ratio = rps[-1] / rps[0] if rps[0] else 0.0
+        print(f'{name:<19}' + ''.join(f'{r:>12.1f}' for r in rps) + f'{ratio:>11.1f}x')
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scenarios', default='catalog,catalog_query,search,profile,'
+                        'profile_revalidate,save,loadout,auth_callback,auth_me',
+                        help='comma-separated scenario names')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per scenario')
+    parser.add_argument('--warmup', type=float, default=1.0, help='seconds per scenario, not measured')
+    parser.add_argument('--players', type=int, default=2000, help='seeded players')
+    parser.add_argument('--db-latency', type=float, default=0.0, help='ms added to every DB round trip')
+    parser.add_argument('--upstream-latency', type=float, default=0.0,
+                        help='ms added to every bymykel/Steam stand-in response')
+    parser.add_argument('--server', choices=('werkzeug', 'gunicorn'), default='werkzeug')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers')
+    parser.add_argument('--worker-class', default='sync',
+                        help='gunicorn worker class; comma-separated to compare several (e.g. sync,gevent)')
+    parser.add_argument('--worker-connections', type=int, default=200,
+                        help='concurrent requests per gevent worker')
+    parser.add_argument('--write-behind', action='store_true', help='enable SKIN_WRITE_BEHIND')
+    parser.add_argument('--rate-limits', action='store_true', help='keep the default write rate limits')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+    worker_classes = [c.strip() for c in args.worker_class.split(',') if c.strip()]
+    if args.server == 'werkzeug' and len(worker_classes) > 1:
+        parser.error('--worker-class only applies to --server gunicorn')
+
+    upstream = Upstream(latency=args.upstream_latency / 1000).start()
+    fake = FakeDatabase(latency=args.db_latency / 1000)
+    steamids = fake.seed(args.players)
+
+    with tempfile.TemporaryDirectory(prefix='cs2-bench-') as workdir:
+        _configure_env(workdir, args)
+        os.environ.update({
+            'BENCH_UPSTREAM_URL': upstream.url,
+            'BENCH_DB_LATENCY': str(args.db_latency / 1000),
+            'BENCH_PLAYERS': str(args.players),
+        })
+        app = _build_app(upstream.url, fake)
+        scenarios = _scenarios(app, steamids)
+        names = [n.strip() for n in args.scenarios.split(',') if n.strip()]
+        unknown = [n for n in names if n not in scenarios]
+        if unknown:
+            parser.error(f'unknown scenario(s): {", ".join(unknown)}; choose from {", ".join(scenarios)}')
+
+        runs: dict[str, dict] = {}
+        try:
+            for worker_class in worker_classes:
+                if not args.json and len(worker_classes) > 1:
+                    print(f'── {worker_class} ──', flush=True)
+                runs[worker_class] = _run_suite(app, scenarios, names, args, worker_class)
+        finally:
+            upstream.stop()
+
+    settings = {k: v for k, v in vars(args).items() if k != 'json'}
+    if len(runs) == 1:
+        summary = {'settings': settings, **next(iter(runs.values())), 'upstream_hits': upstream.hits}
+    else:
+        summary = {'settings': settings, 'runs': runs, 'upstream_hits': upstream.hits}
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    elif len(runs) > 1:
+        _print_comparison(runs, names)
+    return 1 if any(r['errors'] for run in runs.values() for r in run['scenarios'].values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""Local HTTP stand-in for bymykel's catalog API and the Steam endpoints.
+
+Serves generated catalogs shaped and sized like bymykel's (skins, stickers,
+agents), Steam's OpenID check_authentication and GetPlayerSummaries, so the
+benchmark never touches the network. An optional fixed latency is added to
+every response to model a slow upstream.
+"""
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from app.catalog_index import GLOVES_CATEGORY, WEAPON_DEFINDEX
+
+_RARITIES = ['rarity_common_weapon', 'rarity_uncommon_weapon', 'rarity_rare_weapon',
+             'rarity_mythical_weapon', 'rarity_legendary_weapon', 'rarity_ancient_weapon']
+_GLOVES = {'studded_bloodhound_gloves', 'studded_brokenfang_gloves', 'weapon_handwrap'}
+_WORDS = ['Asiimov', 'Redline', 'Hyper', 'Beast', 'Fade', 'Doppler', 'Tiger', 'Tooth', 'Slaughter',
+          'Vulcan', 'Neon', 'Rider', 'Case', 'Hardened', 'Blue', 'Gamma', 'Printstream', 'Dragon',
+          'Lore', 'Howl', 'Fire', 'Serpent', 'Wildfire', 'Phantom', 'Disruptor', 'Safari', 'Mesh']
+
+
+def _name(rng: random.Random) -> str:
+    return ' '.join(rng.sample(_WORDS, rng.randint(1, 3)))
+
+
+def skins(count: int = 2000, seed: int = 1) -> list[dict]:
+    rng = random.Random(seed)
+    weapons = [w for w in WEAPON_DEFINDEX if not w.endswith('_ct')]
+    out = []
+    for i in range(count):
+        weapon = rng.choice(weapons)
+        if weapon.startswith('weapon_knife'):
+            category = 'sfui_invpanel_filter_melee'
+        elif weapon in _GLOVES:
+            category = GLOVES_CATEGORY
+        else:
+            category = 'csgo_inventory_weapon_category_weapons'
+        pattern = _name(rng)
+        out.append({
+            'id': f'skin-{weapon}-{i}',
+            'name': f'{weapon.removeprefix("weapon_").upper()} | {pattern}',
+            'description': 'A custom paint job. ' * rng.randint(2, 8),
+            'weapon': {'id': weapon, 'weapon_id': WEAPON_DEFINDEX[weapon], 'name': weapon},
+            'category': {'id': category, 'name': category},
+            'pattern': {'id': f'pattern-{i}', 'name': pattern},
+            'min_float': 0.0,
+            'max_float': round(rng.uniform(0.5, 1.0), 2),
+            'rarity': {'id': rng.choice(_RARITIES), 'name': 'Rarity', 'color': '#4b69ff'},
+            'stattrak': rng.random() < 0.6,
+            'souvenir': rng.random() < 0.1,
+            'paint_index': str(i + 1),
+            'wears': [{'id': f'SFUI_InvTooltip_Wear_Amount_{w}', 'name': 'Wear'} for w in range(5)],
+            'collections': [{'id': f'collection-{rng.randint(1, 80)}', 'name': 'Collection', 'image': ''}],
+            'crates': [{'id': f'crate-{rng.randint(1, 120)}', 'name': 'Case', 'image': ''}],
+            'team': {'id': 'both', 'name': 'Both Teams'},
+            'image': f'https://img.example/skins/{i}.png',
+        })
+    return out
+
+
+def stickers(count: int = 8000, seed: int = 2) -> list[dict]:
+    rng = random.Random(seed)
+    return [{
+        'id': f'sticker-{i}',
+        'name': f'Sticker | {_name(rng)}',
+        'description': 'Sticker. ' * rng.randint(1, 4),
+        'rarity': {'id': rng.choice(_RARITIES), 'name': 'Rarity', 'color': '#8847ff'},
+        'crates': [{'id': f'crate-{rng.randint(1, 120)}', 'name': 'Capsule', 'image': ''}],
+        'tournament_event': 'Major' if rng.random() < 0.3 else None,
+        'type': 'Event' if rng.random() < 0.3 else 'Other',
+        'effect': rng.choice(['Other', 'Holo', 'Foil', 'Glitter']),
+        'image': f'https://img.example/stickers/{i}.png',
+    } for i in range(count)]
+
+
+def agents(count: int = 60, seed: int = 3) -> list[dict]:
+    rng = random.Random(seed)
+    return [{
+        'id': f'agent-{i}',
+        'name': f'{_name(rng)} | Agent',
+        'description': 'Agent. ' * 3,
+        'rarity': {'id': rng.choice(_RARITIES), 'name': 'Rarity', 'color': '#d32ce6'},
+        'team': {'id': 'terrorists' if i % 2 else 'counter-terrorists', 'name': 'Team'},
+        'model_player': f'characters/models/agent_{i}/agent_{i}_variant.vmdl',
+        'image': f'https://img.example/agents/{i}.png',
+    } for i in range(count)]
+
+
+class Upstream:
+    """A threaded HTTP server on 127.0.0.1 standing in for bymykel and Steam."""
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.hits: dict[str, int] = {}
+        self._files = {
+            '/skins.json': json.dumps(skins()).encode(),
+            '/stickers.json': json.dumps(stickers()).encode(),
+            '/agents.json': json.dumps(agents()).encode(),
+        }
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self._server.server_address[1]}'
+
+    def _handler(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; with Nagle on, a reused
+            # keep-alive connection would stall each response on a delayed ACK.
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str = 'application/json') -> None:
+                if upstream.latency:
+                    time.sleep(upstream.latency)
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self) -> None:
+                url = urlparse(self.path)
+                upstream.hits[url.path] = upstream.hits.get(url.path, 0) + 1
+                if url.path in upstream._files:
+                    self._send(200, upstream._files[url.path])
+                elif url.path == '/ISteamUser/GetPlayerSummaries/v2/':
+                    ids = parse_qs(url.query).get('steamids', [''])[0].split(',')
+                    players = [{
+                        'steamid': sid,
+                        'personaname': f'player-{sid[-4:]}',
+                        'avatarfull': f'https://avatars.example/{sid}.jpg',
+                    } for sid in ids if sid]
+                    self._send(200, json.dumps({'response': {'players': players}}).encode())
+                else:
+                    self._send(404, b'{}')
+
+            def do_POST(self) -> None:
+                url = urlparse(self.path)
+                upstream.hits[url.path] = upstream.hits.get(url.path, 0) + 1
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                if url.path == '/openid/login':
+                    self._send(200, b'ns:http://specs.openid.net/auth/2.0\nis_valid:true\n', 'text/plain')
+                else:
+                    self._send(404, b'{}')
+
+        return Handler
+
+    def start(self) -> 'Upstream':
+        threading.Thread(target=self._server.serve_forever, name='bench-upstream', daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
@@ -0,0 +1,15 @@
+"""WSGI entry point for `run.py --server gunicorn`.
+
+Gunicorn imports this in each worker (after the gevent worker has
+monkey-patched), so the app and the fake tables are built the way
+production builds them. The settings come from the BENCH_* variables
+run.py sets.
+"""
+import os
+
+from .fakedb import FakeDatabase
+from .run import _build_app
+
+_fake = FakeDatabase(latency=float(os.environ['BENCH_DB_LATENCY']))
+_fake.seed(int(os.environ['BENCH_PLAYERS']))
+app = _build_app(os.environ['BENCH_UPSTREAM_URL'], _fake)
@@ -18,10 +18,62 @@ class Config:
     DB_NAME: str = os.environ['DB_NAME']
     DB_USER: str = os.environ['DB_USER']
     DB_PASS: str = os.environ['DB_PASS']
+    # Per-worker connection pool
+    DB_POOL_SIZE: int = int(os.getenv('DB_POOL_SIZE', '4'))
+    DB_POOL_TIMEOUT: float = float(os.getenv('DB_POOL_TIMEOUT', '5'))         # wait for a free connection
+    DB_POOL_MAX_AGE: float = float(os.getenv('DB_POOL_MAX_AGE', '1800'))      # recycle after 30min
+    DB_POOL_PING_AFTER: float = float(os.getenv('DB_POOL_PING_AFTER', '30'))  # ping if idle longer
+    # Optional read replica for GETs (empty = all traffic on DB_HOST); user/pass default to the primary's
+    DB_READ_HOST: str = os.getenv('DB_READ_HOST', '')
+    DB_READ_PORT: int = int(os.getenv('DB_READ_PORT', os.getenv('DB_PORT', '3306')))
+    DB_READ_USER: str = os.getenv('DB_READ_USER', '')
+    DB_READ_PASS: str = os.getenv('DB_READ_PASS', '')
+    DB_READ_POOL_SIZE: int = int(os.getenv('DB_READ_POOL_SIZE', '4'))
+    DB_STICKY_SECONDS: float = float(os.getenv('DB_STICKY_SECONDS', '5'))     # reads on primary after a write
+    # Statements at least this slow are logged to app.db.slow
+    DB_SLOW_QUERY_MS: float = float(os.getenv('DB_SLOW_QUERY_MS', '200'))
+    # A primary statement this slow (or a pool timeout) sheds rate-limited writes for DB_SHED_SECONDS
+    DB_SHED_QUERY_MS: float = float(os.getenv('DB_SHED_QUERY_MS', '1000'))
+    DB_SHED_SECONDS: float = float(os.getenv('DB_SHED_SECONDS', '2'))
+    # ...as does the primary's Threads_running reaching this (0 disables), sampled at
+    # most once per DB_SHED_SAMPLE_SECONDS across all workers
+    DB_SHED_THREADS_RUNNING: int = int(os.getenv('DB_SHED_THREADS_RUNNING', '32'))
+    DB_SHED_SAMPLE_SECONDS: float = float(os.getenv('DB_SHED_SAMPLE_SECONDS', '1'))
 
     # Steam
     STEAM_API_KEY: str = os.environ['STEAM_API_KEY']
     BASE_URL: str = os.getenv('BASE_URL', 'http://16.24.36.253')
+    # Steam profile (name/avatar) cache: refreshed in the background once older than
+    # STEAM_PROFILE_TTL, dropped after STEAM_PROFILE_MAX_AGE; refreshes are batched
+    # after waiting STEAM_BATCH_DELAY for more logins
+    STEAM_PROFILE_TTL: int = int(os.getenv('STEAM_PROFILE_TTL', '3600'))
+    STEAM_PROFILE_MAX_AGE: int = int(os.getenv('STEAM_PROFILE_MAX_AGE', '604800'))
+    STEAM_PROFILE_CACHE_MAX: int = int(os.getenv('STEAM_PROFILE_CACHE_MAX', '20000'))
+    STEAM_BATCH_DELAY: float = float(os.getenv('STEAM_BATCH_DELAY', '0.2'))
 
     # Skin catalog cache TTL in seconds
     SKIN_CACHE_TTL: int = int(os.getenv('SKIN_CACHE_TTL', '3600'))
+    # Directory for the catalog snapshot shared by all Gunicorn workers
+    CATALOG_CACHE_DIR: str = os.getenv('CATALOG_CACHE_DIR', '/var/www/cs2-skins/cache')
+    # Load the snapshots synchronously at app creation (set by gunicorn.conf.py when
+    # the app is preloaded, so workers share the parsed catalogs copy-on-write)
+    CATALOG_PRELOAD: bool = os.getenv('CATALOG_PRELOAD', 'false').lower() == 'true'
+
+    # Seconds between each worker's metrics snapshot for /metrics
+    METRICS_PUBLISH_INTERVAL: float = float(os.getenv('METRICS_PUBLISH_INTERVAL', '5'))
+
+    # Write rate limits (app/ratelimit.py): 'endpoint=rate/burst,...' overrides the
+    # defaults ('endpoint=off' lifts one, 'off' disables all); global bucket as 'rate/burst'
+    RATE_LIMITS: str = os.getenv('RATE_LIMITS', '')
+    RATE_LIMIT_GLOBAL: str = os.getenv('RATE_LIMIT_GLOBAL', '100/200')
+
+    # SQLite file for state shared by all Gunicorn workers (tmpfs runtime dir; cache only)
+    SHARED_STATE_PATH: str = os.getenv('SHARED_STATE_PATH', '/run/cs2-skins/state.db')
+    # Per-player profile cache
+    PROFILE_CACHE_TTL: int = int(os.getenv('PROFILE_CACHE_TTL', '600'))
+    PROFILE_CACHE_MAX: int = int(os.getenv('PROFILE_CACHE_MAX', '5000'))
+    # Write-behind for PUT /api/player/skins: acknowledge at once, coalesce per
+    # (steamid, team, defindex), flush to MySQL once a key is quiet for WRITE_BEHIND_DELAY
+    SKIN_WRITE_BEHIND: bool = os.getenv('SKIN_WRITE_BEHIND', 'false').lower() == 'true'
+    WRITE_BEHIND_DELAY: float = float(os.getenv('WRITE_BEHIND_DELAY', '0.5'))
+    WRITE_BEHIND_MAX_PENDING: int = int(os.getenv('WRITE_BEHIND_MAX_PENDING', '2000'))
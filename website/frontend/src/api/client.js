@@ -12,6 +12,9 @@ async function request(method, path, body) {
   if (!res.ok) {
     const err = new Error(data.error || `HTTP ${res.status}`)
     err.status = res.status
+    // 429/503: seconds the server asks us to wait before retrying
+    const retryAfter = Number(res.headers.get('Retry-After'))
+    if (retryAfter) err.retryAfter = retryAfter
     throw err
   }
   return data
@@ -28,9 +31,32 @@ export const api = {
   getGlovesCatalog:   () => request('GET', '/api/catalog/gloves'),
   getAgentsCatalog:   () => request('GET', '/api/catalog/agents'),
   getStickersCatalog: () => request('GET', '/api/catalog/stickers'),
+  // Server-side filtered page: { weapon_defindex, rarity, category,
+  // paint_index_min, paint_index_max, fields: [...], limit, cursor }
+  querySkinsCatalog: (params = {}) => {
+    const qs = new URLSearchParams()
+    for (const [k, v] of Object.entries(params)) {
+      if (v === undefined || v === null || v === '') continue
+      qs.set(k, Array.isArray(v) ? v.join(',') : v)
+    }
+    return request('GET', `/api/catalog/skins?${qs}`)
+  },
+  // Ranked type-ahead search; types: any of ['skins', 'stickers', 'agents']
+  searchCatalog: (q, { types, limit } = {}) => {
+    const qs = new URLSearchParams({ q })
+    if (types) qs.set('type', types.join(','))
+    if (limit) qs.set('limit', limit)
+    return request('GET', `/api/catalog/search?${qs}`)
+  },
 
   // Player profile
   getProfile: () => request('GET', '/api/player/profile'),
+  // { skins, knives, gloves, agents } — saved together in one transaction
+  saveLoadout: (data) => request('PUT', '/api/player/loadout', data),
+  // { version, code, counts } — a shareable code for the whole loadout
+  exportLoadout: () => request('GET', '/api/player/loadout/export'),
+  // replace=true clears existing selections first (exact restore)
+  importLoadout: (code, replace = false) => request('POST', '/api/player/loadout/import', { code, replace }),
 
   // Skins
   saveSkin:   (data) => request('PUT',    '/api/player/skins', data),
@@ -0,0 +1,38 @@
+"""Gunicorn settings for cs2-skins.service; worker model from .env.
+
+GUNICORN_WORKER_CLASS=sync (default) gives each worker one request at a
+time, so a few requests stuck on Steam or bymykel can occupy every worker.
+GUNICORN_WORKER_CLASS=gevent serves up to GUNICORN_WORKER_CONNECTIONS
+requests per worker as greenlets: while one waits on Steam, bymykel or
+MySQL, the others keep running (see app/cooperative.py). With gevent, raise
+DB_POOL_SIZE so concurrent requests are not all queued on four connections.
+
+Sync workers are forked from a preloaded app (GUNICORN_PRELOAD, on by
+default): the master parses the catalog snapshots once (CATALOG_PRELOAD,
+see app/cache.py) and freezes them out of the garbage collector, so the
+workers share those pages copy-on-write instead of each building its own
+copy. The gevent worker is never preloaded — it has to monkey-patch before
+the app creates its locks.
+"""
+import gc
+import os
+from dotenv import load_dotenv
+
+load_dotenv('/var/www/cs2-skins/.env')
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '200'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+
+preload_app = worker_class == 'sync' and os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+if preload_app:
+    # Read by config.py when the app is imported, in the master.
+    os.environ['CATALOG_PRELOAD'] = 'true'
+
+
+def when_ready(server):
+    """Master, after the preload and before the first fork."""
+    if preload_app:
+        # Keep the collector from touching (and so un-sharing) the preloaded objects.
+        gc.freeze()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Normalize legacy skin rows and verify the indexes the website's queries use.
+Run from the app root (safe to re-run):
+    venv/bin/python migrate_db.py [--dry-run] [--json]
+
+Rewrites weapon_team 0/1 rows in wp_player_skins as team 2/3 rows in one
+transaction and records the normalize_legacy_teams marker, after which the
+save/delete handlers skip their per-request legacy cleanup. Adds any missing
+steamid-leading index from app.schema.INDEXES, then EXPLAINs each query to
+confirm it is served by an index. Exits non-zero if a query still scans.
+"""
+import sys
+import json
+import argparse
+
+from flask import Flask
+
+from app import schema
+from app.db import close_db, get_db
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dry-run', action='store_true',
+                        help='report what would change without writing anything')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config.from_object('config.Config')
+    result: dict = {}
+
+    with app.app_context():
+        db = get_db()
+        try:
+            with db.cursor() as cur:
+                result['already_applied'] = schema.is_applied(cur, schema.LEGACY_TEAMS)
+                if args.dry_run:
+                    cur.execute(
+                        'SELECT weapon_team, COUNT(*) AS n FROM wp_player_skins '
+                        'WHERE weapon_team IN (0, 1) GROUP BY weapon_team'
+                    )
+                    result['legacy_rows'] = {f'team{r["weapon_team"]}': r['n'] for r in cur.fetchall()}
+                else:
+                    schema.ensure_migrations_table(cur)
+                    counts = schema.normalize_legacy_teams(cur)
+                    schema.mark_applied(cur, schema.LEGACY_TEAMS,
+                                        ', '.join(f'{k}={v}' for k, v in counts.items()))
+                    db.commit()
+                    result['legacy_rows'] = counts
+
+                # ALTER TABLE commits implicitly, so indexes go after the data change.
+                result['indexes'] = schema.ensure_indexes(cur, dry_run=args.dry_run)
+                result['explain'] = schema.explain_queries(cur)
+        except Exception as exc:
+            db.rollback()
+            print(f'Migration failed: {exc}', file=sys.stderr)
+            return 1
+        finally:
+            close_db()
+
+    ok = all(e['ok'] for e in result['explain'])
+    if args.json:
+        print(json.dumps({'ok': ok, 'dry_run': args.dry_run, **result}))
+    else:
+        state = 'already applied' if result['already_applied'] else 'not applied before'
+        print(f'Legacy team rows ({state}):')
+        for key, n in result['legacy_rows'].items():
+            print(f'  {key:<22} {n}')
+        print('Indexes:')
+        for r in result['indexes']:
+            print(f'  {r["table"]:<18} ({", ".join(r["columns"])}) → {r["index"] or "-"} [{r["action"]}]')
+        print('EXPLAIN:')
+        for e in result['explain']:
+            print(f'  {"ok " if e["ok"] else "SCAN"} {e["table"]:<18} type={e["access"]} key={e["key"]}')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
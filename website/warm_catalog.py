@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Prebuild the skin catalog so cs2-skins starts fully warm.
+Run from the app root as www-data after a deploy:
+    sudo -u www-data venv/bin/python warm_catalog.py [--json]
+
+Revalidates every bymykel catalog into CATALOG_CACHE_DIR, then builds the
+skins model, the serialized/compressed catalog payloads and the search
+indexes, writing the compressed payloads next to the snapshots for the
+workers to pick up. Prints the time spent in each stage; exits non-zero if
+any stage fails.
+"""
+import sys
+import json
+import time
+import argparse
+
+from flask import Flask
+
+from app import cache
+from app.api import catalog
+
+# Compressed payloads untouched for this long are deleted.
+ARTIFACT_MAX_AGE = 7 * 86400
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--json', action='store_true', help='print timings as JSON')
+    args = parser.parse_args()
+
+    # Only the config is needed; skip create_app() so no boot-time warm
+    # thread races the stages being timed here.
+    app = Flask(__name__)
+    app.config.from_object('config.Config')
+    cache.init_app(app, warm=False)
+    ttl = app.config['SKIN_CACHE_TTL']
+    timings: list[tuple[str, float]] = []
+
+    def report(stage: str, seconds: float) -> None:
+        timings.append((stage, seconds))
+        if not args.json:
+            print(f'  {stage:<22} {seconds * 1000:9.1f} ms')
+
+    failed = False
+    started = time.perf_counter()
+    try:
+        for name in cache.catalogs():
+            t = time.perf_counter()
+            version = cache.refresh(name, ttl)
+            report(f'fetch:{name}', time.perf_counter() - t)
+            if not args.json:
+                print(f'    version {version}')
+
+        t = time.perf_counter()
+        cache.get_skin_catalog(ttl)
+        report('model:skins', time.perf_counter() - t)
+
+        catalog.warm_views(ttl, report)
+    except Exception as exc:
+        failed = True
+        print(f'Catalog warmup failed: {exc}', file=sys.stderr)
+
+    pruned = cache.prune_artifacts(ARTIFACT_MAX_AGE)
+    total = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps({
+            'ok': not failed,
+            'total_ms': round(total * 1000, 1),
+            'stages': {stage: round(seconds * 1000, 1) for stage, seconds in timings},
+            'pruned_artifacts': pruned,
+        }))
+    else:
+        print(f'  {"total":<22} {total * 1000:9.1f} ms  ({pruned} stale artifacts pruned)')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())